@@ -1,10 +1,9 @@
-from flask import Flask, render_template, request, Response, stream_with_context, jsonify, session, redirect, url_for, send_file
+from flask import Flask, render_template, request, Response, stream_with_context, jsonify, session, redirect, url_for, send_file, g
 import queue
 import threading
 import os
 import re
 import datetime
-import subprocess
 import sqlite3
 import base64
 import binascii
@@ -24,10 +23,28 @@ try:
     from .ssh_utils import SyncManager
     from .config import Config
     from .server_repository import ServerRepository
+    from .cert_utils import get_metadata_cache
+    from .domain_index import get_domain_index
+    from .job_repository import JobRepository, FINAL_JOB_STATES
+    from .job_worker import get_job_worker
+    from .job_events import get_job_events
+    from .sse_frames import FrameBatcher
+    from . import metrics
+    from . import phase_timing
+    from . import process_sync
 except ImportError:
     from ssh_utils import SyncManager
     from config import Config
     from server_repository import ServerRepository
+    from cert_utils import get_metadata_cache
+    from domain_index import get_domain_index
+    from job_repository import JobRepository, FINAL_JOB_STATES
+    from job_worker import get_job_worker
+    from job_events import get_job_events
+    from sse_frames import FrameBatcher
+    import metrics
+    import phase_timing
+    import process_sync
 
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY', 'default-secret-key-change-in-production')
@@ -398,6 +415,20 @@ def build_passkey_descriptor(passkey):
         descriptor['transports'] = transports
     return descriptor
 
+@app.before_request
+def start_request_timer():
+    g.request_started = time.monotonic()
+
+
+@app.after_request
+def record_request_latency(response):
+    started = getattr(g, 'request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe_request(request.method, route, response.status_code, time.monotonic() - started)
+    return response
+
+
 def requires_auth(f):
     from functools import wraps
     @wraps(f)
@@ -457,40 +488,93 @@ def normalize_server_payload(data, config):
     }
 
 
-def stream_sync_response(domain, targets):
-    sync_manager = SyncManager()
-    log_queue = queue.Queue()
-
-    def run_sync_task():
-        """Run sync in background thread."""
-        try:
-            success, failed_hosts = sync_manager.run_sync(domain, targets, log_queue)
-            if success:
-                log_queue.put("[SUCCESS]")
-            else:
-                failed_str = ", ".join(failed_hosts) if failed_hosts else "Unknown"
-                log_queue.put(f"[FAILED] {failed_str}")
-            log_queue.put("[DONE]")
-        except Exception as e:
-            log_queue.put(f"[ERROR] Exception: {str(e)}")
-            log_queue.put("[FAILED]")
-            log_queue.put("[DONE]")
-
-    sync_thread = threading.Thread(target=run_sync_task)
-    sync_thread.daemon = True
-    sync_thread.start()
+def stream_sync_response(domains, targets, rollout_servers=None):
+    """Queues a durable sync job and streams its log; the job keeps running if the client disconnects."""
+    config = Config()
+    if rollout_servers is not None:
+        waves = SyncManager().plan_rollout(rollout_servers)
+        options = {'mode': 'rollout', 'min_success_rate': config.SYNC_WAVE_MIN_SUCCESS_RATE}
+    else:
+        waves = [('all', targets)]
+        options = {'mode': 'batch'}
+    job_id = JobRepository(config).create_job(domains, waves, options)
+    get_job_worker(config).notify()
+    return stream_job_response(job_id)
+
+
+def stream_job_response(job_id, after_id=0):
+    """
+    Streams a job's stored log lines after after_id, then [DONE] once the job
+    has finished. Each line carries its log id as the SSE event id, so a
+    client that lost the connection can re-attach where it left off.
+    While the job runs in this process, new lines are taken from its
+    in-memory event log as soon as they are stored (see job_events);
+    otherwise, or when the client is further behind, from the database.
+    With SSE_BATCH_INTERVAL set, lines are sent in multi-line frames (see
+    sse_frames); with SSE_PROGRESS_INTERVAL set, a
+    [PROGRESS] {"done", "failed", "pending", "total"} frame follows
+    whenever the job's host counts changed.
+    """
+    config = Config()
+    repository = JobRepository(config)
+    job_events = get_job_events(config)
+    batcher = FrameBatcher(config.SSE_BATCH_INTERVAL, config.SSE_BATCH_MAX_BYTES)
+    last_progress = None
+    progress_at = 0.0
+
+    def progress_frames(force=False):
+        nonlocal last_progress, progress_at
+        if config.SSE_PROGRESS_INTERVAL <= 0:
+            return []
+        if not force and time.monotonic() - progress_at < config.SSE_PROGRESS_INTERVAL:
+            return []
+        progress_at = time.monotonic()
+        counts = repository.task_counts(job_id)
+        if counts == last_progress:
+            return []
+        last_progress = counts
+        return batcher.flush() + [f"data: [PROGRESS] {json.dumps(counts)}\n\n"]
 
     def generate():
         """Generator function to stream logs to client."""
+        yield f"data: [JOB] {job_id}\n\n"
+        last_id = after_id
+        last_sent = time.monotonic()
         while True:
-            try:
-                msg = log_queue.get(timeout=1)
-                if msg == "[DONE]":
-                    yield f"data: {msg}\n\n"
-                    break
-                yield f"data: {msg}\n\n"
-            except queue.Empty:
+            # Wake up in time to send lines the batcher is holding back
+            pending = batcher.remaining()
+            wait = 1 if pending is None else min(1, pending)
+            events = job_events.read(job_id, last_id, timeout=wait)
+            buffered = events is not None
+            if not buffered:
+                events = [(row['id'], row['message']) for row in repository.list_logs(job_id, last_id)]
+            frames = []
+            for event_id, message in events:
+                last_id = event_id
+                frames.extend(batcher.add(event_id, message))
+            if batcher.due():
+                frames.extend(batcher.flush())
+            frames.extend(progress_frames())
+            if frames:
+                yield "".join(frames)
+                last_sent = time.monotonic()
+            if events:
+                continue
+            status = repository.get_job_status(job_id)
+            if status is None or status in FINAL_JOB_STATES:
+                # The worker stores its last lines before marking the job finished
+                frames = []
+                for row in repository.list_logs(job_id, last_id):
+                    frames.extend(batcher.add(row['id'], row['message']))
+                frames.extend(batcher.flush())
+                frames.extend(progress_frames(force=True))
+                yield "".join(frames) + "data: [DONE]\n\n"
+                break
+            if time.monotonic() - last_sent >= 1:
                 yield f"data: [KEEPALIVE]\n\n"
+                last_sent = time.monotonic()
+            if not buffered:
+                time.sleep(min(0.25, wait))
 
     return Response(stream_with_context(generate()), mimetype='text/event-stream')
 
@@ -662,26 +746,19 @@ def favicon_ico():
 def get_domains():
     """API endpoint to get available domains from ACME certificate directory."""
     config = Config()
-    acme_root = config.ACME_CERT_ROOT
-    domains = []
+    index = get_domain_index(config)
     
     try:
-        if os.path.exists(acme_root):
-            for item in os.listdir(acme_root):
-                item_path = os.path.join(acme_root, item)
-                if os.path.isdir(item_path) and item.endswith('_ecc'):
-                    domain = item[:-4]
-                    cert_file = os.path.join(item_path, 'fullchain.cer')
-                    key_file = os.path.join(item_path, f'{domain}.key')
-                    if os.path.exists(cert_file) and os.path.exists(key_file):
-                        domains.append(domain)
+        if request.args.get('refresh', '').lower() in ('1', 'true', 'yes'):
+            index.invalidate()
+        domains = index.domains()
+        items = index.entries()
         
         # 本地开发模式：如果没有找到真实域名，注入演示数据
         if not domains and os.environ.get('DEMO_MODE', '').lower() in ('1', 'true', 'yes'):
             domains = ['example.com', 'api.example.com', 'cdn.example.com']
         
-        domains.sort()
-        return jsonify({'success': True, 'domains': domains})
+        return jsonify({'success': True, 'domains': domains, 'items': items})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -690,9 +767,9 @@ def get_domains():
 def get_cert_info(domain):
     """API endpoint to get certificate expiration info."""
     config = Config()
-    cert_path = os.path.join(config.ACME_CERT_ROOT, f"{domain}{config.CERT_DIR_SUFFIX}", "fullchain.cer")
+    entry = get_domain_index(config).get(domain)
     
-    if not os.path.exists(cert_path):
+    if not entry or not entry['has_cert']:
         # 本地开发模式：返回演示证书数据
         if os.environ.get('DEMO_MODE', '').lower() in ('1', 'true', 'yes'):
             import random
@@ -702,30 +779,20 @@ def get_cert_info(domain):
         return jsonify({'success': False, 'error': 'Certificate not found'}), 404
         
     try:
-        # Use openssl to get expiration date
-        cmd = ['openssl', 'x509', '-enddate', '-noout', '-in', cert_path]
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            return jsonify({'success': False, 'error': 'Failed to parse certificate'}), 500
-            
-        # Output format: notAfter=Mar 12 12:34:56 2024 GMT
-        date_str = result.stdout.strip().split('=')[1]
-        
-        # Parse date
-        # OpenSSL date format: %b %d %H:%M:%S %Y %Z
-        expiry_date = datetime.datetime.strptime(date_str, '%b %d %H:%M:%S %Y %Z')
-        days_left = (expiry_date - datetime.datetime.now()).days
-        
-        return jsonify({
-            'success': True, 
-            'domain': domain,
-            'expiry_date': date_str,
-            'days_left': days_left
-        })
+        metadata = get_metadata_cache().get(entry['cert_file'])
+    except FileNotFoundError:
+        return jsonify({'success': False, 'error': 'Certificate not found'}), 404
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Failed to parse certificate'}), 500
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+    return jsonify({
+        'success': True,
+        'domain': domain,
+        **metadata
+    })
+
 @app.route('/api/servers', methods=['GET'])
 @requires_auth
 def get_servers():
@@ -799,6 +866,53 @@ def delete_server(server_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/concurrency-limits', methods=['GET'])
+@requires_auth
+def get_concurrency_limits():
+    """API endpoint to list per-group / per-CIDR concurrency limits."""
+    repository = ServerRepository(Config())
+
+    try:
+        return jsonify({'success': True, 'items': repository.list_concurrency_limits()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/concurrency-limits', methods=['POST'])
+@requires_auth
+def set_concurrency_limit():
+    """API endpoint to create or update a concurrency limit."""
+    repository = ServerRepository(Config())
+
+    try:
+        data = request.get_json() or {}
+        item = repository.set_concurrency_limit(
+            data.get('scope', ''),
+            data.get('match_value', ''),
+            data.get('max_sessions'),
+            remark=str(data.get('remark', '')).strip(),
+        )
+        return jsonify({'success': True, 'message': 'Concurrency limit saved', 'item': item})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/concurrency-limits/<int:limit_id>', methods=['DELETE'])
+@requires_auth
+def delete_concurrency_limit(limit_id):
+    """API endpoint to delete a concurrency limit."""
+    repository = ServerRepository(Config())
+
+    try:
+        if not repository.delete_concurrency_limit(limit_id):
+            return jsonify({'success': False, 'error': 'Concurrency limit not found'}), 404
+        return jsonify({'success': True, 'message': 'Concurrency limit deleted'})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @app.route('/api/account/password', methods=['POST'])
 @requires_auth
 def change_password():
@@ -1054,6 +1168,89 @@ def disable_2fa():
     return jsonify({'success': True, 'message': '2FA has been disabled'})
 
 
+@app.route('/api/jobs', methods=['GET'])
+@requires_auth
+def list_sync_jobs():
+    """Recent sync jobs, newest first."""
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 200)
+    return jsonify({'jobs': JobRepository(Config()).list_jobs(limit)})
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@requires_auth
+def get_sync_job(job_id):
+    """
+    A sync job with per-status task counts; ?tasks=1 adds every host's
+    outcome, ?attempts=1 every host attempt with its timings.
+    """
+    repository = JobRepository(Config())
+    job = repository.get_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    if request.args.get('tasks') in ('1', 'true'):
+        job['task_list'] = repository.list_tasks(job_id)
+    if request.args.get('attempts') in ('1', 'true'):
+        attempts = repository.list_attempts(job_id)
+        job['attempt_list'] = attempts
+        job['bytes_sent'] = sum(item['bytes_sent'] for item in attempts)
+    return jsonify(job)
+
+
+@app.route('/api/sync-stats/latency', methods=['GET'])
+@requires_auth
+def get_sync_latency_stats():
+    """p50/p95/p99 attempt duration per host (?by=server) or group (?by=group) over the last ?hours=."""
+    group_by = request.args.get('by', 'server')
+    if group_by not in ('server', 'group'):
+        return jsonify({'error': 'by must be server or group'}), 400
+    hours = request.args.get('hours', 24, type=float)
+    if hours is None or hours <= 0:
+        return jsonify({'error': 'hours must be a positive number'}), 400
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 1000)
+    since = time.time() - hours * 3600
+    return jsonify({
+        'by': group_by,
+        'hours': hours,
+        'items': JobRepository(Config()).latency_stats(since, group_by, limit),
+    })
+
+
+@app.route('/api/jobs/<job_id>/stream', methods=['GET'])
+@requires_auth
+def stream_sync_job(job_id):
+    """Re-attaches to a job's log stream, resuming after ?after= or the Last-Event-ID header."""
+    if JobRepository(Config()).get_job_status(job_id) is None:
+        return Response("Error: Job not found", status=404)
+    after = request.args.get('after') or request.headers.get('Last-Event-ID') or '0'
+    try:
+        after_id = max(int(after), 0)
+    except ValueError:
+        return Response("Error: Invalid log position", status=400)
+    return stream_job_response(job_id, after_id)
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Prometheus scrape endpoint. Requires METRICS_TOKEN as a bearer token;
+    without a token configured only logged-in console sessions may read it,
+    since the samples name every managed domain.
+    """
+    config = Config()
+    if config.METRICS_TOKEN:
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied, f"Bearer {config.METRICS_TOKEN}"):
+            return Response("Unauthorized", status=401, headers={'WWW-Authenticate': 'Bearer'})
+    elif not session.get('logged_in'):
+        return Response("Unauthorized: set METRICS_TOKEN to allow scrapers", status=401,
+                        headers={'WWW-Authenticate': 'Bearer'})
+    rendered = metrics.render_metrics(config)
+    if rendered is None:
+        return Response("Error: prometheus_client is not installed", status=503)
+    body, content_type = rendered
+    return Response(body, content_type=content_type)
+
+
 @app.route('/api/servers/<int:server_id>/sync', methods=['POST'])
 @requires_auth
 def sync_single_server(server_id):
@@ -1072,7 +1269,7 @@ def sync_single_server(server_id):
         if not server['enabled']:
             return Response("Error: Server is disabled", status=400)
         target = f"{server['host']}:{server['port']}"
-        return stream_sync_response(domain, [target])
+        return stream_sync_response([domain], [target])
     except Exception as e:
         return Response(f"Error: {str(e)}", status=500)
 
@@ -1104,6 +1301,77 @@ def get_remote_cert_info(server_id):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+
+@app.route('/api/host-health', methods=['GET'])
+@requires_auth
+def get_host_health_status():
+    """Per-host connect latency, adaptive timeout and circuit breaker state."""
+    sync_manager = SyncManager()
+    return jsonify({'success': True, 'hosts': sync_manager.host_health.snapshot()})
+
+
+@app.route('/api/host-health', methods=['DELETE'])
+@requires_auth
+def reset_host_health():
+    """Close the circuit for one host (?server=host:port) or for every host."""
+    sync_manager = SyncManager()
+    server = request.args.get('server', '').strip()
+    sync_manager.host_health.reset(server or None)
+    process_sync.reset_host_health(server or None)
+    return jsonify({'success': True})
+
+
+@app.route('/api/remote-cert-scan', methods=['GET'])
+@requires_auth
+def scan_remote_certs():
+    """Inspect the deployed certificate on every enabled server in parallel, streaming results as SSE."""
+    config = Config()
+    repository = ServerRepository(config)
+    domain = request.args.get('domain', '').strip()
+    group_name = request.args.get('group', '').strip()
+
+    if not domain:
+        return Response("Error: Domain is required", status=400)
+
+    try:
+        servers = repository.list_enabled_servers(group_name=group_name)
+    except Exception as e:
+        return Response(f"Error: {str(e)}", status=500)
+
+    sync_manager = SyncManager()
+    result_queue = queue.Queue()
+
+    def run_scan_task():
+        """Run scan in background thread."""
+        try:
+            summary = sync_manager.scan_remote_certificates(
+                domain,
+                servers,
+                on_result=lambda result: result_queue.put(json.dumps({'type': 'result', **result})),
+            )
+            summary['group'] = group_name
+            result_queue.put(json.dumps({'type': 'summary', **summary}))
+        except Exception as e:
+            result_queue.put(json.dumps({'type': 'error', 'error': str(e)}))
+        result_queue.put("[DONE]")
+
+    scan_thread = threading.Thread(target=run_scan_task)
+    scan_thread.daemon = True
+    scan_thread.start()
+
+    def generate():
+        """Generator function to stream per-host results to client."""
+        while True:
+            try:
+                msg = result_queue.get(timeout=1)
+                yield f"data: {msg}\n\n"
+                if msg == "[DONE]":
+                    break
+            except queue.Empty:
+                yield f"data: [KEEPALIVE]\n\n"
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+
 @app.route('/sync', methods=['POST'])
 @requires_auth
 def sync():
@@ -1111,13 +1379,27 @@ def sync():
     domain = request.form.get('domain', '').strip()
     target_mode = request.form.get('target_mode', 'all')
     specific_ips = request.form.get('specific_ips', '').strip()
+
+    # Batch mode: extra domains (repeated fields, or one per line / comma-separated)
+    domains = [domain] if domain else []
+    for value in request.form.getlist('domains'):
+        for item in value.replace(',', '\n').split('\n'):
+            item = item.strip()
+            if item and item not in domains:
+                domains.append(item)
     
-    if not domain:
+    if not domains:
         return Response("Error: Domain is required", status=400)
     
     # Determine target servers
     sync_manager = SyncManager()
-    if target_mode == 'all':
+    if target_mode == 'rollout':
+        # Wave rollout needs each server's group, so read full records instead of host:port lines
+        servers = sync_manager.server_repository.list_enabled_servers()
+        if not servers:
+            return Response("Error: No servers found in server list", status=400)
+        return stream_sync_response(domains, None, rollout_servers=servers)
+    elif target_mode == 'all':
         targets = sync_manager.get_server_list()
         if not targets:
             return Response("Error: No servers found in server list", status=400)
@@ -1133,7 +1415,14 @@ def sync():
         if not targets:
             return Response("Error: No target servers specified", status=400)
     
-    return stream_sync_response(domain, targets)
+    return stream_sync_response(domains, targets)
+
+phase_timing.load_hooks(Config.PHASE_TIMING_HOOKS)
+
+# Resume queued or interrupted sync jobs as soon as the process starts; not in the sync
+# worker processes (SYNC_ENGINE=processes), which re-import this module as __mp_main__
+if __name__ != '__mp_main__':
+    get_job_worker(Config())
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,396 @@
+import asyncio
+import logging
+import socket
+import time
+
+try:
+    from . import stream_deploy
+    from . import deploy_report
+    from . import retry_policy
+    from . import rollout
+    from . import concurrency_limits
+    from . import metrics
+    from . import phase_timing
+    from .host_health import get_host_health
+    from .identity_manager import get_identity_manager
+    from .server_repository import ServerRepository
+except ImportError:
+    import stream_deploy
+    import deploy_report
+    import retry_policy
+    import rollout
+    import concurrency_limits
+    import metrics
+    import phase_timing
+    from host_health import get_host_health
+    from identity_manager import get_identity_manager
+    from server_repository import ServerRepository
+
+try:
+    import asyncssh
+except ImportError:  # optional dependency, only needed for SYNC_ENGINE=asyncio
+    asyncssh = None
+
+logger = logging.getLogger(__name__)
+
+
+def is_available() -> bool:
+    return asyncssh is not None
+
+
+if asyncssh is not None:
+    class _IdentityClient(asyncssh.SSHClient):
+        """Offers preloaded keys one at a time, in the identity manager's order, and notes which one was accepted."""
+
+        def __init__(self, identities):
+            self._identities = list(identities)
+            self.offered = None
+            self.accepted = None
+
+        def public_key_auth_requested(self):
+            if not self._identities:
+                return None
+            self.offered, key = self._identities.pop(0)
+            return key
+
+        def auth_completed(self):
+            self.accepted = self.offered
+
+
+class AsyncSyncEngine:
+    """Runs the mkdir/upload/post-sync steps for many hosts on one asyncio event loop."""
+
+    def __init__(self, config):
+        self.config = config
+        self.concurrency = max(1, config.SYNC_ASYNC_CONCURRENCY)
+        self.host_health = get_host_health(config)
+        self.identity_manager = get_identity_manager(config)
+        self.defer_reload = None
+        self.cancel = None
+
+    def run(self, deploys, waves, min_success_rate=0.0, log_queue=None, limiter=None, on_result=None, on_attempt=None,
+            defer_reload=None, cancel=None):
+        """
+        Blocks until every wave is processed or the rollout halts and returns
+        (failed_hosts, skipped_hosts, not_attempted_hosts). on_result is called
+        with (server, status, error_class) as each host reaches its final outcome,
+        on_attempt with (server, attempt, result) after every attempt.
+        defer_reload: Optional callable (server, domains, log_queue) that takes
+        over the post-sync command of each synced host (reload coalescing).
+        cancel: Optional threading.Event; once set, hosts that have not
+        started yet are not started and are returned as not attempted.
+        """
+        self.defer_reload = defer_reload
+        self.cancel = cancel
+        return asyncio.run(self._run_all(deploys, waves, min_success_rate, log_queue, limiter, on_result, on_attempt))
+
+    async def _run_all(self, deploys, waves, min_success_rate, log_queue, limiter=None, on_result=None, on_attempt=None):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        limit_slots = concurrency_limits.AsyncLimitSlots(limiter or concurrency_limits.ConcurrencyLimiter())
+        schedule = retry_policy.RetrySchedule(self.config, time.monotonic())
+        gate = rollout.WaveGate(waves, min_success_rate)
+        task_to_server = {}
+        failed_hosts = []
+        skipped_hosts = []
+        cancelled = []
+        launched = 0
+        halted = False
+
+        def log_wave(message, level="WAVE"):
+            logger.info(message)
+            if log_queue:
+                log_queue.put(f"[{level}] {message}")
+
+        def settle(wave_index, decision):
+            nonlocal halted
+            if decision == gate.PASSED and len(waves) > 1:
+                log_wave(f"Passed {gate.describe(wave_index)}")
+            elif decision == gate.FAILED:
+                halted = True
+                log_wave(f"Rollout halted, success rate below threshold in {gate.describe(wave_index)}", "WARN")
+
+        def launch_ready_waves():
+            nonlocal launched
+            while (not halted and not self._cancelled() and launched < len(waves)
+                   and (launched == 0 or gate.state[launched - 1] == gate.PASSED)):
+                wave = waves[launched]
+                if len(waves) > 1:
+                    log_wave(f"Starting wave {launched + 1}/{len(waves)} [{wave.name}]: {len(wave.targets)} host(s)")
+                for server in wave.targets:
+                    task = asyncio.ensure_future(
+                        self._sync_host_with_retry(semaphore, limit_slots, schedule, server, deploys, log_queue, on_attempt)
+                    )
+                    task_to_server[task] = (server, launched)
+                launched += 1
+                settle(launched - 1, gate.evaluate(launched - 1))
+
+        launch_ready_waves()
+        while task_to_server:
+            done, _ = await asyncio.wait(task_to_server, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                server, wave_index = task_to_server.pop(task)
+                try:
+                    status, error_class = task.result()
+                except Exception as exc:
+                    logger.error(f"{server} generated an exception: {exc}")
+                    if log_queue:
+                        log_queue.put(f"[ERROR] {server} exception: {exc}")
+                    status, error_class = "failed", None
+
+                if status == "not_attempted":
+                    cancelled.append(server)
+                    continue
+                if status in ("failed", "circuit_open"):
+                    failed_hosts.append(server)
+                elif status == "skipped":
+                    skipped_hosts.append(server)
+                if on_result:
+                    on_result(server, status, error_class)
+                settle(wave_index, gate.record(wave_index, status in ("synced", "skipped")))
+            launch_ready_waves()
+
+        not_attempted = cancelled + [server for wave in waves[launched:] for server in wave.targets]
+        return failed_hosts, skipped_hosts, not_attempted
+
+    def _cancelled(self) -> bool:
+        return self.cancel is not None and self.cancel.is_set()
+
+    async def _sync_host_with_retry(self, semaphore, limit_slots, schedule, server_line, deploys, log_queue, on_attempt=None):
+        """
+        Re-runs _sync_host per the retry schedule and returns the final
+        (status, error_class); backoff sleeps happen outside the semaphores.
+        Per-group / per-CIDR slots are taken before the global one, so hosts
+        waiting on a saturated cap never hold a global slot.
+        """
+        attempt = 1
+        while True:
+            metrics.adjust_queued(1)  # until _sync_host holds the global slot
+            held = await limit_slots.acquire(server_line)
+            stats = {}
+            try:
+                status, error_class = await self._sync_host(semaphore, server_line, deploys, log_queue, stats)
+            finally:
+                limit_slots.release(held)
+            if status == "not_attempted":
+                return status, error_class
+            result = {"success": status in ("synced", "skipped"), "status": status, "error_class": error_class, **stats}
+            metrics.observe_attempt(result)
+            if on_attempt:
+                on_attempt(server_line, attempt, result)
+            if status != "failed":
+                return status, error_class
+            delay = schedule.next_delay(error_class, attempt, time.monotonic())
+            if delay is not None:
+                canonical_line = ServerRepository.canonical_server(server_line, self.config.SSH_PORT_DEFAULT)
+                if self.host_health.is_open(canonical_line):
+                    msg = f"Not retrying {canonical_line}: its circuit is open"
+                    logger.info(msg)
+                    if log_queue:
+                        log_queue.put(f"[RETRY] {msg}")
+                    delay = None
+            if delay is None:
+                return status, error_class
+            msg = f"Retrying {server_line} ({error_class}) in {delay:.1f}s, attempt {attempt + 1}"
+            logger.info(msg)
+            if log_queue:
+                log_queue.put(f"[RETRY] {msg}")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _sync_host(self, semaphore, server_line, deploys, log_queue, stats=None):
+        """
+        Returns (status, error_class): status is "synced", "skipped", "failed"
+        or "circuit_open"; error_class is set for failures (see retry_policy).
+        stats: Optional dict that receives the attempt's timings, as in
+        SyncManager._sync_single_server results; time spent waiting for the
+        global slot is not counted. asyncssh does key exchange and auth in one
+        call, so those two are timed together as handshake.
+        """
+        stats = stats if stats is not None else {}
+        stats.update({"server": None, "error": None})
+
+        def log(message, level="INFO"):
+            msg = f"[{level}] {message}"
+            logger.info(msg)
+            if log_queue:
+                log_queue.put(msg)
+
+        host, port = ServerRepository.split_server(server_line, self.config.SSH_PORT_DEFAULT)
+        canonical_line = ServerRepository.canonical_server(server_line, self.config.SSH_PORT_DEFAULT)
+        stats["server"] = canonical_line
+
+        async with semaphore:
+            metrics.adjust_queued(-1)
+            if self._cancelled():
+                return "not_attempted", None
+            metrics.adjust_inflight(1)
+            timer = phase_timing.PhaseTimer("sync", canonical_line)
+
+            def finish(status, error_class=None, error=None):
+                # Every path below returns through here, errors included
+                metrics.adjust_inflight(-1)
+                timer.finish(status)
+                stats.update(timer.as_dict())
+                stats["error"] = error
+                return status, error_class
+
+            log(deploy_report.start_line(canonical_line, deploys))
+
+            if self.config.DRY_RUN:
+                await asyncio.sleep(0.5)  # Simulate network delay
+                for message, level in deploy_report.dry_run_lines(
+                    self.config, canonical_line, host, port, deploys, self._use_stream_deploy()
+                ):
+                    log(message, level)
+                return finish("synced")
+
+            allowed, reason = self.host_health.allow(canonical_line)
+            if not allowed:
+                log(f"Skipping {canonical_line}: {reason}", "WARN")
+                return finish("circuit_open", error=reason)
+
+            try:
+                connect_started = time.monotonic()
+                conn = await asyncio.wait_for(
+                    self._connect(host, port, timer),
+                    timeout=self.host_health.connect_timeout(canonical_line),
+                )
+                connect_latency = time.monotonic() - connect_started
+                async with conn:
+                    if self._use_stream_deploy():
+                        status = await self._deploy_stream(conn, canonical_line, deploys, log, timer)
+                    else:
+                        status = await self._deploy_sftp(conn, canonical_line, deploys, log, timer)
+                self.host_health.record_success(canonical_line, connect_latency)
+
+                result = finish(status, *deploy_report.remote_failure(status))
+                for message, level in deploy_report.outcome_lines(canonical_line, status, timer.summary()):
+                    log(message, level)
+                if status == "synced" and self.defer_reload:
+                    self.defer_reload(canonical_line, [deploy['domain'] for deploy in deploys], log_queue)
+                return result
+
+            except Exception as e:
+                error = str(e) or type(e).__name__
+                result = finish("failed", retry_policy.classify_error(e), error)
+                log(*deploy_report.error_line(canonical_line, error, timer.summary()))
+                if self.host_health.record_failure(canonical_line, error):
+                    log(*deploy_report.circuit_opened_line(canonical_line, self.config.HOST_CIRCUIT_COOLDOWN))
+                return result
+
+    async def _connect(self, host, port, timer):
+        """Opens the TCP connection and the SSH session separately so each is timed."""
+        loop = asyncio.get_running_loop()
+        with timer.phase("tcp_connect"):
+            addresses = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+            sock = None
+            last_error = None
+            for family, sock_type, proto, _, address in addresses:
+                sock = socket.socket(family, sock_type, proto)
+                sock.setblocking(False)
+                try:
+                    await loop.sock_connect(sock, address)
+                    break
+                except BaseException as exc:
+                    sock.close()
+                    sock = None
+                    if not isinstance(exc, OSError):
+                        raise
+                    last_error = exc
+            if sock is None:
+                raise last_error or OSError(f"No address found for {host}")
+        username = self.config.REMOTE_USER
+        identity_key = f"{username}@{host}:{port}"
+        options = {}
+        client = None
+        if self.identity_manager.has_identities():
+            identities = self.identity_manager.ordered_asyncssh_identities(identity_key)
+            if identities:
+                client = _IdentityClient(identities)
+                # client_keys=None stops asyncssh from reading ~/.ssh itself; the client hands out the keys
+                options = {"client_factory": lambda: client, "client_keys": None}
+        try:
+            with timer.phase("handshake"):
+                conn = await asyncssh.connect(host, port=port, username=username, known_hosts=None, sock=sock, **options)
+        except BaseException:
+            sock.close()
+            raise
+        if client is not None and client.accepted:
+            self.identity_manager.record_success(identity_key, client.accepted)
+        return conn
+
+    def _use_stream_deploy(self):
+        return (self.config.SYNC_TRANSFER_MODE or 'sftp').lower() == 'stream'
+
+    async def _remote_files_match(self, conn, remote_dir, local_hashes):
+        command = stream_deploy.build_hash_command(remote_dir, list(local_hashes))
+        result = await conn.run(command, timeout=self.config.SSH_EXEC_TIMEOUT)
+        return stream_deploy.parse_hash_output(str(result.stdout or "")) == local_hashes
+
+    async def _deploy_sftp(self, conn, canonical_line, deploys, log, timer):
+        changed = 0
+        with timer.phase("sftp_open"):
+            sftp = await conn.start_sftp_client()
+        async with sftp:
+            for deploy in deploys:
+                remote_dir = deploy['remote_dir']
+                if deploy.get('hashes'):
+                    with timer.phase("remote_hash"):
+                        unchanged = await self._remote_files_match(conn, remote_dir, deploy['hashes'])
+                    if unchanged:
+                        if len(deploys) > 1:
+                            log(*deploy_report.unchanged_domain_line(canonical_line, deploy))
+                        continue
+
+                # 1. Create directory
+                with timer.phase("mkdir"):
+                    result = await conn.run(f"mkdir -p {remote_dir}", timeout=self.config.SSH_EXEC_TIMEOUT)
+                if result.exit_status != 0:
+                    log(*deploy_report.mkdir_failed_line(canonical_line, str(result.stderr).strip()))
+                    return "failed"
+
+                # 2. SCP files
+                payload = deploy['payload']
+                with timer.phase("upload"):
+                    async with sftp.open(f"{remote_dir}/fullchain.cer", 'wb') as remote_file:
+                        await remote_file.write(payload.cert_bytes)
+                    async with sftp.open(f"{remote_dir}/{deploy['domain']}.key", 'wb') as remote_file:
+                        await remote_file.write(payload.key_bytes)
+                timer.bytes_sent += len(payload.cert_bytes) + len(payload.key_bytes)
+                changed += 1
+
+        if not changed:
+            return "skipped"
+
+        # 3. Execute Post-Sync Command
+        post_sync_cmd = "" if self.defer_reload else self.config.POST_SYNC_CMD
+        if post_sync_cmd:
+            log(f"Executing post-sync command: {post_sync_cmd}")
+            with timer.phase("post_sync"):
+                result = await conn.run(post_sync_cmd, timeout=self.config.SSH_EXEC_TIMEOUT)
+            log(*deploy_report.post_sync_line(canonical_line, result.exit_status, str(result.stderr).strip()))
+        return "synced"
+
+    async def _deploy_stream(self, conn, canonical_line, deploys, log, timer):
+        payload = stream_deploy.build_deploys_archive(deploys)
+        command = stream_deploy.build_deploys_command(
+            deploys, self.config.REMOTE_DIR_BASE, "" if self.defer_reload else self.config.POST_SYNC_CMD
+        )
+
+        # One remote command installs and reloads; sending the archive is timed as upload, the rest as
+        # remote_exec, as in the thread engine
+        async with conn.create_process(command, encoding=None) as process:
+            with timer.phase("upload"):
+                process.stdin.write(payload)
+                await asyncio.wait_for(process.stdin.drain(), timeout=self.config.SSH_EXEC_TIMEOUT)
+                process.stdin.write_eof()
+            timer.bytes_sent += len(payload)
+            with timer.phase("remote_exec"):
+                result = await process.wait(timeout=self.config.SSH_EXEC_TIMEOUT)
+        output = (result.stdout or b"").decode(errors='replace')
+        err = (result.stderr or b"").decode(errors='replace').strip()
+
+        status, lines = stream_deploy.interpret_status(output, err, result.exit_status, canonical_line)
+        for message, level in lines:
+            log(message, level)
+        return status
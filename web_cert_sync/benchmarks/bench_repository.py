@@ -0,0 +1,235 @@
+"""
+Times ServerRepository against synthetic server inventories.
+
+    python benchmarks/bench_repository.py --rows 10000,50000,100000
+    python benchmarks/bench_repository.py --compare benchmarks/results/<earlier run>.json
+
+For each inventory size a fresh database is seeded (about 30% hostnames,
+70% IPv4 addresses, 40 groups, 5% disabled) and every read is repeated
+--repeat times: first/middle/last page of list_servers, searches that hit
+a host, a group, a port, a remark or nothing, list_sync_targets,
+list_enabled_servers and list_server_groups. create/update/delete_server
+are timed one call at a time for --crud servers, and the text-file
+migration imports an inventory of the same size into an empty database.
+Results are printed as median/p95 milliseconds (ops/sec for writes) and
+saved as JSON for --compare.
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import report as bench_report
+
+sys.path.insert(0, bench_report.APP_DIR)
+
+ROLES = ("web", "api", "db", "cache", "edge", "mq", "batch", "proxy")
+DATACENTERS = ("dc1", "dc2", "dc3", "dc4", "dc5")
+PAGE_SIZE = 50
+
+
+def synthetic_servers(count: int, seed: int = 0):
+    """Yields (host, port, enabled, group_name, remark) rows; host/port pairs are unique."""
+    rng = random.Random(seed)
+    for index in range(count):
+        role = ROLES[index % len(ROLES)]
+        datacenter = DATACENTERS[(index // len(ROLES)) % len(DATACENTERS)]
+        if index % 10 < 3:
+            host = f"{role}-{index:06d}.{datacenter}.example.com"
+        else:
+            host = f"10.{(index >> 16) & 255}.{(index >> 8) & 255}.{index & 255}"
+        port = 2222 if rng.random() < 0.1 else 22
+        enabled = 0 if rng.random() < 0.05 else 1
+        remark = f"rack {rng.randrange(500)}" if rng.random() < 0.6 else ""
+        yield host, port, enabled, f"{role}-{datacenter}", remark
+
+
+def seed_database(db_path: str, count: int):
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO servers (host, port, enabled, group_name, remark) VALUES (?, ?, ?, ?, ?)",
+            synthetic_servers(count),
+        )
+
+
+def measure(fn: Callable, repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def latency_row(rows: int, operation: str, timings: List[float]) -> Dict:
+    from job_repository import percentile
+
+    timings = sorted(timings)
+    return {
+        "rows": rows,
+        "operation": operation,
+        "calls": len(timings),
+        "median_ms": round(percentile(timings, 50) * 1000, 3),
+        "p95_ms": round(percentile(timings, 95) * 1000, 3),
+        "ops_per_sec": round(len(timings) / sum(timings), 1) if sum(timings) else None,
+    }
+
+
+def make_config(workdir: str, name: str, server_list_path: str = ""):
+    from config import Config
+
+    config = Config()
+    config.SERVER_DB_PATH = os.path.join(workdir, f"{name}.db")
+    config.SERVER_LIST_PATH = server_list_path
+    return config
+
+
+def bench_reads(repository, rows: int, repeat: int) -> List[Dict]:
+    last_page = max(1, (rows + PAGE_SIZE - 1) // PAGE_SIZE)
+    reads = {
+        "page_first": lambda: repository.list_servers(1, PAGE_SIZE),
+        "page_middle": lambda: repository.list_servers(max(1, last_page // 2), PAGE_SIZE),
+        "page_last": lambda: repository.list_servers(last_page, PAGE_SIZE),
+        "search_host": lambda: repository.list_servers(1, PAGE_SIZE, "web-00012"),
+        "search_group": lambda: repository.list_servers(1, PAGE_SIZE, "db-dc2"),
+        "search_port": lambda: repository.list_servers(1, PAGE_SIZE, "2222"),
+        "search_remark": lambda: repository.list_servers(1, PAGE_SIZE, "rack 42"),
+        "search_miss": lambda: repository.list_servers(1, PAGE_SIZE, "no-such-host"),
+        "search_broad_last_page": lambda: repository.list_servers(last_page, PAGE_SIZE, "example.com"),
+        "list_sync_targets": repository.list_sync_targets,
+        "list_enabled_servers": repository.list_enabled_servers,
+        "list_server_groups": repository.list_server_groups,
+    }
+    results = []
+    for operation, fn in reads.items():
+        fn()  # warm the page cache so the first sample is not an outlier
+        results.append(latency_row(rows, operation, measure(fn, repeat)))
+    return results
+
+
+def bench_writes(repository, rows: int, count: int) -> List[Dict]:
+    created: List[int] = []
+    create_timings, update_timings, delete_timings = [], [], []
+    for index in range(count):
+        started = time.perf_counter()
+        server = repository.create_server(f"crud-{index:06d}.bench.example.com", 22, "bench", "")
+        create_timings.append(time.perf_counter() - started)
+        created.append(server["id"])
+    for index, server_id in enumerate(created):
+        started = time.perf_counter()
+        repository.update_server(server_id, f"crud-{index:06d}.bench.example.com", 2222, "bench", "updated")
+        update_timings.append(time.perf_counter() - started)
+    for server_id in created:
+        started = time.perf_counter()
+        repository.delete_server(server_id)
+        delete_timings.append(time.perf_counter() - started)
+    return [
+        latency_row(rows, "create_server", create_timings),
+        latency_row(rows, "update_server", update_timings),
+        latency_row(rows, "delete_server", delete_timings),
+    ]
+
+
+def bench_migration(workdir: str, rows: int) -> Dict:
+    from server_repository import ServerRepository
+
+    list_path = os.path.join(workdir, f"servers-{rows}.txt")
+    with open(list_path, "w", encoding="utf-8") as file_obj:
+        file_obj.write("# synthetic inventory\n")
+        for host, port, _, _, _ in synthetic_servers(rows):
+            file_obj.write(f"{host}:{port}\n" if port != 22 else f"{host}\n")
+    config = make_config(workdir, f"migrate-{rows}", list_path)
+    started = time.perf_counter()
+    repository = ServerRepository(config)
+    elapsed = time.perf_counter() - started
+    imported = repository.list_servers(1, 1)["pagination"]["total"]
+    if imported != rows:
+        print(f"  warning: migration imported {imported} of {rows} rows", file=sys.stderr)
+    return latency_row(rows, "text_migration", [elapsed])
+
+
+def print_results(results: List[Dict]):
+    header = f"{'rows':>8}  {'operation':<22}{'median ms':>11}{'p95 ms':>10}{'ops/s':>10}"
+    print(header)
+    print("-" * len(header))
+    for row in results:
+        print(
+            f"{row['rows']:>8}  {row['operation']:<22}{row['median_ms']:>11.3f}{row['p95_ms']:>10.3f}"
+            f"{row['ops_per_sec'] or 0:>10.1f}"
+        )
+
+
+def print_comparison(previous: Dict, current: Dict):
+    earlier = {(row["rows"], row["operation"]): row for row in previous.get("results", [])}
+    print(f"\nCompared with {previous.get('commit', '?')} ({previous.get('created_at', '?')}):")
+    for row in current["results"]:
+        old = earlier.get((row["rows"], row["operation"]))
+        if old is None:
+            continue
+        print(
+            f"  {row['rows']:>8}  {row['operation']:<22}median {bench_report.change(old['median_ms'], row['median_ms'])}"
+            f"  p95 {bench_report.change(old['p95_ms'], row['p95_ms'])}"
+        )
+    if previous.get("settings") != current["settings"]:
+        print("  note: the runs used different settings")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ServerRepository on synthetic inventories")
+    parser.add_argument("--rows", default="10000,50000,100000", help="comma-separated inventory sizes")
+    parser.add_argument("--repeat", type=int, default=20, help="samples per read operation (default: 20)")
+    parser.add_argument("--crud", type=int, default=200, help="servers created, updated and deleted per size")
+    parser.add_argument("--skip-migration", action="store_true", help="do not time the text-file migration")
+    parser.add_argument("--keep", action="store_true", help="keep the generated databases")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/repository-<time>-<commit>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sizes = [int(value) for value in args.rows.split(",") if value.strip()]
+
+    from server_repository import ServerRepository
+
+    workdir = tempfile.mkdtemp(prefix="cert-sync-repo-bench-")
+    report = bench_report.new_report("repository", {
+        "repeat": args.repeat,
+        "crud": args.crud,
+        "page_size": PAGE_SIZE,
+        "sqlite": sqlite3.sqlite_version,
+    })
+    try:
+        for rows in sizes:
+            config = make_config(workdir, f"inventory-{rows}")
+            repository = ServerRepository(config)
+            print(f"Seeding {rows} servers ...", file=sys.stderr)
+            started = time.perf_counter()
+            seed_database(config.SERVER_DB_PATH, rows)
+            print(f"  seeded in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+
+            report["results"].extend(bench_reads(repository, rows, args.repeat))
+            if args.crud:
+                report["results"].extend(bench_writes(repository, rows, args.crud))
+            if not args.skip_migration:
+                report["results"].append(bench_migration(workdir, rows))
+    finally:
+        if args.keep:
+            print(f"Databases kept in {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_results(report["results"])
+    output = bench_report.save_report(report, args.output)
+    print(f"\nResults saved to {output}")
+    if args.compare:
+        print_comparison(bench_report.load_report(args.compare), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""
+Measures SyncManager throughput against simulated hosts (see fake_ssh.py).
+
+    python benchmarks/bench_sync.py --hosts 10,100,1000 --latency 0.02
+    python benchmarks/bench_sync.py --compare benchmarks/results/<earlier run>.json
+
+For each host count a fresh cluster is started, then the "sync" scenario
+runs run_batch_sync (what run_sync does) and the "inspect" scenario runs
+scan_remote_certificates against the files it deployed. Each scenario
+reports hosts/sec, p50/p95 per-host attempt latency, and the peak RSS and
+thread count of this process. Results are written as JSON, tagged with the
+current commit, so runs can be compared between commits.
+
+Sync settings other than paths (SYNC_ENGINE, MAX_JOBS, SYNC_TRANSFER_MODE,
+SSH_POOL_ENABLED, retries, ...) are read from the environment as usual.
+The simulated hosts run in --server-processes child processes; their
+throughput is the ceiling of what a run can show, so compare runs made
+with the same settings on the same machine.
+"""
+import argparse
+import datetime
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+import fake_ssh
+import report as bench_report
+
+sys.path.insert(0, bench_report.APP_DIR)
+
+DOMAIN = "bench.example.com"
+SCENARIOS = ("sync", "inspect")
+
+
+class ResourceSampler:
+    """Polls this process's RSS and OS thread count in the background and keeps the peaks."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_threads = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def sample():
+        """Returns (rss_bytes, threads); falls back to ru_maxrss and Python threads without /proc."""
+        try:
+            with open("/proc/self/status") as status:
+                fields = dict(line.split(":", 1) for line in status if ":" in line)
+            return int(fields["VmRSS"].split()[0]) * 1024, int(fields["Threads"])
+        except (OSError, KeyError, ValueError):
+            import resource
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return rss if sys.platform == "darwin" else rss * 1024, threading.active_count()
+
+    def _record(self):
+        rss, threads = self.sample()
+        self.peak_rss = max(self.peak_rss, rss)
+        self.peak_threads = max(self.peak_threads, threads)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self._record()
+
+    def __enter__(self):
+        self._record()
+        self._thread = threading.Thread(target=self._loop, name="bench-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self._record()
+
+
+def write_certificate(acme_root: str, cert_dir_suffix: str):
+    """Creates a self-signed certificate and key laid out like acme.sh output."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, DOMAIN)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=90))
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName(DOMAIN)]), critical=False)
+        .sign(key, hashes.SHA256())
+    )
+    cert_dir = os.path.join(acme_root, f"{DOMAIN}{cert_dir_suffix}")
+    os.makedirs(cert_dir, exist_ok=True)
+    with open(os.path.join(cert_dir, "fullchain.cer"), "wb") as file_obj:
+        file_obj.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(os.path.join(cert_dir, f"{DOMAIN}.key"), "wb") as file_obj:
+        file_obj.write(key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.TraditionalOpenSSL,
+            serialization.NoEncryption(),
+        ))
+
+
+def summarize(scenario: str, hosts: int, wall: float, durations: List[float], succeeded: int,
+              sampler: ResourceSampler) -> Dict:
+    from job_repository import percentile
+
+    durations = sorted(durations)
+    return {
+        "scenario": scenario,
+        "hosts": hosts,
+        "wall_seconds": round(wall, 3),
+        "hosts_per_sec": round(hosts / wall, 2) if wall > 0 else None,
+        "attempts": len(durations),
+        "succeeded": succeeded,
+        "failed": hosts - succeeded,
+        "p50_seconds": round(percentile(durations, 50), 4) if durations else None,
+        "p95_seconds": round(percentile(durations, 95), 4) if durations else None,
+        "peak_rss_mb": round(sampler.peak_rss / 1024 / 1024, 1),
+        "peak_threads": sampler.peak_threads,
+    }
+
+
+def run_sync_scenario(sync_manager, ports: List[int]) -> Dict:
+    targets = [f"127.0.0.1:{port}" for port in ports]
+    durations: List[float] = []
+    outcomes: Dict[str, str] = {}
+    lock = threading.Lock()
+
+    def on_attempt(server, attempt, result):
+        with lock:
+            durations.append(result.get("duration") or 0.0)
+
+    def on_result(server, status, error_class):
+        with lock:
+            outcomes[server] = status
+
+    with ResourceSampler() as sampler:
+        started = time.monotonic()
+        sync_manager.run_batch_sync([DOMAIN], targets, on_result=on_result, on_attempt=on_attempt)
+        wall = time.monotonic() - started
+    succeeded = sum(1 for status in outcomes.values() if status in ("synced", "skipped"))
+    return summarize("sync", len(targets), wall, durations, succeeded, sampler)
+
+
+def run_inspect_scenario(sync_manager, ports: List[int]) -> Dict:
+    servers = [
+        {"id": index, "host": "127.0.0.1", "port": port, "group_name": "", "remark": ""}
+        for index, port in enumerate(ports)
+    ]
+    durations: List[float] = []
+    lock = threading.Lock()
+
+    def on_result(result):
+        with lock:
+            durations.append(result.get("duration") or 0.0)
+
+    with ResourceSampler() as sampler:
+        started = time.monotonic()
+        summary = sync_manager.scan_remote_certificates(DOMAIN, servers, on_result=on_result)
+        wall = time.monotonic() - started
+    return summarize("inspect", len(servers), wall, durations, summary["success"], sampler)
+
+
+def print_results(results: List[Dict]):
+    header = f"{'scenario':<9}{'hosts':>7}{'hosts/s':>10}{'p50':>9}{'p95':>9}{'failed':>8}{'rss MB':>9}{'threads':>9}"
+    print(header)
+    print("-" * len(header))
+    for row in results:
+        p50 = f"{row['p50_seconds']:.3f}" if row["p50_seconds"] is not None else "-"
+        p95 = f"{row['p95_seconds']:.3f}" if row["p95_seconds"] is not None else "-"
+        print(
+            f"{row['scenario']:<9}{row['hosts']:>7}{row['hosts_per_sec'] or 0:>10.1f}{p50:>9}{p95:>9}"
+            f"{row['failed']:>8}{row['peak_rss_mb']:>9.1f}{row['peak_threads']:>9}"
+        )
+
+
+def print_comparison(previous: Dict, current: Dict):
+    """Prints hosts/sec, p95 and peak RSS changes for scenarios present in both runs."""
+    earlier = {(row["scenario"], row["hosts"]): row for row in previous.get("results", [])}
+    print(f"\nCompared with {previous.get('commit', '?')} ({previous.get('created_at', '?')}):")
+
+    change = bench_report.change
+    for row in current["results"]:
+        old = earlier.get((row["scenario"], row["hosts"]))
+        if old is None:
+            continue
+        print(
+            f"  {row['scenario']:<8}{row['hosts']:>6} hosts  hosts/s {change(old['hosts_per_sec'], row['hosts_per_sec'])}"
+            f"  p95 {change(old['p95_seconds'], row['p95_seconds'])}"
+            f"  rss {change(old['peak_rss_mb'], row['peak_rss_mb'])}"
+            f"  threads {change(old['peak_threads'], row['peak_threads'])}"
+        )
+    if previous.get("settings") != current["settings"]:
+        print("  note: the runs used different settings")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark certificate sync against simulated SSH hosts")
+    parser.add_argument("--hosts", default="10,100,1000", help="comma-separated host counts (default: 10,100,1000)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated: sync, inspect")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added before each packet a host sends")
+    parser.add_argument("--bandwidth", type=int, default=0, help="bytes/sec per connection, 0 = unlimited")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="probability a connection is dropped (0-1)")
+    parser.add_argument("--seed", type=int, default=None, help="seed for failure injection")
+    parser.add_argument("--engine", choices=("threads", "asyncio", "processes"), help="overrides SYNC_ENGINE")
+    parser.add_argument("--server-processes", type=int, default=min(4, os.cpu_count() or 1),
+                        help="child processes serving the simulated hosts (default: min(4, CPUs))")
+    parser.add_argument("--in-process", action="store_true",
+                        help="run the simulated hosts in this process (their threads count towards the peaks)")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/sync-<time>-<commit>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    parser.add_argument("-v", "--verbose", action="store_true", help="show sync log output")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    host_counts = [int(value) for value in args.hosts.split(",") if value.strip()]
+    scenarios = [value.strip() for value in args.scenarios.split(",") if value.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        sys.exit(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR, format="%(levelname)s %(message)s")
+    fake_ssh.raise_fd_limit()
+    workdir = tempfile.mkdtemp(prefix="cert-sync-bench-")
+
+    # Config reads the environment when it is imported, so the paths are set first
+    os.environ.update({
+        "DRY_RUN": "False",
+        "ACME_CERT_ROOT": os.path.join(workdir, "acme"),
+        "SERVER_DB_PATH": os.path.join(workdir, "servers.db"),
+        "SERVER_LIST_PATH": os.path.join(workdir, "servers.txt"),
+        # Relative, so every simulated host writes under its own root
+        "REMOTE_DIR_BASE": "certs",
+    })
+    if args.engine:
+        os.environ["SYNC_ENGINE"] = args.engine
+
+    from config import Config
+    from host_health import get_host_health
+    from ssh_pool import get_connection_pool
+    from ssh_utils import SyncManager
+
+    config = Config()
+    write_certificate(config.ACME_CERT_ROOT, config.CERT_DIR_SUFFIX)
+    sync_manager = SyncManager()
+
+    settings = {
+        "latency": args.latency,
+        "bandwidth": args.bandwidth,
+        "failure_rate": args.failure_rate,
+        "server_processes": 0 if args.in_process else args.server_processes,
+        "sync_engine": config.SYNC_ENGINE,
+        "max_jobs": config.MAX_JOBS,
+        "async_concurrency": config.SYNC_ASYNC_CONCURRENCY,
+        "scan_max_jobs": config.SCAN_MAX_JOBS,
+        "transfer_mode": config.SYNC_TRANSFER_MODE,
+        "incremental": config.SYNC_INCREMENTAL,
+        "pool_enabled": config.SSH_POOL_ENABLED,
+        "retry_enabled": config.SYNC_RETRY_ENABLED,
+    }
+    report = bench_report.new_report("sync", settings)
+
+    for hosts in host_counts:
+        cluster_options = {
+            "hosts": hosts,
+            "root": os.path.join(workdir, f"hosts-{hosts}"),
+            "latency": args.latency,
+            "bandwidth": args.bandwidth,
+            "failure_rate": args.failure_rate,
+            "seed": args.seed,
+        }
+        if args.in_process:
+            cluster = fake_ssh.FakeSSHCluster(**cluster_options)
+        else:
+            cluster = fake_ssh.ShardedCluster(args.server_processes, **cluster_options)
+        print(f"Starting {hosts} simulated host(s) ...", file=sys.stderr)
+        ports = cluster.start()
+        try:
+            for scenario in scenarios:
+                runner = run_sync_scenario if scenario == "sync" else run_inspect_scenario
+                row = runner(sync_manager, ports)
+                report["results"].append(row)
+                print(f"  {scenario}: {row['hosts_per_sec']} hosts/s, p95 {row['p95_seconds']}s", file=sys.stderr)
+        finally:
+            # Pooled sessions and circuit state point at this cluster's ports, which may be reused
+            get_connection_pool(config).close_all()
+            get_host_health(config).reset()
+            stats = cluster.stop()
+        if stats:
+            print(f"  cluster: {stats}", file=sys.stderr)
+
+    print_results(report["results"])
+
+    output = bench_report.save_report(report, args.output)
+    print(f"\nResults saved to {output}")
+
+    if args.compare:
+        print_comparison(bench_report.load_report(args.compare), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+"""
+Local SSH/SFTP stand-in for benchmarks: one paramiko server per simulated
+host, each on its own loopback port with its own root directory. Exec
+requests run through `sh -c` inside the host root and SFTP paths are
+resolved under it, so relative REMOTE_DIR_BASE values land in per-host
+directories. Latency, bandwidth and connection failures can be injected.
+"""
+import logging
+import multiprocessing
+import os
+import random
+import selectors
+import socket
+import subprocess
+import threading
+import time
+from typing import Dict, List, Optional
+
+import paramiko
+
+logger = logging.getLogger(__name__)
+
+
+def raise_fd_limit():
+    """Lifts the soft open-file limit to the hard limit; 1000 hosts need a few thousand sockets."""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or hard > soft:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard if hard != resource.RLIM_INFINITY else 65536, hard))
+
+
+class _ShapedSocket:
+    """
+    Server-side socket wrapper: every send is delayed by latency (one reply
+    per request, so roughly one round trip), and traffic in both directions
+    is paced to bandwidth bytes per second.
+    """
+
+    def __init__(self, sock: socket.socket, latency: float, bandwidth: int):
+        self._sock = sock
+        self.latency = latency
+        self.bandwidth = bandwidth
+
+    def send(self, data):
+        if self.latency:
+            time.sleep(self.latency)
+        sent = self._sock.send(data)
+        if self.bandwidth:
+            time.sleep(sent / self.bandwidth)
+        return sent
+
+    def recv(self, size):
+        data = self._sock.recv(size)
+        if self.bandwidth and data:
+            time.sleep(len(data) / self.bandwidth)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+
+class _HostServer(paramiko.ServerInterface):
+    """Accepts any user and key, and runs exec requests in the host root."""
+
+    def __init__(self, cluster, root: str):
+        self.cluster = cluster
+        self.root = root
+
+    def get_allowed_auths(self, username):
+        return "publickey,password,none"
+
+    def check_auth_none(self, username):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED if kind == "session" else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        self.cluster.count("execs")
+        threading.Thread(target=self._exec, args=(channel, command.decode()), daemon=True).start()
+        return True
+
+    def _exec(self, channel, command):
+        try:
+            proc = subprocess.Popen(
+                ["sh", "-c", command],
+                cwd=self.root,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+        except OSError as exc:
+            channel.sendall_stderr(f"{exc}\n".encode())
+            channel.send_exit_status(127)
+            channel.close()
+            return
+
+        def pump_stdin():
+            try:
+                while True:
+                    chunk = channel.recv(65536)
+                    if not chunk:
+                        break
+                    proc.stdin.write(chunk)
+            except (OSError, EOFError):
+                pass
+            finally:
+                try:
+                    proc.stdin.close()
+                except OSError:
+                    pass
+
+        stderr_box = []
+        pump = threading.Thread(target=pump_stdin, daemon=True)
+        drain = threading.Thread(target=lambda: stderr_box.append(proc.stderr.read()), daemon=True)
+        pump.start()
+        drain.start()
+        stdout = proc.stdout.read()
+        proc.wait()
+        drain.join()
+        try:
+            channel.sendall(stdout)
+            channel.sendall_stderr(stderr_box[0] if stderr_box else b"")
+            channel.send_exit_status(proc.returncode)
+            channel.close()
+        except (OSError, EOFError):
+            pass
+
+
+class _Handle(paramiko.SFTPHandle):
+    def stat(self):
+        handle = getattr(self, "readfile", None) or getattr(self, "writefile", None)
+        return paramiko.SFTPAttributes.from_stat(os.fstat(handle.fileno()))
+
+
+class _HostSFTP(paramiko.SFTPServerInterface):
+    """SFTP view of one host root; absolute paths are re-rooted under it."""
+
+    def __init__(self, server: _HostServer, *args, **kwargs):
+        super().__init__(server, *args, **kwargs)
+        self.root = server.root
+
+    def _path(self, path: str) -> str:
+        return os.path.join(self.root, path.lstrip("/"))
+
+    def open(self, path, flags, attr):
+        try:
+            fd = os.open(self._path(path), flags, 0o644)
+        except OSError as exc:
+            return paramiko.SFTPServer.convert_errno(exc.errno)
+        if flags & os.O_WRONLY:
+            mode = "wb"
+        elif flags & os.O_RDWR:
+            mode = "r+b"
+        else:
+            mode = "rb"
+        handle = _Handle(flags)
+        fileobj = os.fdopen(fd, mode)
+        if mode != "wb":
+            handle.readfile = fileobj
+        if mode != "rb":
+            handle.writefile = fileobj
+        handle.filename = path
+        return handle
+
+    def stat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(self._path(path)))
+        except OSError as exc:
+            return paramiko.SFTPServer.convert_errno(exc.errno)
+
+    lstat = stat
+
+    def chattr(self, path, attr):
+        return paramiko.SFTP_OK
+
+    def mkdir(self, path, attr):
+        try:
+            os.mkdir(self._path(path))
+        except OSError as exc:
+            return paramiko.SFTPServer.convert_errno(exc.errno)
+        return paramiko.SFTP_OK
+
+    def remove(self, path):
+        try:
+            os.remove(self._path(path))
+        except OSError as exc:
+            return paramiko.SFTPServer.convert_errno(exc.errno)
+        return paramiko.SFTP_OK
+
+    def rename(self, oldpath, newpath):
+        try:
+            os.replace(self._path(oldpath), self._path(newpath))
+        except OSError as exc:
+            return paramiko.SFTPServer.convert_errno(exc.errno)
+        return paramiko.SFTP_OK
+
+    posix_rename = rename
+
+
+class FakeSSHCluster:
+    """
+    Runs hosts simulated SSH servers on 127.0.0.1 from one accept thread.
+    latency: seconds added before each packet a host sends.
+    bandwidth: bytes per second per connection in each direction (0 = unlimited).
+    failure_rate: probability that an incoming connection is dropped before
+    the SSH banner, which the sync engines see as a network error.
+    """
+
+    def __init__(self, hosts: int, root: str, latency: float = 0.0, bandwidth: int = 0,
+                 failure_rate: float = 0.0, seed: Optional[int] = None):
+        self.hosts = hosts
+        self.root = root
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._host_key = paramiko.RSAKey.generate(2048)
+        self._selector = selectors.DefaultSelector()
+        self._listeners: List[socket.socket] = []
+        self._transports: List[paramiko.Transport] = []
+        self._stats: Dict[str, int] = {"connections": 0, "dropped": 0, "execs": 0}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.ports: List[int] = []
+
+    def count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+    def start(self) -> List[int]:
+        for index in range(self.hosts):
+            host_root = os.path.join(self.root, f"host{index:05d}")
+            os.makedirs(host_root, exist_ok=True)
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind(("127.0.0.1", 0))
+            listener.listen(128)
+            listener.setblocking(False)
+            self._selector.register(listener, selectors.EVENT_READ, host_root)
+            self._listeners.append(listener)
+            self.ports.append(listener.getsockname()[1])
+        self._thread = threading.Thread(target=self._accept_loop, name="fake-ssh-accept", daemon=True)
+        self._thread.start()
+        return self.ports
+
+    def _accept_loop(self):
+        while not self._stop.is_set():
+            for key, _ in self._selector.select(timeout=0.2):
+                try:
+                    conn, _ = key.fileobj.accept()
+                except (BlockingIOError, OSError):
+                    continue
+                conn.setblocking(True)
+                self.count("connections")
+                if self.failure_rate and self._random.random() < self.failure_rate:
+                    self.count("dropped")
+                    conn.close()
+                    continue
+                self._serve(conn, key.data)
+
+    def _serve(self, conn: socket.socket, host_root: str):
+        transport = paramiko.Transport(_ShapedSocket(conn, self.latency, self.bandwidth))
+        transport.add_server_key(self._host_key)
+        transport.set_subsystem_handler("sftp", paramiko.SFTPServer, _HostSFTP)
+        try:
+            # With an event, start_server returns at once and negotiates on the transport thread
+            transport.start_server(event=threading.Event(), server=_HostServer(self, host_root))
+        except (paramiko.SSHException, OSError, EOFError) as exc:
+            logger.debug(f"Fake SSH session on {host_root} failed: {exc}")
+            transport.close()
+            return
+        with self._lock:
+            self._transports = [t for t in self._transports if t.is_active()]
+            self._transports.append(transport)
+
+    def stop(self) -> Dict[str, int]:
+        """Closes every listener and session and returns the connection counters."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        for listener in self._listeners:
+            self._selector.unregister(listener)
+            listener.close()
+        self._selector.close()
+        with self._lock:
+            transports, self._transports = self._transports, []
+        for transport in transports:
+            transport.close()
+        return self.stats()
+
+
+def _cluster_main(conn, kwargs):
+    raise_fd_limit()
+    cluster = FakeSSHCluster(**kwargs)
+    conn.send(cluster.start())
+    conn.recv()  # any message means stop
+    conn.send(cluster.stop())
+    conn.close()
+
+
+class ClusterProcess:
+    """
+    Runs a FakeSSHCluster in a child process, so the benchmark's RSS and
+    thread counts only cover the sync side. Usable as a context manager;
+    ports holds the listening ports once started.
+    """
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.ports: List[int] = []
+        self._conn = None
+        self._process = None
+
+    def start(self) -> List[int]:
+        context = multiprocessing.get_context("spawn")
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(target=_cluster_main, args=(child_conn, self.kwargs), daemon=True)
+        self._process.start()
+        self.ports = self._conn.recv()
+        return self.ports
+
+    def stop(self) -> Dict[str, int]:
+        """Stops the child and returns its connection counters."""
+        stats = {}
+        if self._process is None:
+            return stats
+        try:
+            self._conn.send("stop")
+            if self._conn.poll(30):
+                stats = self._conn.recv()
+        except (OSError, EOFError):
+            pass
+        self._process.join(10)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._process = None
+        return stats
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class ShardedCluster:
+    """
+    Spreads hosts over several ClusterProcess children, so one process's
+    GIL does not cap how fast the simulated hosts can answer.
+    """
+
+    def __init__(self, processes: int, hosts: int, root: str, seed: Optional[int] = None, **kwargs):
+        processes = max(1, min(processes, hosts))
+        sizes = [hosts // processes + (1 if index < hosts % processes else 0) for index in range(processes)]
+        self.shards = [
+            ClusterProcess(
+                hosts=size,
+                root=os.path.join(root, f"shard{index}"),
+                seed=None if seed is None else seed + index,
+                **kwargs,
+            )
+            for index, size in enumerate(sizes)
+        ]
+        self.ports: List[int] = []
+
+    def start(self) -> List[int]:
+        for shard in self.shards:
+            shard.start()
+        self.ports = [port for shard in self.shards for port in shard.ports]
+        return self.ports
+
+    def stop(self) -> Dict[str, int]:
+        totals: Dict[str, int] = {}
+        for shard in self.shards:
+            for name, value in shard.stop().items():
+                totals[name] = totals.get(name, 0) + value
+        return totals
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
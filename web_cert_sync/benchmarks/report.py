@@ -0,0 +1,59 @@
+"""Result files shared by the benchmark scripts: metadata, saving and comparison helpers."""
+import datetime
+import json
+import os
+import platform
+import subprocess
+from typing import Dict, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+
+def git_commit() -> str:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=APP_DIR,
+                               capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if dirty else commit
+
+
+def new_report(benchmark: str, settings: Dict) -> Dict:
+    return {
+        "benchmark": benchmark,
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": settings,
+        "results": [],
+    }
+
+
+def save_report(report: Dict, output: Optional[str] = None) -> str:
+    """Writes the report, by default to results/<benchmark>-<time>-<commit>.json, and returns the path."""
+    output = output or os.path.join(
+        RESULTS_DIR, f"{report['benchmark']}-{datetime.datetime.now():%Y%m%d-%H%M%S}-{report['commit']}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as file_obj:
+        json.dump(report, file_obj, indent=2)
+    return output
+
+
+def load_report(path: str) -> Dict:
+    with open(path) as file_obj:
+        return json.load(file_obj)
+
+
+def change(old, new) -> str:
+    """Relative change as "+12.3%", or "-" when either side is missing."""
+    if not old or new is None:
+        return "     -"
+    return f"{(new - old) / old * 100:+6.1f}%"
@@ -0,0 +1,188 @@
+import datetime
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+
+
+class CertificatePayload(NamedTuple):
+    """Immutable cert/key bytes read once per run, shared by every host upload."""
+
+    domain: str
+    cert_bytes: bytes
+    key_bytes: bytes
+    cert_sha256: str
+    key_sha256: str
+    not_after: datetime.datetime
+
+    @property
+    def size(self) -> int:
+        return len(self.cert_bytes) + len(self.key_bytes)
+
+
+def _not_valid_after(cert: x509.Certificate) -> datetime.datetime:
+    value = getattr(cert, "not_valid_after_utc", None)
+    if value is None:
+        value = cert.not_valid_after.replace(tzinfo=datetime.timezone.utc)
+    return value
+
+
+def _not_valid_before(cert: x509.Certificate) -> datetime.datetime:
+    value = getattr(cert, "not_valid_before_utc", None)
+    if value is None:
+        value = cert.not_valid_before.replace(tzinfo=datetime.timezone.utc)
+    return value
+
+
+def format_openssl_date(value: datetime.datetime) -> str:
+    """Formats a UTC datetime like `openssl x509 -enddate` does, e.g. "Mar  2 12:34:56 2024 GMT"."""
+    return f"{value:%b} {value.day:>2} {value:%H:%M:%S %Y} GMT"
+
+
+def days_until(value: datetime.datetime, now: Optional[datetime.datetime] = None) -> int:
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    return (value - now).days
+
+
+def parse_certificate_metadata(pem_bytes: bytes) -> Dict:
+    """
+    Parses the leaf certificate of a PEM chain in-process.
+    Raises ValueError if the data is not a PEM certificate.
+    """
+    cert = x509.load_pem_x509_certificate(pem_bytes)
+    not_after = _not_valid_after(cert)
+    not_before = _not_valid_before(cert)
+
+    try:
+        san_ext = cert.extensions.get_extension_for_class(x509.SubjectAlternativeName)
+        sans = san_ext.value.get_values_for_type(x509.DNSName)
+        sans += [str(address) for address in san_ext.value.get_values_for_type(x509.IPAddress)]
+    except x509.ExtensionNotFound:
+        sans = []
+
+    return {
+        "expiry_date": format_openssl_date(not_after),
+        "days_left": days_until(not_after),
+        "not_after": not_after.isoformat(),
+        "not_before": not_before.isoformat(),
+        "subject": cert.subject.rfc4514_string(),
+        "issuer": cert.issuer.rfc4514_string(),
+        "sans": sans,
+        "serial_number": format(cert.serial_number, "x"),
+        "fingerprint_sha256": cert.fingerprint(hashes.SHA256()).hex(),
+    }
+
+
+class CertificateMetadataCache:
+    """
+    In-process cache of parse_certificate_metadata results for local files,
+    keyed by path and validated against (mtime_ns, size) on every lookup, so
+    an acme.sh renewal rewriting the file is picked up on the next request.
+    days_left is recomputed per lookup since it depends on the current time.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        # path -> ((mtime_ns, size), metadata, not_after), least recently used first
+        self._entries: "OrderedDict[str, Tuple[Tuple[int, int], Dict, datetime.datetime]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path: str) -> Dict:
+        """
+        Returns metadata for the certificate at path.
+        Raises OSError if the file is unreadable and ValueError if it does not parse.
+        """
+        st = os.stat(path)
+        signature = (st.st_mtime_ns, st.st_size)
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return self._fresh(entry[1], entry[2])
+            self.misses += 1
+
+        with open(path, "rb") as file_obj:
+            pem_bytes = file_obj.read()
+        metadata = parse_certificate_metadata(pem_bytes)
+        not_after = datetime.datetime.fromisoformat(metadata["not_after"])
+
+        with self._lock:
+            self._entries[path] = (signature, metadata, not_after)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return self._fresh(metadata, not_after)
+
+    @staticmethod
+    def _fresh(metadata: Dict, not_after: datetime.datetime) -> Dict:
+        result = dict(metadata)
+        result["sans"] = list(metadata["sans"])
+        result["days_left"] = days_until(not_after)
+        return result
+
+    def invalidate(self, path: Optional[str] = None):
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_metadata_cache_lock = threading.Lock()
+_metadata_cache: Optional[CertificateMetadataCache] = None
+
+
+def get_metadata_cache() -> CertificateMetadataCache:
+    """Returns the process-wide local certificate metadata cache."""
+    global _metadata_cache
+    with _metadata_cache_lock:
+        if _metadata_cache is None:
+            _metadata_cache = CertificateMetadataCache()
+        return _metadata_cache
+
+
+def load_certificate_payload(domain: str, cert_file: str, key_file: str) -> CertificatePayload:
+    """
+    Reads and validates the certificate chain and private key for a domain.
+    Raises ValueError if either file does not parse or the key does not
+    belong to the leaf certificate.
+    """
+    with open(cert_file, "rb") as file_obj:
+        cert_bytes = file_obj.read()
+    with open(key_file, "rb") as file_obj:
+        key_bytes = file_obj.read()
+
+    try:
+        cert = x509.load_pem_x509_certificate(cert_bytes)
+    except ValueError as exc:
+        raise ValueError(f"Invalid certificate {cert_file}: {exc}")
+    try:
+        private_key = serialization.load_pem_private_key(key_bytes, password=None)
+    except (TypeError, ValueError) as exc:
+        raise ValueError(f"Invalid private key {key_file}: {exc}")
+
+    spki = serialization.PublicFormat.SubjectPublicKeyInfo
+    der = serialization.Encoding.DER
+    if private_key.public_key().public_bytes(der, spki) != cert.public_key().public_bytes(der, spki):
+        raise ValueError(f"Private key {key_file} does not match certificate {cert_file}")
+
+    return CertificatePayload(
+        domain=domain,
+        cert_bytes=cert_bytes,
+        key_bytes=key_bytes,
+        cert_sha256=hashlib.sha256(cert_bytes).hexdigest(),
+        key_sha256=hashlib.sha256(key_bytes).hexdigest(),
+        not_after=_not_valid_after(cert),
+    )
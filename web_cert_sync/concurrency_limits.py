@@ -0,0 +1,155 @@
+import asyncio
+import ipaddress
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    from .server_repository import ServerRepository
+except ImportError:
+    from server_repository import ServerRepository
+
+LimitKey = Tuple[str, str]
+
+
+class ConcurrencyLimiter:
+    """
+    Hierarchical session caps: a global cap (enforced by the caller's pool
+    size) plus per-group and per-CIDR caps. A host takes one slot in its
+    group's cap, if the group has one, and in every CIDR cap whose network
+    contains it. CIDR caps only match hosts given as IP literals. Hosts are
+    matched in their canonical "host:port" form, so "1.2.3.4" and
+    " 1.2.3.4:22" count against the same caps (default_port fills in a
+    missing port).
+    """
+
+    def __init__(self, limits: Sequence[Dict] = (), host_groups: Optional[Dict[str, str]] = None, default_port: int = 22):
+        self.default_port = default_port
+        self.host_groups = {self._canonical(server): group for server, group in (host_groups or {}).items()}
+        self.capacity: Dict[LimitKey, int] = {}
+        self.networks = []
+        for limit in limits:
+            key = (limit["scope"], limit["match_value"])
+            self.capacity[key] = int(limit["max_sessions"])
+            if limit["scope"] == "cidr":
+                self.networks.append((ipaddress.ip_network(limit["match_value"], strict=False), key))
+        self.in_use: Dict[LimitKey, int] = {key: 0 for key in self.capacity}
+        self._keys_cache: Dict[str, Tuple[LimitKey, ...]] = {}
+
+    @classmethod
+    def from_repository(cls, repository):
+        return cls(repository.list_concurrency_limits(), repository.list_server_groups(), repository.config.SSH_PORT_DEFAULT)
+
+    def __bool__(self):
+        return bool(self.capacity)
+
+    def keys_for(self, server: str) -> Tuple[LimitKey, ...]:
+        """Returns the sorted limit keys a host counts against."""
+        keys = self._keys_cache.get(server)
+        if keys is not None:
+            return keys
+        canonical = self._canonical(server)
+        keys = self._keys_cache.get(canonical)
+        if keys is not None:
+            self._keys_cache[server] = keys
+            return keys
+        found = []
+        group = self.host_groups.get(canonical)
+        if group is not None and ("group", group) in self.capacity:
+            found.append(("group", group))
+        if self.networks:
+            try:
+                address = ipaddress.ip_address(ServerRepository.split_server(canonical, self.default_port)[0])
+            except ValueError:
+                address = None
+            if address is not None:
+                for network, key in self.networks:
+                    if address.version == network.version and address in network:
+                        found.append(key)
+        keys = self._keys_cache[server] = self._keys_cache[canonical] = tuple(sorted(found))
+        return keys
+
+    def _canonical(self, server: str) -> str:
+        return ServerRepository.canonical_server(server, self.default_port)
+
+    def has_capacity(self, keys: Sequence[LimitKey]) -> bool:
+        return all(self.in_use[key] < self.capacity[key] for key in keys)
+
+    def acquire(self, keys: Sequence[LimitKey]):
+        for key in keys:
+            self.in_use[key] += 1
+
+    def release(self, keys: Sequence[LimitKey]):
+        for key in keys:
+            self.in_use[key] -= 1
+
+    def describe(self) -> str:
+        return ", ".join(f"{scope} {value} <= {self.capacity[(scope, value)]}" for scope, value in sorted(self.capacity))
+
+
+class LimitedQueue:
+    """
+    Ready queue for the thread-pool scheduler. Hosts are bucketed by the
+    set of limits they count against, so a saturated group never blocks the
+    head of the line: pop() returns the oldest host from any bucket whose
+    limits all have capacity, rotating between buckets. Not thread-safe;
+    only the scheduler loop uses it.
+    """
+
+    def __init__(self, limiter: ConcurrencyLimiter):
+        self.limiter = limiter
+        self._buckets: "OrderedDict[Tuple[LimitKey, ...], deque]" = OrderedDict()
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def push(self, server: str, item):
+        keys = self.limiter.keys_for(server)
+        self._buckets.setdefault(keys, deque()).append(item)
+        self._size += 1
+
+    def pop(self):
+        """Returns (keys, item) for the next runnable host and acquires its slots, or None."""
+        for keys in list(self._buckets):
+            if not self.limiter.has_capacity(keys):
+                continue
+            bucket = self._buckets.pop(keys)
+            item = bucket.popleft()
+            if bucket:
+                self._buckets[keys] = bucket  # re-append at the end: round-robin between buckets
+            self._size -= 1
+            self.limiter.acquire(keys)
+            return keys, item
+        return None
+
+    def drain(self) -> list:
+        """Removes and returns every queued item, oldest bucket first, without taking slots."""
+        items = [item for bucket in self._buckets.values() for item in bucket]
+        self._buckets.clear()
+        self._size = 0
+        return items
+
+
+class AsyncLimitSlots:
+    """Per-limit asyncio semaphores, acquired in sorted key order so tasks cannot deadlock."""
+
+    def __init__(self, limiter: ConcurrencyLimiter):
+        self.limiter = limiter
+        self._semaphores = {key: asyncio.Semaphore(size) for key, size in limiter.capacity.items()}
+
+    async def acquire(self, server: str) -> List[asyncio.Semaphore]:
+        held = []
+        try:
+            for key in self.limiter.keys_for(server):
+                semaphore = self._semaphores[key]
+                await semaphore.acquire()
+                held.append(semaphore)
+        except BaseException:
+            self.release(held)
+            raise
+        return held
+
+    @staticmethod
+    def release(held: List[asyncio.Semaphore]):
+        for semaphore in reversed(held):
+            semaphore.release()
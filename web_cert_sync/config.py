@@ -14,17 +14,93 @@ class Config:
 
     # ACME cert root
     ACME_CERT_ROOT = os.getenv("ACME_CERT_ROOT", "/root/.acme.sh")
+    # Domain index: how often the root is re-checked, and how often every domain dir is re-read
+    DOMAIN_INDEX_REFRESH_SECONDS = int(os.getenv('DOMAIN_INDEX_REFRESH_SECONDS', 10))
+    DOMAIN_INDEX_FULL_RESCAN_SECONDS = int(os.getenv('DOMAIN_INDEX_FULL_RESCAN_SECONDS', 300))
 
     # SSH Configuration
     SSH_PORT_DEFAULT = int(os.getenv('SSH_PORT_DEFAULT', 22))
     SSH_CONNECT_TIMEOUT = int(os.getenv('SSH_CONNECT_TIMEOUT', 10))
     SSH_EXEC_TIMEOUT = int(os.getenv('SSH_EXEC_TIMEOUT', 30))
+    # Lower bound for the per-host adaptive connect timeout (SSH_CONNECT_TIMEOUT is the upper bound)
+    SSH_CONNECT_TIMEOUT_MIN = int(os.getenv('SSH_CONNECT_TIMEOUT_MIN', 2))
+    # SSH identities, loaded once per process: comma-separated private key files (empty = the ~/.ssh id_ed25519,
+    # id_ecdsa and id_rsa that exist), their passphrase, and whether ssh-agent keys are tried after them
+    SSH_KEY_FILES = os.getenv('SSH_KEY_FILES', '')
+    SSH_KEY_PASSPHRASE = os.getenv('SSH_KEY_PASSPHRASE', '')
+    SSH_USE_AGENT = os.getenv('SSH_USE_AGENT', 'True').lower() in ('true', '1', 't')
+
+    # Per-host circuit breaker: skip hosts after N consecutive failures until the cooldown passes
+    HOST_CIRCUIT_ENABLED = os.getenv('HOST_CIRCUIT_ENABLED', 'True').lower() in ('true', '1', 't')
+    HOST_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('HOST_CIRCUIT_FAILURE_THRESHOLD', 3))
+    HOST_CIRCUIT_COOLDOWN = int(os.getenv('HOST_CIRCUIT_COOLDOWN', 300))
+
+    # SSH Connection Pool
+    SSH_POOL_ENABLED = os.getenv('SSH_POOL_ENABLED', 'True').lower() in ('true', '1', 't')
+    SSH_POOL_MAX_SIZE = int(os.getenv('SSH_POOL_MAX_SIZE', 64))
+    SSH_POOL_IDLE_TIMEOUT = int(os.getenv('SSH_POOL_IDLE_TIMEOUT', 300))
 
     # Sync Configuration
     REMOTE_DIR_BASE = os.getenv('REMOTE_DIR_BASE', '/etc/nginx/ssl')
     MAX_JOBS = int(os.getenv('MAX_JOBS', 5))
+    # Sync engine: "threads" (ThreadPoolExecutor capped at MAX_JOBS), "asyncio" (requires asyncssh)
+    # or "processes" (SYNC_PROCESSES worker processes with MAX_JOBS threads each; 0 = one per CPU)
+    SYNC_ENGINE = os.getenv('SYNC_ENGINE', 'threads')
+    SYNC_ASYNC_CONCURRENCY = int(os.getenv('SYNC_ASYNC_CONCURRENCY', 500))
+    SYNC_PROCESSES = int(os.getenv('SYNC_PROCESSES', 0))
     CERT_DIR_SUFFIX = os.getenv('CERT_DIR_SUFFIX', '_ecc')
     POST_SYNC_CMD = os.getenv('POST_SYNC_CMD', '')
+    # Reload coalescing: when > 0, POST_SYNC_CMD runs once per host RELOAD_DEBOUNCE_SECONDS after its last
+    # deploy, covering every job that deployed to it meanwhile, but at most RELOAD_MAX_DELAY_SECONDS after the first
+    RELOAD_DEBOUNCE_SECONDS = float(os.getenv('RELOAD_DEBOUNCE_SECONDS', 0))
+    RELOAD_MAX_DELAY_SECONDS = float(os.getenv('RELOAD_MAX_DELAY_SECONDS', 120))
+    # Transfer mode: "sftp" (mkdir, upload and reload as separate calls) or "stream" (one exec per host)
+    SYNC_TRANSFER_MODE = os.getenv('SYNC_TRANSFER_MODE', 'sftp')
+    # Skip upload and post-sync on hosts whose remote files already match the local SHA-256
+    SYNC_INCREMENTAL = os.getenv('SYNC_INCREMENTAL', 'False').lower() in ('true', '1', 't')
+
+    # Wave/canary rollout (used when a sync is started with rollout enabled): canary group first, then the
+    # groups in SYNC_GROUP_ORDER, then the rest; each group split into waves of SYNC_WAVE_SIZE hosts and/or
+    # SYNC_WAVE_PERCENT % (0 = whole group); a wave starts once the previous one reaches the success rate
+    SYNC_CANARY_GROUP = os.getenv('SYNC_CANARY_GROUP', 'canary')
+    SYNC_GROUP_ORDER = os.getenv('SYNC_GROUP_ORDER', '')
+    SYNC_WAVE_SIZE = int(os.getenv('SYNC_WAVE_SIZE', 0))
+    SYNC_WAVE_PERCENT = float(os.getenv('SYNC_WAVE_PERCENT', 0))
+    SYNC_WAVE_MIN_SUCCESS_RATE = float(os.getenv('SYNC_WAVE_MIN_SUCCESS_RATE', 0.95))
+
+    # Automatic retries: per error class "class:attempts:base_delay:max_delay", comma-separated
+    # (classes: throttled, timeout, refused, network, remote, auth, other; unlisted classes are not retried),
+    # exponential backoff with full jitter, and a deadline in seconds from the start of the run.
+    # Attempts beyond HOST_CIRCUIT_FAILURE_THRESHOLD are never made: a host stops retrying once its circuit opens
+    SYNC_RETRY_ENABLED = os.getenv('SYNC_RETRY_ENABLED', 'True').lower() in ('true', '1', 't')
+    SYNC_RETRY_POLICIES = os.getenv('SYNC_RETRY_POLICIES', 'throttled:3:2:30,timeout:2:5:30,refused:2:5:30,network:3:2:30')
+    SYNC_RETRY_DEADLINE = int(os.getenv('SYNC_RETRY_DEADLINE', 600))
+
+    # Durable sync jobs: each process runs a worker that polls SERVER_DB_PATH for queued jobs every
+    # JOB_POLL_INTERVAL seconds, heartbeats the job it runs, and takes over a running job whose
+    # heartbeat is older than JOB_LEASE_SECONDS (its process died); finished jobs are kept JOB_RETENTION_DAYS
+    JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 2))
+    JOB_HEARTBEAT_INTERVAL = float(os.getenv('JOB_HEARTBEAT_INTERVAL', 5))
+    JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', 30))
+    JOB_RETENTION_DAYS = int(os.getenv('JOB_RETENTION_DAYS', 30))
+    # Last log lines per running job kept in memory for its streams (0 = streams poll the database)
+    JOB_LOG_BUFFER_LINES = int(os.getenv('JOB_LOG_BUFFER_LINES', 2000))
+    # Job log streams: send the lines of every SSE_BATCH_INTERVAL seconds (or SSE_BATCH_MAX_BYTES) as
+    # one frame instead of one frame per line (0 = off); SSE_PROGRESS_INTERVAL > 0 adds [PROGRESS] frames
+    SSE_BATCH_INTERVAL = float(os.getenv('SSE_BATCH_INTERVAL', 0))
+    SSE_BATCH_MAX_BYTES = int(os.getenv('SSE_BATCH_MAX_BYTES', 65536))
+    SSE_PROGRESS_INTERVAL = float(os.getenv('SSE_PROGRESS_INTERVAL', 0))
+
+    # Remote expiry scan: parallel inspections and the days_left threshold counted as "expiring"
+    SCAN_MAX_JOBS = int(os.getenv('SCAN_MAX_JOBS', 20))
+    SCAN_EXPIRY_WARN_DAYS = int(os.getenv('SCAN_EXPIRY_WARN_DAYS', 30))
+
+    # /metrics (Prometheus): scrapers must send "Authorization: Bearer <token>"; when empty, /metrics
+    # is only served to logged-in console sessions
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+    # Comma-separated "module:attribute" hooks that receive per-host phase timings (see phase_timing.py)
+    PHASE_TIMING_HOOKS = os.getenv('PHASE_TIMING_HOOKS', '')
 
     # Security Configuration
     BASIC_AUTH_USERNAME = os.getenv('BASIC_AUTH_USERNAME', 'admin')
@@ -0,0 +1,69 @@
+from typing import List, Optional, Tuple
+
+try:
+    from . import retry_policy
+except ImportError:
+    import retry_policy
+
+# (message, level) pairs; each engine hands them to its own log() helper
+LogLines = List[Tuple[str, str]]
+
+
+def start_line(server: str, deploys) -> str:
+    if len(deploys) > 1:
+        return f"Starting sync of {len(deploys)} domains to {server} ..."
+    return f"Starting sync to {server} ..."
+
+
+def dry_run_lines(config, server: str, host: str, port: int, deploys, stream: bool) -> LogLines:
+    """What a DRY_RUN sync of deploys to server reports instead of connecting."""
+    lines = [(f"[Dry Run] Would connect to {host}:{port} as {config.REMOTE_USER}", "INFO")]
+    for deploy in deploys:
+        if stream:
+            lines.append((f"[Dry Run] Would stream {deploy['cert_file']} and {deploy['key_file']} to {deploy['remote_dir']} in one exec", "INFO"))
+        else:
+            lines.append((f"[Dry Run] Would mkdir -p {deploy['remote_dir']}", "INFO"))
+            lines.append((f"[Dry Run] Would scp {deploy['cert_file']} and {deploy['key_file']} to {deploy['remote_dir']}", "INFO"))
+    if config.POST_SYNC_CMD:
+        lines.append((f"[Dry Run] Would execute post-sync command: {config.POST_SYNC_CMD}", "INFO"))
+    lines.append((f"Successfully synced to {server} (Dry Run)", "INFO"))
+    return lines
+
+
+def unchanged_domain_line(server: str, deploy) -> Tuple[str, str]:
+    return f"Certificate for {deploy['domain']} unchanged on {server}, skipped upload", "SKIP"
+
+
+def mkdir_failed_line(server: str, err: str) -> Tuple[str, str]:
+    return f"Failed to create directory on {server}: {err}", "ERROR"
+
+
+def post_sync_line(server: str, exit_status: int, err: str) -> Tuple[str, str]:
+    """Reports the post-sync command's outcome; a failed reload does not fail the sync."""
+    if exit_status != 0:
+        return f"Post-sync command failed on {server}: {err}", "WARN"
+    return "Post-sync command executed successfully", "INFO"
+
+
+def remote_failure(status: str) -> Tuple[Optional[str], Optional[str]]:
+    """(error_class, error) of a session that completed with status; both None unless it failed."""
+    if status == "failed":
+        return retry_policy.REMOTE, "remote command failed"
+    return None, None
+
+
+def outcome_lines(server: str, status: str, summary: str) -> LogLines:
+    """What a completed session reports; failures were already logged by the step that failed."""
+    if status == "skipped":
+        return [(f"Certificate unchanged on {server}, skipped upload and post-sync {summary}", "SKIP")]
+    if status == "synced":
+        return [(f"Successfully synced to {server} {summary}", "INFO")]
+    return []
+
+
+def error_line(server: str, error: str, summary: str) -> Tuple[str, str]:
+    return f"Error syncing to {server}: {error}; failed {summary}", "ERROR"
+
+
+def circuit_opened_line(server: str, cooldown: int) -> Tuple[str, str]:
+    return f"Circuit opened for {server} after repeated failures; skipping it for {cooldown}s", "WARN"
@@ -0,0 +1,175 @@
+import datetime
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _iso_mtime(mtime: Optional[float]) -> Optional[str]:
+    if mtime is None:
+        return None
+    return datetime.datetime.fromtimestamp(mtime, datetime.timezone.utc).isoformat()
+
+
+class DomainIndex:
+    """
+    In-memory index of <domain><suffix> directories under the ACME root.
+
+    The root is listed once with os.scandir. Later refreshes (at most every
+    refresh_interval seconds) stat the root and only re-list it when its
+    mtime changed, i.e. when directories were added or removed. Each known
+    domain directory is stat'ed and its files re-read only when the
+    directory mtime changed. acme.sh rewrites fullchain.cer in place
+    without touching the directory mtime, so every domain's files are
+    re-read on a slower full_rescan_interval to pick up renewals.
+    """
+
+    def __init__(self, root: str, suffix: str = "_ecc", refresh_interval: float = 10, full_rescan_interval: float = 300):
+        self.root = root
+        self.suffix = suffix
+        self.refresh_interval = refresh_interval
+        self.full_rescan_interval = full_rescan_interval
+        self._lock = threading.Lock()
+        self._root_mtime_ns: Optional[int] = None
+        self._entries: Dict[str, Dict] = {}
+        self._last_refresh = 0.0
+        self._last_full_rescan = 0.0
+
+    def _scan_domain_dir(self, domain: str, path: str, dir_mtime_ns: int) -> Dict:
+        cert_name = "fullchain.cer"
+        key_name = f"{domain}.key"
+        found = {}
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.name in (cert_name, key_name):
+                        try:
+                            found[entry.name] = entry.stat().st_mtime
+                        except OSError:
+                            pass
+        except OSError as e:
+            logger.warning(f"Failed to scan certificate directory {path}: {e}")
+
+        return {
+            "domain": domain,
+            "path": path,
+            "cert_file": os.path.join(path, cert_name),
+            "key_file": os.path.join(path, key_name),
+            "has_cert": cert_name in found,
+            "has_key": key_name in found,
+            "cert_mtime": found.get(cert_name),
+            "key_mtime": found.get(key_name),
+            "dir_mtime_ns": dir_mtime_ns,
+        }
+
+    def _list_root(self) -> Dict[str, int]:
+        """Returns domain -> directory mtime_ns for every suffixed directory under the root."""
+        domains = {}
+        with os.scandir(self.root) as it:
+            for entry in it:
+                if not entry.name.endswith(self.suffix) or len(entry.name) <= len(self.suffix):
+                    continue
+                try:
+                    if entry.is_dir():
+                        domains[entry.name[:-len(self.suffix)]] = entry.stat().st_mtime_ns
+                except OSError:
+                    continue
+        return domains
+
+    def refresh(self, force: bool = False):
+        """Brings the index up to date; cheap when nothing changed since the last refresh."""
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._root_mtime_ns is not None and now - self._last_refresh < self.refresh_interval:
+                return
+
+            try:
+                root_mtime_ns = os.stat(self.root).st_mtime_ns
+            except OSError:
+                self._entries = {}
+                self._root_mtime_ns = None
+                self._last_refresh = now
+                return
+
+            full_rescan = force or now - self._last_full_rescan >= self.full_rescan_interval
+            if full_rescan or root_mtime_ns != self._root_mtime_ns:
+                dir_mtimes = self._list_root()
+            else:
+                dir_mtimes = {}
+                for domain, entry in self._entries.items():
+                    try:
+                        dir_mtimes[domain] = os.stat(entry["path"]).st_mtime_ns
+                    except OSError:
+                        continue
+
+            entries = {}
+            for domain, dir_mtime_ns in dir_mtimes.items():
+                previous = self._entries.get(domain)
+                if previous is not None and not full_rescan and previous["dir_mtime_ns"] == dir_mtime_ns:
+                    entries[domain] = previous
+                else:
+                    path = os.path.join(self.root, f"{domain}{self.suffix}")
+                    entries[domain] = self._scan_domain_dir(domain, path, dir_mtime_ns)
+
+            self._entries = entries
+            self._root_mtime_ns = root_mtime_ns
+            self._last_refresh = now
+            if full_rescan:
+                self._last_full_rescan = now
+
+    def invalidate(self):
+        """Forces the next lookup to re-list the root and re-read every domain directory."""
+        with self._lock:
+            self._root_mtime_ns = None
+            self._last_full_rescan = 0.0
+
+    def domains(self) -> List[str]:
+        """Sorted domains whose certificate and key both exist."""
+        self.refresh()
+        with self._lock:
+            return sorted(d for d, e in self._entries.items() if e["has_cert"] and e["has_key"])
+
+    def entries(self) -> List[Dict]:
+        """Per-domain presence and last-modified info, sorted by domain."""
+        self.refresh()
+        with self._lock:
+            items = [self._entries[d] for d in sorted(self._entries)]
+        return [
+            {
+                "domain": e["domain"],
+                "has_cert": e["has_cert"],
+                "has_key": e["has_key"],
+                "cert_modified": _iso_mtime(e["cert_mtime"]),
+                "key_modified": _iso_mtime(e["key_mtime"]),
+            }
+            for e in items
+        ]
+
+    def get(self, domain: str) -> Optional[Dict]:
+        self.refresh()
+        with self._lock:
+            entry = self._entries.get(domain)
+            return dict(entry) if entry else None
+
+
+_index_lock = threading.Lock()
+_indexes: Dict[tuple, DomainIndex] = {}
+
+
+def get_domain_index(config) -> DomainIndex:
+    """Returns the process-wide index for the configured ACME root and suffix."""
+    key = (config.ACME_CERT_ROOT, config.CERT_DIR_SUFFIX)
+    with _index_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = DomainIndex(
+                config.ACME_CERT_ROOT,
+                config.CERT_DIR_SUFFIX,
+                refresh_interval=config.DOMAIN_INDEX_REFRESH_SECONDS,
+                full_rescan_interval=config.DOMAIN_INDEX_FULL_RESCAN_SECONDS,
+            )
+            _indexes[key] = index
+        return index
@@ -0,0 +1,21 @@
+import os
+import shutil
+
+# Prometheus multiprocess mode: each worker writes its metric samples under this directory and
+# /metrics merges them, so a scrape sees all workers no matter which one answers it.
+_multiproc_dir = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus_multiproc")
+
+
+def on_starting(server):
+    """Start from an empty directory so samples of a previous run are not counted again."""
+    shutil.rmtree(_multiproc_dir, ignore_errors=True)
+    os.makedirs(_multiproc_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """Drops a dead worker's live gauges (in-flight / queued hosts) from the aggregate."""
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
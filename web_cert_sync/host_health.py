@@ -0,0 +1,204 @@
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class _HostState:
+    __slots__ = ("srtt", "rttvar", "consecutive_failures", "state", "opened_at", "probing", "probe_started",
+                 "last_error", "last_seen")
+
+    def __init__(self):
+        self.srtt: Optional[float] = None
+        self.rttvar: float = 0.0
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probing = False
+        self.probe_started = 0.0
+        self.last_error = ""
+        self.last_seen = 0.0
+
+
+class HostHealthTracker:
+    """
+    Per-host connect latency estimate and circuit breaker, keyed by "host:port".
+
+    The connect timeout follows the TCP retransmission timer: a smoothed
+    latency plus four deviations, doubled for each consecutive failure and
+    clamped to [min_timeout, max_timeout]. Hosts with no samples use
+    max_timeout. After failure_threshold consecutive failures the circuit
+    opens and allow() rejects the host until cooldown seconds have passed.
+    A single probe is then let through (half-open). It closes the circuit on
+    success and re-opens it on failure. A probe that reported neither within
+    probe_timeout seconds (its worker died, or an exception skipped the
+    bookkeeping) is considered abandoned and the next caller probes instead.
+
+    on_change, when set, is called with (key, state) after every transition
+    so another process can mirror the host with restore().
+    """
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 300, min_timeout: float = 2, max_timeout: float = 10,
+                 probe_timeout: Optional[float] = None):
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.min_timeout = min(min_timeout, max_timeout)
+        self.max_timeout = max_timeout
+        self.probe_timeout = probe_timeout if probe_timeout is not None else max_timeout
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, _HostState] = {}
+        self.on_change: Optional[Callable[[str, Dict], None]] = None
+
+    def _get_locked(self, key: str) -> _HostState:
+        state = self._hosts.get(key)
+        if state is None:
+            state = self._hosts[key] = _HostState()
+        return state
+
+    def allow(self, key: str) -> Tuple[bool, str]:
+        """Returns (allowed, reason); reason explains why an open circuit rejected the host."""
+        with self._lock:
+            state = self._get_locked(key)
+            if state.state == CLOSED:
+                return True, ""
+            remaining = self.cooldown - (time.monotonic() - state.opened_at)
+            if state.state == OPEN and remaining > 0:
+                return False, (
+                    f"circuit open after {state.consecutive_failures} consecutive failures "
+                    f"(last: {state.last_error or 'unknown'}), retry in {int(remaining) + 1}s"
+                )
+            now = time.monotonic()
+            if state.probing and now - state.probe_started < self.probe_timeout:
+                return False, "circuit half-open, probe already in progress"
+            state.state = HALF_OPEN
+            state.probing = True
+            state.probe_started = now
+        self._notify(key)
+        return True, ""
+
+    def is_open(self, key: str) -> bool:
+        """True while the circuit of key rejects hosts; unlike allow() it never starts a probe."""
+        with self._lock:
+            state = self._hosts.get(key)
+            if state is None or state.state == CLOSED:
+                return False
+            if state.state == HALF_OPEN:
+                return state.probing and time.monotonic() - state.probe_started < self.probe_timeout
+            return time.monotonic() - state.opened_at < self.cooldown
+
+    def connect_timeout(self, key: str) -> float:
+        with self._lock:
+            state = self._hosts.get(key)
+            if state is None or state.srtt is None:
+                return self.max_timeout
+            timeout = (state.srtt + 4 * state.rttvar) * (2 ** min(state.consecutive_failures, 6))
+        return max(self.min_timeout, min(self.max_timeout, timeout))
+
+    def record_success(self, key: str, connect_latency: Optional[float] = None):
+        """Records a completed session; connect_latency is only given for fresh connections."""
+        with self._lock:
+            state = self._get_locked(key)
+            if connect_latency is not None:
+                if state.srtt is None:
+                    state.srtt = connect_latency
+                    state.rttvar = connect_latency / 2
+                else:
+                    state.rttvar = 0.75 * state.rttvar + 0.25 * abs(state.srtt - connect_latency)
+                    state.srtt = 0.875 * state.srtt + 0.125 * connect_latency
+            state.consecutive_failures = 0
+            state.state = CLOSED
+            state.probing = False
+            state.last_error = ""
+            state.last_seen = time.time()
+        self._notify(key)
+
+    def record_failure(self, key: str, error: str = "") -> bool:
+        """Records a failed attempt; returns True if this failure opened the circuit."""
+        with self._lock:
+            state = self._get_locked(key)
+            state.consecutive_failures += 1
+            state.last_error = error
+            state.last_seen = time.time()
+            was_open = state.state == OPEN
+            if state.state == HALF_OPEN or state.consecutive_failures >= self.failure_threshold:
+                state.state = OPEN
+                state.opened_at = time.monotonic()
+            state.probing = False
+            opened = state.state == OPEN and not was_open
+        self._notify(key)
+        return opened
+
+    def export(self, key: str) -> Optional[Dict]:
+        """The raw state of key, as accepted by restore(); None for an unknown host."""
+        with self._lock:
+            state = self._hosts.get(key)
+            if state is None:
+                return None
+            return {name: getattr(state, name) for name in _HostState.__slots__}
+
+    def restore(self, key: str, fields: Dict):
+        """Replaces the state of key with one exported by another tracker."""
+        with self._lock:
+            state = self._get_locked(key)
+            for name in _HostState.__slots__:
+                if name in fields:
+                    setattr(state, name, fields[name])
+
+    def _notify(self, key: str):
+        callback = self.on_change
+        if callback is None:
+            return
+        fields = self.export(key)
+        if fields is not None:
+            callback(key, fields)
+
+    def reset(self, key: Optional[str] = None):
+        with self._lock:
+            if key is None:
+                self._hosts.clear()
+            else:
+                self._hosts.pop(key, None)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            keys = list(self._hosts)
+        result = {}
+        for key in keys:
+            timeout = self.connect_timeout(key)
+            with self._lock:
+                state = self._hosts.get(key)
+                if state is None:
+                    continue
+                result[key] = {
+                    "state": state.state,
+                    "consecutive_failures": state.consecutive_failures,
+                    "connect_latency": round(state.srtt, 3) if state.srtt is not None else None,
+                    "connect_timeout": round(timeout, 3),
+                    "last_error": state.last_error,
+                    "last_seen": state.last_seen or None,
+                }
+        return result
+
+
+_tracker_lock = threading.Lock()
+_tracker: Optional[HostHealthTracker] = None
+
+
+def get_host_health(config) -> HostHealthTracker:
+    """Returns the process-wide tracker, creating it from config on first use."""
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            threshold = config.HOST_CIRCUIT_FAILURE_THRESHOLD if config.HOST_CIRCUIT_ENABLED else 2 ** 31
+            _tracker = HostHealthTracker(
+                failure_threshold=threshold,
+                cooldown=config.HOST_CIRCUIT_COOLDOWN,
+                min_timeout=config.SSH_CONNECT_TIMEOUT_MIN,
+                max_timeout=config.SSH_CONNECT_TIMEOUT,
+                # A probe that takes longer than a connect plus a command is taken as lost
+                probe_timeout=config.SSH_CONNECT_TIMEOUT + config.SSH_EXEC_TIMEOUT,
+            )
+        return _tracker
@@ -0,0 +1,190 @@
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import paramiko
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_KEY_NAMES = ("id_ed25519", "id_ecdsa", "id_rsa")
+AGENT = "agent"
+
+
+class IdentityManager:
+    """
+    Private keys loaded and decrypted once per process, tried on every
+    connection in a per-host order that starts with the identity that last
+    authenticated to that host. All keys are offered on the one transport,
+    so a host that changed keys costs extra round trips but no reconnect.
+
+    ssh-agent keys are not preloaded: an agent connection must not be shared
+    between threads, so when use_agent is set and the file keys are
+    exhausted (or the agent key was the last good one) a fresh agent
+    connection is opened for that connection, as paramiko would.
+    """
+
+    def __init__(self, key_files: List[str], passphrase: str = "", use_agent: bool = True):
+        self.key_files = key_files
+        self.passphrase = passphrase or None
+        self.use_agent = use_agent
+        self._keys: List[Tuple[str, paramiko.PKey]] = []
+        self._asyncssh_keys: Optional[List[Tuple[str, object]]] = None
+        self._last_good: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def _read_key(path: str, passphrase: Optional[bytes]) -> paramiko.PKey:
+        try:
+            return paramiko.PKey.from_path(path, passphrase)
+        except TypeError:
+            # cryptography refuses a passphrase for an unencrypted key; SSH_KEY_PASSPHRASE covers the encrypted ones
+            if passphrase is None:
+                raise
+            return paramiko.PKey.from_path(path, None)
+
+    def _load(self):
+        # paramiko hands the passphrase to cryptography, which only takes bytes
+        passphrase = self.passphrase.encode() if self.passphrase else None
+        for path in self.key_files:
+            try:
+                key = self._read_key(path, passphrase)
+            except FileNotFoundError:
+                logger.warning(f"SSH key {path} not found, skipping it")
+                continue
+            except (paramiko.SSHException, ValueError, TypeError, OSError) as exc:
+                logger.error(f"Failed to load SSH key {path}: {exc}")
+                continue
+            self._keys.append((path, key))
+        if self._keys:
+            logger.info(f"Loaded {len(self._keys)} SSH identit{'y' if len(self._keys) == 1 else 'ies'}: "
+                        + ", ".join(f"{path} ({key.get_name()})" for path, key in self._keys))
+
+    def has_identities(self) -> bool:
+        """False when no key file loaded; connections then fall back to paramiko's own key discovery."""
+        return bool(self._keys)
+
+    def names(self) -> List[str]:
+        return [name for name, _ in self._keys]
+
+    def last_good(self, host_key: str) -> Optional[str]:
+        with self._lock:
+            return self._last_good.get(host_key)
+
+    def _ordered(self, names: List[str], host_key: str) -> List[str]:
+        remembered = self.last_good(host_key)
+        if remembered in names:
+            return [remembered] + [name for name in names if name != remembered]
+        return names
+
+    def _remember(self, host_key: str, name: Optional[str]):
+        with self._lock:
+            if name is None:
+                self._last_good.pop(host_key, None)
+            else:
+                self._last_good[host_key] = name
+
+    def authenticate(self, transport: paramiko.Transport, username: str, host_key: str) -> str:
+        """
+        Authenticates transport with the preloaded keys, last good one for
+        host_key ("user@host:port") first, then the agent. Returns the name
+        of the identity that worked (key path or "agent"); raises
+        paramiko.AuthenticationException when none did.
+        """
+        candidates = [name for name, _ in self._keys]
+        if self.use_agent:
+            candidates.append(AGENT)
+        keys = dict(self._keys)
+        last_error: Optional[Exception] = None
+        for name in self._ordered(candidates, host_key):
+            try:
+                if name == AGENT:
+                    if self._auth_agent(transport, username):
+                        self._remember(host_key, AGENT)
+                        return AGENT
+                    continue
+                transport.auth_publickey(username, keys[name])
+            except paramiko.BadAuthenticationType as exc:
+                # The server does not take public keys at all; more keys will not help
+                self._remember(host_key, None)
+                raise exc
+            except paramiko.AuthenticationException as exc:
+                last_error = exc
+                continue
+            if transport.is_authenticated():
+                self._remember(host_key, name)
+                return name
+        self._remember(host_key, None)
+        raise last_error or paramiko.AuthenticationException("No SSH identity was accepted")
+
+    @staticmethod
+    def _auth_agent(transport: paramiko.Transport, username: str) -> bool:
+        agent = paramiko.Agent()
+        try:
+            for key in agent.get_keys():
+                try:
+                    transport.auth_publickey(username, key)
+                except paramiko.BadAuthenticationType:
+                    raise
+                except paramiko.AuthenticationException:
+                    continue
+                if transport.is_authenticated():
+                    return True
+            return False
+        finally:
+            agent.close()
+
+    def asyncssh_identities(self) -> List[Tuple[str, object]]:
+        """The same key files as asyncssh key pairs, loaded on first use; [] if asyncssh cannot read them."""
+        with self._lock:
+            if self._asyncssh_keys is not None:
+                return self._asyncssh_keys
+            self._asyncssh_keys = []
+            import asyncssh
+            for path, _ in self._keys:
+                try:
+                    self._asyncssh_keys.append((path, asyncssh.load_keypairs([path], passphrase=self.passphrase)[0]))
+                except (asyncssh.KeyImportError, ValueError, OSError, IndexError) as exc:
+                    logger.error(f"Failed to load SSH key {path} for asyncssh: {exc}")
+            return self._asyncssh_keys
+
+    def ordered_asyncssh_identities(self, host_key: str) -> List[Tuple[str, object]]:
+        identities = self.asyncssh_identities()
+        order = self._ordered([name for name, _ in identities], host_key)
+        by_name = dict(identities)
+        return [(name, by_name[name]) for name in order]
+
+    def record_success(self, host_key: str, name: str):
+        self._remember(host_key, name)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            remembered = len(self._last_good)
+        return {"identities": self.names(), "use_agent": self.use_agent, "hosts_remembered": remembered}
+
+
+def resolve_key_files(setting: str) -> List[str]:
+    """SSH_KEY_FILES as a list of paths; empty means the default ~/.ssh keys that exist."""
+    paths = [os.path.expanduser(part.strip()) for part in (setting or "").split(",") if part.strip()]
+    if paths:
+        return paths
+    ssh_dir = os.path.expanduser("~/.ssh")
+    return [os.path.join(ssh_dir, name) for name in DEFAULT_KEY_NAMES if os.path.isfile(os.path.join(ssh_dir, name))]
+
+
+_manager_lock = threading.Lock()
+_manager: Optional[IdentityManager] = None
+
+
+def get_identity_manager(config) -> IdentityManager:
+    """Returns the process-wide identity manager, loading the keys on first use."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = IdentityManager(
+                resolve_key_files(config.SSH_KEY_FILES),
+                passphrase=config.SSH_KEY_PASSPHRASE,
+                use_agent=config.SSH_USE_AGENT,
+            )
+        return _manager
@@ -0,0 +1,117 @@
+import collections
+import threading
+import time
+from typing import Deque, Dict, List, Optional, Tuple
+
+# (log id, message); ids are the sync_job_logs row ids, so they increase monotonically per job
+Event = Tuple[int, str]
+
+
+class _JobBuffer:
+    __slots__ = ("events", "floor", "finished", "condition")
+
+    def __init__(self, floor: int):
+        self.events: Deque[Event] = collections.deque()
+        # Lines with an id up to floor are only in the database (written before this process
+        # took the job, or evicted from the ring)
+        self.floor = floor
+        self.finished = False
+        self.condition = threading.Condition()
+
+
+class JobEventLog:
+    """
+    In-memory tail of the log of every job running in this process: a ring
+    of the last capacity lines per job, each with its database log id.
+    The job's JobLog publishes lines right after storing them, so the
+    database (the spill) always holds at least what the ring does, and
+    any number of streams can follow one job. Readers block on the job's
+    condition variable until a line arrives instead of polling the
+    database. A reader that is behind the ring, or follows a job run by
+    another process, gets None and reads the stored log instead.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._jobs: Dict[str, _JobBuffer] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def open(self, job_id: str, floor: int = 0):
+        """Starts buffering job_id; floor is the id of the last line it already has in the database."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._jobs[job_id] = _JobBuffer(floor)
+
+    def publish(self, job_id: str, events: List[Event]):
+        """Appends stored lines (in id order) and wakes every reader of the job."""
+        buffer = self._jobs.get(job_id)
+        if buffer is None or not events:
+            return
+        with buffer.condition:
+            for event in events:
+                if len(buffer.events) >= self.capacity:
+                    buffer.floor = buffer.events.popleft()[0]
+                buffer.events.append(event)
+            buffer.condition.notify_all()
+
+    def close(self, job_id: str):
+        """Stops buffering a finished job; its readers wake up and continue from the database."""
+        with self._lock:
+            buffer = self._jobs.pop(job_id, None)
+        if buffer is None:
+            return
+        with buffer.condition:
+            buffer.finished = True
+            buffer.condition.notify_all()
+
+    def read(self, job_id: str, after_id: int, timeout: float) -> Optional[List[Event]]:
+        """
+        Lines of job_id after after_id, waiting up to timeout seconds for the
+        first one. [] when none arrived in time or the job finished; None when
+        the ring cannot tell (job not buffered here, or after_id older than
+        the ring), in which case the caller reads the database.
+        """
+        buffer = self._jobs.get(job_id)
+        if buffer is None:
+            return None
+        deadline = time.monotonic() + timeout
+        with buffer.condition:
+            while True:
+                if after_id < buffer.floor:
+                    return None
+                events = self._after(buffer.events, after_id)
+                if events or buffer.finished:
+                    return events
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                buffer.condition.wait(remaining)
+
+    @staticmethod
+    def _after(events: Deque[Event], after_id: int) -> List[Event]:
+        # Followers are usually at the tail, so scan from the newest line back
+        newer = []
+        for event in reversed(events):
+            if event[0] <= after_id:
+                break
+            newer.append(event)
+        newer.reverse()
+        return newer
+
+
+_events_lock = threading.Lock()
+_events: Optional[JobEventLog] = None
+
+
+def get_job_events(config) -> JobEventLog:
+    """Returns the process-wide job event log."""
+    global _events
+    with _events_lock:
+        if _events is None:
+            _events = JobEventLog(config.JOB_LOG_BUFFER_LINES)
+        return _events
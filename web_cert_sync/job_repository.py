@@ -0,0 +1,419 @@
+import json
+import math
+import os
+import sqlite3
+import time
+import uuid
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    from .config import Config
+except ImportError:
+    from config import Config
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+FINAL_JOB_STATES = (JOB_SUCCEEDED, JOB_FAILED)
+
+TASK_PENDING = "pending"
+FINAL_TASK_STATES = ("synced", "skipped", "failed", "circuit_open", "not_attempted")
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class JobRepository:
+    """
+    Durable sync jobs, their per-host tasks, streamed log lines and the
+    history of every host attempt, stored in the servers database.
+    """
+
+    _JOB_COLUMNS = (
+        "*, CASE WHEN finished_at IS NOT NULL "
+        "THEN ROUND((julianday(finished_at) - julianday(started_at)) * 86400) END AS duration"
+    )
+
+    def __init__(self, config: Optional[Config] = None):
+        self.config = config or Config()
+        self.db_path = self.config.SERVER_DB_PATH
+        self._ensure_database()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _ensure_database(self):
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sync_jobs (
+                    id TEXT PRIMARY KEY,
+                    domains TEXT NOT NULL,
+                    options TEXT NOT NULL DEFAULT '{}',
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    owner TEXT,
+                    heartbeat_at REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result TEXT NOT NULL DEFAULT '',
+                    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    started_at TEXT,
+                    finished_at TEXT
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_sync_jobs_status ON sync_jobs(status)"
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sync_tasks (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id TEXT NOT NULL,
+                    server TEXT NOT NULL,
+                    wave INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    error_class TEXT,
+                    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(job_id, server)
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_sync_tasks_job_status ON sync_tasks(job_id, status)"
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sync_job_logs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id TEXT NOT NULL,
+                    message TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_sync_job_logs_job ON sync_job_logs(job_id, id)"
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sync_attempts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id TEXT NOT NULL,
+                    server TEXT NOT NULL,
+                    group_name TEXT NOT NULL DEFAULT '',
+                    attempt INTEGER NOT NULL DEFAULT 1,
+                    status TEXT NOT NULL,
+                    error_class TEXT,
+                    error TEXT,
+                    started_at REAL NOT NULL,
+                    duration REAL,
+                    phases TEXT NOT NULL DEFAULT '{}',
+                    bytes_sent INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_sync_attempts_job ON sync_attempts(job_id)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_sync_attempts_started ON sync_attempts(started_at)"
+            )
+
+    def create_job(self, domains: Sequence[str], waves: Sequence[Tuple[str, Sequence[str]]], options: Optional[Dict] = None) -> str:
+        """Stores a queued job with one pending task per host; waves is a list of (name, targets)."""
+        job_id = uuid.uuid4().hex
+        options = dict(options or {})
+        options["wave_names"] = [name for name, _ in waves]
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO sync_jobs (id, domains, options, status) VALUES (?, ?, ?, ?)",
+                (job_id, json.dumps(list(domains)), json.dumps(options), JOB_QUEUED),
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO sync_tasks (job_id, server, wave) VALUES (?, ?, ?)",
+                [(job_id, server, index) for index, (_, targets) in enumerate(waves) for server in targets],
+            )
+        return job_id
+
+    def claim_next_job(self, owner: str, lease_seconds: float) -> Optional[Dict]:
+        """
+        Atomically takes the oldest queued job, or a running job whose owner
+        stopped heartbeating for lease_seconds (its worker died), for owner.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                """
+                SELECT id FROM sync_jobs
+                WHERE status = ? OR (status = ? AND (heartbeat_at IS NULL OR heartbeat_at < ?))
+                ORDER BY created_at ASC
+                LIMIT 1
+                """,
+                (JOB_QUEUED, JOB_RUNNING, now - lease_seconds),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                """
+                UPDATE sync_jobs
+                SET status = ?, owner = ?, heartbeat_at = ?, attempts = attempts + 1,
+                    started_at = COALESCE(started_at, CURRENT_TIMESTAMP)
+                WHERE id = ?
+                """,
+                (JOB_RUNNING, owner, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        return self.get_job(row["id"])
+
+    def heartbeat(self, job_id: str, owner: str) -> bool:
+        """Extends the lease; returns False if another worker has taken the job over."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE sync_jobs SET heartbeat_at = ? WHERE id = ? AND owner = ? AND status = ?",
+                (time.time(), job_id, owner, JOB_RUNNING),
+            )
+        return cursor.rowcount > 0
+
+    def finish_job(self, job_id: str, owner: str, success: bool, result: str = ""):
+        with self._connect() as conn:
+            conn.execute(
+                """
+                UPDATE sync_jobs
+                SET status = ?, result = ?, finished_at = CURRENT_TIMESTAMP, heartbeat_at = ?
+                WHERE id = ? AND owner = ?
+                """,
+                (JOB_SUCCEEDED if success else JOB_FAILED, result, time.time(), job_id, owner),
+            )
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT {self._JOB_COLUMNS} FROM sync_jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            counts = conn.execute(
+                "SELECT status, COUNT(1) AS count FROM sync_tasks WHERE job_id = ? GROUP BY status",
+                (job_id,),
+            ).fetchall()
+        job = self._job_row_to_dict(row)
+        job["tasks"] = {item["status"]: item["count"] for item in counts}
+        job["total"] = sum(job["tasks"].values())
+        return job
+
+    def get_job_status(self, job_id: str) -> Optional[str]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT status FROM sync_jobs WHERE id = ?", (job_id,)).fetchone()
+        return row["status"] if row else None
+
+    def list_jobs(self, limit: int = 20) -> List[Dict]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT {self._JOB_COLUMNS} FROM sync_jobs ORDER BY created_at DESC, rowid DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [self._job_row_to_dict(row) for row in rows]
+
+    def list_tasks(self, job_id: str, statuses: Optional[Sequence[str]] = None) -> List[Dict]:
+        query = "SELECT server, wave, status, error_class, updated_at FROM sync_tasks WHERE job_id = ?"
+        params: List = [job_id]
+        if statuses:
+            query += f" AND status IN ({', '.join('?' for _ in statuses)})"
+            params.extend(statuses)
+        with self._connect() as conn:
+            rows = conn.execute(query + " ORDER BY wave ASC, id ASC", params).fetchall()
+        return [dict(row) for row in rows]
+
+    def task_counts(self, job_id: str) -> Dict[str, int]:
+        """Hosts of a job by outcome: done (synced/skipped), failed (any failed state), pending and total."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT status, COUNT(*) FROM sync_tasks WHERE job_id = ? GROUP BY status", (job_id,)
+            ).fetchall()
+        counts = {"done": 0, "failed": 0, "pending": 0, "total": 0}
+        for status, count in rows:
+            if status in ("synced", "skipped"):
+                counts["done"] += count
+            elif status == TASK_PENDING:
+                counts["pending"] += count
+            else:
+                counts["failed"] += count
+            counts["total"] += count
+        return counts
+
+    def update_task(self, job_id: str, server: str, status: str, error_class: Optional[str] = None):
+        with self._connect() as conn:
+            conn.execute(
+                """
+                UPDATE sync_tasks SET status = ?, error_class = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE job_id = ? AND server = ?
+                """,
+                (status, error_class, job_id, server),
+            )
+
+    def record_attempt(self, job_id: str, server: str, attempt: int, result: Dict, group_name: str = ""):
+        """Stores one host attempt with the timings from the sync engine's result dict."""
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO sync_attempts (
+                    job_id, server, group_name, attempt, status, error_class, error,
+                    started_at, duration, phases, bytes_sent
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    job_id,
+                    server,
+                    group_name or "",
+                    attempt,
+                    result.get("status") or "failed",
+                    result.get("error_class"),
+                    result.get("error"),
+                    result.get("started_at") or time.time(),
+                    result.get("duration"),
+                    json.dumps(result.get("phases") or {}),
+                    result.get("bytes_sent") or 0,
+                ),
+            )
+
+    def list_attempts(self, job_id: str) -> List[Dict]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM sync_attempts WHERE job_id = ? ORDER BY started_at ASC, id ASC",
+                (job_id,),
+            ).fetchall()
+        return [self._attempt_row_to_dict(row) for row in rows]
+
+    def latency_stats(self, since: float, group_by: str = "server", limit: int = 50) -> List[Dict]:
+        """
+        Per-host or per-group attempt counts and p50/p95/p99/max duration for
+        attempts started at or after since (epoch seconds), slowest p95 first.
+        Hosts skipped by an open circuit never connected and are not counted.
+        """
+        column = "group_name" if group_by == "group" else "server"
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"""
+                SELECT {column} AS name, status, duration, bytes_sent FROM sync_attempts
+                WHERE started_at >= ? AND status != 'circuit_open' AND duration IS NOT NULL
+                ORDER BY {column} ASC, duration ASC
+                """,
+                (since,),
+            ).fetchall()
+
+        grouped: Dict[str, Dict] = {}
+        for row in rows:
+            item = grouped.setdefault(row["name"], {"durations": [], "failed": 0, "bytes_sent": 0})
+            item["durations"].append(row["duration"])
+            item["bytes_sent"] += row["bytes_sent"]
+            if row["status"] == "failed":
+                item["failed"] += 1
+
+        stats = []
+        for name, item in grouped.items():
+            durations = item["durations"]
+            entry = {
+                group_by: name,
+                "attempts": len(durations),
+                "failed": item["failed"],
+                "bytes_sent": item["bytes_sent"],
+                "max": round(durations[-1], 3),
+            }
+            for pct in PERCENTILES:
+                entry[f"p{pct}"] = round(percentile(durations, pct), 3)
+            stats.append(entry)
+        stats.sort(key=lambda entry: entry["p95"], reverse=True)
+        return stats[:limit]
+
+    def append_logs(self, job_id: str, messages: Sequence[str]) -> List[int]:
+        """Stores messages in order and returns their log ids."""
+        if not messages:
+            return []
+        now = time.time()
+        ids = []
+        with self._connect() as conn:
+            for message in messages:
+                cursor = conn.execute(
+                    "INSERT INTO sync_job_logs (job_id, message, created_at) VALUES (?, ?, ?)",
+                    (job_id, message, now),
+                )
+                ids.append(cursor.lastrowid)
+        return ids
+
+    def last_log_id(self, job_id: str) -> int:
+        with self._connect() as conn:
+            row = conn.execute("SELECT MAX(id) FROM sync_job_logs WHERE job_id = ?", (job_id,)).fetchone()
+        return row[0] or 0
+
+    def list_logs(self, job_id: str, after_id: int = 0, limit: int = 500) -> List[Dict]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT id, message FROM sync_job_logs
+                WHERE job_id = ? AND id > ?
+                ORDER BY id ASC
+                LIMIT ?
+                """,
+                (job_id, after_id, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def prune_jobs(self, older_than_days: int) -> int:
+        """Deletes finished jobs (with their tasks and logs) created more than older_than_days ago."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"""
+                SELECT id FROM sync_jobs
+                WHERE status IN ({', '.join('?' for _ in FINAL_JOB_STATES)})
+                  AND created_at < datetime('now', ?)
+                """,
+                (*FINAL_JOB_STATES, f"-{int(older_than_days)} days"),
+            ).fetchall()
+            job_ids = [(row["id"],) for row in rows]
+            conn.executemany("DELETE FROM sync_job_logs WHERE job_id = ?", job_ids)
+            conn.executemany("DELETE FROM sync_attempts WHERE job_id = ?", job_ids)
+            conn.executemany("DELETE FROM sync_tasks WHERE job_id = ?", job_ids)
+            conn.executemany("DELETE FROM sync_jobs WHERE id = ?", job_ids)
+        return len(job_ids)
+
+    @staticmethod
+    def _attempt_row_to_dict(row: sqlite3.Row) -> Dict:
+        item = dict(row)
+        item["phases"] = json.loads(item["phases"] or "{}")
+        return item
+
+    @staticmethod
+    def _job_row_to_dict(row: sqlite3.Row) -> Dict:
+        return {
+            "id": row["id"],
+            "domains": json.loads(row["domains"]),
+            "options": json.loads(row["options"] or "{}"),
+            "status": row["status"],
+            "owner": row["owner"],
+            "attempts": row["attempts"],
+            "result": row["result"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+            "duration": row["duration"],
+        }
@@ -0,0 +1,300 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+try:
+    from .job_repository import JobRepository, TASK_PENDING
+    from .server_repository import ServerRepository
+    from .ssh_utils import SyncManager
+    from . import rollout
+    from . import reload_coalescer
+    from .job_events import JobEventLog, get_job_events
+except ImportError:
+    from job_repository import JobRepository, TASK_PENDING
+    from server_repository import ServerRepository
+    from ssh_utils import SyncManager
+    import rollout
+    import reload_coalescer
+    from job_events import JobEventLog, get_job_events
+
+logger = logging.getLogger(__name__)
+
+FAILED_TASK_STATES = ("failed", "circuit_open", "not_attempted")
+
+
+class JobLog:
+    """
+    Stand-in for the log queue handed to SyncManager: lines are buffered and
+    appended to the job's log table at most every flush_interval seconds, so
+    a busy run costs a handful of inserts instead of one per line. Stored
+    lines are published to events (see job_events) for the job's streams.
+    """
+
+    def __init__(self, repository: JobRepository, job_id: str, flush_interval: float = 0.5,
+                 events: Optional[JobEventLog] = None):
+        self.repository = repository
+        self.job_id = job_id
+        self.flush_interval = flush_interval
+        self.events = events
+        self._buffer: List[str] = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        # Keeps stores and publishes in id order when several threads flush
+        self._flush_lock = threading.Lock()
+        if events is not None and events.enabled:
+            events.open(job_id, repository.last_log_id(job_id))
+
+    def put(self, message: str):
+        with self._lock:
+            self._buffer.append(message)
+            due = time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending, self._buffer = self._buffer, []
+                self._last_flush = time.monotonic()
+            if not pending:
+                return
+            try:
+                ids = self.repository.append_logs(self.job_id, pending)
+            except Exception as exc:
+                logger.error(f"Failed to store {len(pending)} log line(s) for job {self.job_id}: {exc}")
+                return
+            if self.events is not None:
+                self.events.publish(self.job_id, list(zip(ids, pending)))
+
+    def close(self):
+        """Flushes the last lines and lets the job's streams fall back to the stored log."""
+        self.flush()
+        if self.events is not None:
+            self.events.close(self.job_id)
+
+
+class JobWorker:
+    """
+    Background thread that claims sync jobs from the database and runs them.
+    Every process runs one; claims are atomic, so a job runs in exactly one
+    process at a time. A job whose owner stopped heartbeating is taken over
+    and only its hosts without a final outcome are synced again; the worker
+    that lost the lease stops starting hosts, stops recording outcomes and
+    leaves the job (and its pending reloads) to the new owner. A job whose
+    post-sync commands are being coalesced waits for them on its own thread,
+    so the next job can start (and join those reloads) meanwhile.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.repository = JobRepository(config)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._loop, name="sync-job-worker", daemon=True)
+            self._thread.start()
+
+    def notify(self):
+        """Wakes the worker up to claim a job that was just queued."""
+        self._wakeup.set()
+
+    def _loop(self):
+        try:
+            pruned = self.repository.prune_jobs(self.config.JOB_RETENTION_DAYS)
+            if pruned:
+                logger.info(f"Pruned {pruned} sync job(s) older than {self.config.JOB_RETENTION_DAYS} days")
+        except Exception as exc:
+            logger.error(f"Failed to prune old sync jobs: {exc}")
+
+        while True:
+            try:
+                job = self.repository.claim_next_job(self.owner, self.config.JOB_LEASE_SECONDS)
+            except Exception as exc:
+                logger.error(f"Failed to claim a sync job: {exc}")
+                job = None
+            if job is not None:
+                self._run_job(job)
+                continue
+            self._wakeup.wait(self.config.JOB_POLL_INTERVAL)
+            self._wakeup.clear()
+
+    def _run_job(self, job: Dict):
+        job_id = job["id"]
+        log = JobLog(self.repository, job_id, events=get_job_events(self.config))
+        stop = threading.Event()
+        # Set when another worker took the job over (see claim_next_job); checked between hosts
+        lease_lost = threading.Event()
+
+        def heartbeat():
+            last_beat = time.monotonic()
+            while not stop.wait(log.flush_interval):
+                log.flush()
+                if lease_lost.is_set() or time.monotonic() - last_beat < self.config.JOB_HEARTBEAT_INTERVAL:
+                    continue
+                last_beat = time.monotonic()
+                if not self.repository.heartbeat(job_id, self.owner):
+                    lease_lost.set()
+                    msg = f"Lost the lease on sync job {job_id}; stopping here, another worker resumes it"
+                    logger.warning(msg)
+                    log.put(f"[WARN] {msg}")
+
+        beat_thread = threading.Thread(target=heartbeat, name=f"sync-job-heartbeat-{job_id[:8]}", daemon=True)
+        beat_thread.start()
+
+        sync_manager = SyncManager()
+        success = False
+        tickets = []
+        try:
+            success = self._execute(job, log, sync_manager, lease_lost)
+            tickets = sync_manager.take_reload_tickets()
+        except Exception as exc:
+            if lease_lost.is_set():
+                self._abandon(job_id, log, stop, beat_thread)
+                return
+            logger.exception(f"Sync job {job_id} crashed")
+            log.put(f"[ERROR] Exception: {str(exc)}")
+            log.put("[FAILED]")
+            self._complete(job_id, log, stop, beat_thread, False, str(exc))
+            return
+
+        if lease_lost.is_set():
+            # The new owner re-defers the reloads of hosts synced here, so they are not waited for
+            self._abandon(job_id, log, stop, beat_thread)
+            return
+
+        if tickets:
+            # The next job may add deploys to the same pending reloads, so it must not wait behind this one
+            threading.Thread(
+                target=self._complete_after_reloads,
+                args=(job_id, log, stop, beat_thread, success, sync_manager, tickets, lease_lost),
+                name=f"sync-job-reloads-{job_id[:8]}",
+                daemon=True,
+            ).start()
+        else:
+            self._complete_after_reloads(job_id, log, stop, beat_thread, success, sync_manager, tickets, lease_lost)
+
+    def _complete_after_reloads(self, job_id, log, stop, beat_thread, success, sync_manager, tickets, lease_lost):
+        """Waits for the job's deferred reloads, then writes the final sentinel and closes the job."""
+        result = ""
+        try:
+            sync_manager.wait_for_reloads(tickets)
+            if lease_lost.is_set():
+                self._abandon(job_id, log, stop, beat_thread)
+                return
+            # Hosts that failed before a takeover still count against the job
+            failed_hosts = [task["server"] for task in self.repository.list_tasks(job_id, FAILED_TASK_STATES)]
+            if success and not failed_hosts:
+                log.put("[SUCCESS]")
+            else:
+                success = False
+                result = ", ".join(failed_hosts) if failed_hosts else "Unknown"
+                log.put(f"[FAILED] {result}")
+        except Exception as exc:
+            logger.exception(f"Sync job {job_id} crashed")
+            log.put(f"[ERROR] Exception: {str(exc)}")
+            log.put("[FAILED]")
+            success, result = False, str(exc)
+        self._complete(job_id, log, stop, beat_thread, success, result)
+
+    def _complete(self, job_id, log, stop, beat_thread, success, result):
+        stop.set()
+        beat_thread.join()
+        log.flush()
+        try:
+            self.repository.finish_job(job_id, self.owner, success, result)
+        finally:
+            log.close()
+
+    def _abandon(self, job_id, log, stop, beat_thread):
+        """Lets go of a job another worker took over: no sentinel, and finish_job is left to the new owner."""
+        stop.set()
+        beat_thread.join()
+        log.close()
+        logger.warning(f"Abandoned sync job {job_id} after losing its lease")
+
+    def _execute(self, job: Dict, log: JobLog, sync_manager: SyncManager, lease_lost: Optional[threading.Event] = None) -> bool:
+        """
+        Runs the job's unfinished tasks and returns whether they all succeeded.
+        Once lease_lost is set no further host is started and outcomes are no
+        longer recorded, since the tasks now belong to the new owner.
+        """
+        lease_lost = lease_lost or threading.Event()
+        job_id = job["id"]
+        options = job["options"]
+        pending = self.repository.list_tasks(job_id, [TASK_PENDING])
+        if job["attempts"] > 1:
+            msg = f"Resuming interrupted sync job {job_id}: {len(pending)} of {job['total']} host(s) remaining"
+            logger.warning(msg)
+            log.put(f"[WARN] {msg}")
+            if reload_coalescer.is_enabled(self.config):
+                # The previous owner may have died with these hosts' reloads still deferred, so they are
+                # reloaded again. Tasks keep the target as entered ("1.2.3.4"); reloads need "host:port".
+                for task in self.repository.list_tasks(job_id, ["synced"]):
+                    server = ServerRepository.canonical_server(task["server"], self.config.SSH_PORT_DEFAULT)
+                    sync_manager.defer_reload(server, job["domains"], log)
+
+        if not pending:
+            return True
+
+        wave_names = options.get("wave_names") or []
+        by_wave: Dict[int, List[str]] = {}
+        for task in pending:
+            by_wave.setdefault(task["wave"], []).append(task["server"])
+        waves = [
+            rollout.Wave(wave_names[index] if index < len(wave_names) else f"wave {index + 1}", targets)
+            for index, targets in sorted(by_wave.items())
+        ]
+        if options.get("mode") == "rollout":
+            sync_manager.log_rollout_plan(waves, log)
+
+        def on_result(server, status, error_class):
+            if not lease_lost.is_set():
+                self.repository.update_task(job_id, server, status, error_class)
+
+        groups = sync_manager.server_repository.list_server_groups()
+
+        def on_attempt(server, attempt, result):
+            if lease_lost.is_set():
+                return
+            canonical = result.get("server") or server
+            try:
+                self.repository.record_attempt(job_id, canonical, attempt, result, groups.get(canonical, ""))
+            except Exception as exc:
+                logger.error(f"Failed to record sync attempt for {canonical}: {exc}")
+
+        success, _ = sync_manager.run_batch_sync(
+            job["domains"],
+            [server for wave in waves for server in wave.targets],
+            log,
+            waves=waves,
+            min_success_rate=options.get("min_success_rate", 0.0),
+            on_result=on_result,
+            on_attempt=on_attempt,
+            wait_for_reloads=False,
+            cancel=lease_lost,
+        )
+        return success
+
+
+_worker_lock = threading.Lock()
+_worker: Optional[JobWorker] = None
+
+
+def get_job_worker(config) -> JobWorker:
+    """Returns the process-wide worker, started on first use."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = JobWorker(config)
+        _worker.start()
+        return _worker
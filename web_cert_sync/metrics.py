@@ -0,0 +1,155 @@
+import datetime
+import logging
+import os
+from typing import Dict, Optional
+
+try:
+    from .cert_utils import get_metadata_cache
+    from .domain_index import get_domain_index
+except ImportError:
+    from cert_utils import get_metadata_cache
+    from domain_index import get_domain_index
+
+# Set by the gunicorn config so every worker writes its samples to files that /metrics merges
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR", "")
+if MULTIPROC_DIR:
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+try:
+    import prometheus_client
+    from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+    from prometheus_client.core import GaugeMetricFamily
+except ImportError:  # optional dependency, only needed for /metrics
+    prometheus_client = None
+
+logger = logging.getLogger(__name__)
+
+SYNC_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+CONNECT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def is_available() -> bool:
+    return prometheus_client is not None
+
+
+if prometheus_client is not None:
+    HOST_SYNC_SECONDS = Histogram(
+        "cert_sync_host_duration_seconds",
+        "Duration of one host sync attempt",
+        ["status"],
+        buckets=SYNC_BUCKETS,
+    )
+    CONNECT_SECONDS = Histogram(
+        "cert_sync_ssh_connect_seconds",
+        "Time to obtain an SSH session for a host sync attempt",
+        buckets=CONNECT_BUCKETS,
+    )
+    HOST_RESULTS = Counter(
+        "cert_sync_host_attempts",
+        "Host sync attempts by outcome and error class",
+        ["status", "error_class"],
+    )
+    INFLIGHT_HOSTS = Gauge(
+        "cert_sync_inflight_hosts",
+        "Host syncs currently running",
+        multiprocess_mode="livesum",
+    )
+    QUEUED_HOSTS = Gauge(
+        "cert_sync_queued_hosts",
+        "Hosts waiting for a free sync slot",
+        multiprocess_mode="livesum",
+    )
+    REQUEST_SECONDS = Histogram(
+        "cert_sync_http_request_duration_seconds",
+        "Flask request latency by route; streaming responses are measured to the first byte",
+        ["method", "route", "status"],
+        buckets=REQUEST_BUCKETS,
+    )
+
+
+def observe_attempt(result: Dict):
+    """Records one host attempt from a sync engine result (see SyncManager._sync_single_server)."""
+    if prometheus_client is None:
+        return
+    status = result.get("status") or "failed"
+    HOST_RESULTS.labels(status=status, error_class=result.get("error_class") or "none").inc()
+    if result.get("duration") is not None and status != "circuit_open":
+        HOST_SYNC_SECONDS.labels(status=status).observe(result["duration"])
+    phases = result.get("phases") or {}
+    if "tcp_connect" in phases:
+        # kex/auth from the paramiko engine, handshake from asyncssh; a reused pooled session has none of them
+        CONNECT_SECONDS.observe(sum(phases.get(name, 0.0) for name in ("tcp_connect", "kex", "auth", "handshake")))
+
+
+def adjust_inflight(delta: int):
+    if prometheus_client is not None and delta:
+        INFLIGHT_HOSTS.inc(delta)
+
+
+def adjust_queued(delta: int):
+    if prometheus_client is not None and delta:
+        QUEUED_HOSTS.inc(delta)
+
+
+def observe_request(method: str, route: str, status: int, seconds: float):
+    if prometheus_client is not None:
+        REQUEST_SECONDS.labels(method=method, route=route, status=str(status)).observe(seconds)
+
+
+class CertificateExpiryCollector:
+    """
+    Reports the local certificates' expiry at scrape time from the domain
+    index and metadata cache, so the values never go stale and do not need
+    to be shared between worker processes.
+    """
+
+    def __init__(self, config):
+        self.config = config
+
+    def collect(self):
+        days_left = GaugeMetricFamily(
+            "cert_sync_certificate_days_left",
+            "Days until the local certificate expires",
+            labels=["domain"],
+        )
+        expiry = GaugeMetricFamily(
+            "cert_sync_certificate_expiry_timestamp_seconds",
+            "Expiry time of the local certificate as a Unix timestamp",
+            labels=["domain"],
+        )
+        cache = get_metadata_cache()
+        index = get_domain_index(self.config)
+        for entry in index.entries():
+            if not entry["has_cert"]:
+                continue
+            domain = entry["domain"]
+            try:
+                metadata = cache.get(index.get(domain)["cert_file"])
+            except (OSError, ValueError) as exc:
+                logger.warning(f"Skipping certificate metrics for {domain}: {exc}")
+                continue
+            days_left.add_metric([domain], metadata["days_left"])
+            not_after = datetime.datetime.fromisoformat(metadata["not_after"])
+            if not_after.tzinfo is None:
+                not_after = not_after.replace(tzinfo=datetime.timezone.utc)
+            expiry.add_metric([domain], not_after.timestamp())
+        yield days_left
+        yield expiry
+
+
+def render_metrics(config) -> Optional[tuple]:
+    """
+    Returns (body, content_type) for a scrape, merging every worker's samples
+    when PROMETHEUS_MULTIPROC_DIR is set; None if prometheus_client is missing.
+    """
+    if prometheus_client is None:
+        return None
+    registry = CollectorRegistry()
+    if MULTIPROC_DIR:
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        for collector in (HOST_SYNC_SECONDS, CONNECT_SECONDS, HOST_RESULTS, INFLIGHT_HOSTS, QUEUED_HOSTS, REQUEST_SECONDS):
+            registry.register(collector)
+    registry.register(CertificateExpiryCollector(config))
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
@@ -0,0 +1,139 @@
+import importlib
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_hooks_lock = threading.Lock()
+_hooks: List[object] = []
+
+
+def register_hook(hook):
+    """
+    Subscribes a hook to every PhaseTimer. A hook is any object with some of
+    these methods (missing ones are skipped):
+        phase_started(timer, name)
+        phase_finished(timer, name, seconds)
+        finished(timer)
+    Hooks run synchronously on the thread or event loop doing the work, so
+    they must be cheap; exceptions they raise are logged and ignored.
+    Returns the hook, so it can be used as a class decorator.
+    """
+    with _hooks_lock:
+        if hook not in _hooks:
+            _hooks.append(hook)
+    return hook
+
+
+def unregister_hook(hook):
+    with _hooks_lock:
+        if hook in _hooks:
+            _hooks.remove(hook)
+
+
+def load_hooks(spec: str):
+    """Registers hooks named in spec, a comma-separated list of "module:attribute" (e.g. PHASE_TIMING_HOOKS)."""
+    for item in (part.strip() for part in spec.split(',')):
+        if not item:
+            continue
+        module_name, _, attribute = item.partition(':')
+        try:
+            hook = getattr(importlib.import_module(module_name), attribute) if attribute else importlib.import_module(module_name)
+        except (ImportError, AttributeError) as exc:
+            logger.error(f"Failed to load phase timing hook {item}: {exc}")
+            continue
+        register_hook(hook)
+
+
+def _notify(method: str, *args):
+    with _hooks_lock:
+        hooks = list(_hooks)
+    for hook in hooks:
+        callback = getattr(hook, method, None)
+        if callback is None:
+            continue
+        try:
+            callback(*args)
+        except Exception as exc:
+            logger.warning(f"Phase timing hook {hook!r} failed in {method}: {exc}")
+
+
+def format_seconds(seconds: float) -> str:
+    return f"{seconds * 1000:.0f}ms" if seconds < 1 else f"{seconds:.2f}s"
+
+
+class PhaseTimer:
+    """
+    Monotonic stopwatch for the phases of one host operation ("sync" or
+    "inspect"). Phases are recorded in the order they first ran; a phase
+    that runs several times (e.g. one upload per domain) accumulates.
+    bytes_sent is counted alongside for the payload pushed to the host.
+
+    Phase names are shared by every sync engine, so hooks and the phases
+    of stored attempts compare across SYNC_ENGINE settings:
+        pool_checkout                 a pooled session was reused
+        tcp_connect, kex, auth        a new session (threads / processes)
+        tcp_connect, handshake        a new session (asyncio; asyncssh does
+                                      key exchange and auth in one call)
+        remote_hash                   incremental sync digest check
+        mkdir, sftp_open, upload, post_sync    SFTP transfer mode
+        upload, remote_exec           stream transfer mode
+        post_sync                     a coalesced reload ("reload" timers)
+        read                          reading the deployed cert (inspect)
+    """
+
+    def __init__(self, operation: str, server: str):
+        self.operation = operation
+        self.server = server
+        self.started_at = time.time()
+        self._started = time.monotonic()
+        self.phases: Dict[str, float] = {}
+        self.bytes_sent = 0
+        self.duration: Optional[float] = None
+        self.status: Optional[str] = None
+
+    @contextmanager
+    def phase(self, name: str):
+        _notify("phase_started", self, name)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(name, time.monotonic() - started)
+
+    def add(self, name: str, seconds: float):
+        """Records a phase measured elsewhere."""
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+        _notify("phase_finished", self, name, seconds)
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self._started
+
+    def finish(self, status: str) -> float:
+        """Stops the clock, tells the hooks, and returns the total duration."""
+        if self.duration is None:
+            self.duration = self.elapsed()
+            self.status = status
+            _notify("finished", self)
+        return self.duration
+
+    def describe(self) -> str:
+        """E.g. "tcp_connect 3ms, kex 41ms, auth 18ms, upload 6ms"."""
+        return ", ".join(f"{name} {format_seconds(seconds)}" for name, seconds in self.phases.items())
+
+    def summary(self) -> str:
+        """Total and breakdown for log lines, e.g. "in 120ms (tcp_connect 3ms, ...)"."""
+        total = self.duration if self.duration is not None else self.elapsed()
+        breakdown = self.describe()
+        return f"in {format_seconds(total)} ({breakdown})" if breakdown else f"in {format_seconds(total)}"
+
+    def as_dict(self) -> Dict:
+        return {
+            "started_at": self.started_at,
+            "duration": self.duration if self.duration is not None else self.elapsed(),
+            "phases": dict(self.phases),
+            "bytes_sent": self.bytes_sent,
+        }
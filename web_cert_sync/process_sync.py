@@ -0,0 +1,325 @@
+import atexit
+import concurrent.futures
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional
+
+try:
+    from .config import Config
+    from .host_health import get_host_health
+    from . import phase_timing
+except ImportError:
+    from config import Config
+    from host_health import get_host_health
+    import phase_timing
+
+logger = logging.getLogger(__name__)
+
+# How often the parent checks that its worker processes are still alive
+LIVENESS_INTERVAL = 1.0
+# Grace period for a worker to finish its in-flight hosts on shutdown
+SHUTDOWN_TIMEOUT = 30.0
+
+
+def process_count(config) -> int:
+    """SYNC_PROCESSES, or one worker per CPU when it is 0."""
+    return config.SYNC_PROCESSES if config.SYNC_PROCESSES > 0 else (os.cpu_count() or 1)
+
+
+class _TaskLog:
+    """Stands in for the parent's log_queue inside a worker: lines go back over IPC tagged with their task."""
+
+    def __init__(self, events, task_id: int):
+        self.events = events
+        self.task_id = task_id
+
+    def put(self, message: str):
+        self.events.put(("log", self.task_id, message))
+
+
+def _worker_main(index: int, tasks, events, threads: int):
+    """Entry point of a worker process: runs the hosts sent to it on its own thread pool."""
+    try:
+        from .ssh_utils import SyncManager
+    except ImportError:
+        from ssh_utils import SyncManager
+
+    # Ctrl-C is handled by the parent, which shuts the workers down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    config = Config()
+    phase_timing.load_hooks(config.PHASE_TIMING_HOOKS)
+    manager = SyncManager()
+    # Deferred reloads go back to the parent, whose coalescer and job bookkeeping own them
+    manager.defer_reload = lambda server, domains, log_queue=None: events.put(
+        ("defer", log_queue.task_id, server, list(domains))
+    )
+    # Circuit breaker transitions are mirrored into the parent's tracker, which /api/host-health reports
+    manager.host_health.on_change = lambda key, fields: events.put(("health", key, fields))
+    deploys_by_run: Dict[int, list] = {}
+
+    def run_task(task_id: int, server_line: str, deploys: list):
+        try:
+            result = manager._sync_single_server(server_line, deploys, _TaskLog(events, task_id))
+        except Exception as exc:
+            logger.exception(f"Sync worker {index} failed on {server_line}")
+            events.put(("error", task_id, str(exc) or type(exc).__name__))
+            return
+        events.put(("result", task_id, result))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix=f"shard{index}") as executor:
+        while True:
+            message = tasks.get()
+            if message is None:
+                break
+            kind = message[0]
+            if kind == "deploys":
+                deploys_by_run[message[1]] = message[2]
+            elif kind == "forget":
+                deploys_by_run.pop(message[1], None)
+            elif kind == "reset_health":
+                manager.host_health.reset(message[1])
+            elif kind == "sync":
+                _, task_id, run_id, server_line = message
+                executor.submit(run_task, task_id, server_line, deploys_by_run[run_id])
+
+
+class _Task:
+    __slots__ = ("future", "run", "worker")
+
+    def __init__(self, future: concurrent.futures.Future, run: "ShardRun", worker: int):
+        self.future = future
+        self.run = run
+        self.worker = worker
+
+
+class ShardRun:
+    """
+    One sync run's handle on the pool. The run's deploys are sent to every
+    worker once; submit() returns a Future per host attempt, resolved with
+    the _sync_single_server result dict. Log lines of the attempt are put
+    on log_queue and deferred reloads passed to defer_reload, both in the
+    parent, as they arrive.
+    """
+
+    def __init__(self, pool: "ShardPool", run_id: int, log_queue=None, defer_reload=None):
+        self.pool = pool
+        self.run_id = run_id
+        self.log_queue = log_queue
+        self.defer_reload = defer_reload
+
+    @property
+    def capacity(self) -> int:
+        return self.pool.capacity
+
+    def submit(self, server_line: str) -> concurrent.futures.Future:
+        return self.pool._submit(self, server_line)
+
+    def close(self):
+        self.pool._close_run(self.run_id)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ShardPool:
+    """
+    Worker processes that run host syncs outside the parent's GIL, so
+    paramiko's key exchange and crypto use every core. Each worker has its
+    own SyncManager, connection pool and MAX_JOBS threads; a host always
+    goes to the same worker (hash of "host:port"), which keeps its pooled
+    session and circuit breaker in one place; breaker transitions are
+    mirrored into the parent's tracker for /api/host-health. Scheduling
+    (caps, waves, retries) stays in the parent, which only hands out single
+    attempts. A worker that dies fails its in-flight hosts and is replaced.
+    """
+
+    def __init__(self, processes: int, threads: int):
+        self.processes = max(1, processes)
+        self.threads = max(1, threads)
+        self._context = multiprocessing.get_context("spawn")
+        self._events = self._context.Queue()
+        self._workers: List[Optional[tuple]] = [None] * self.processes
+        self._tasks: Dict[int, _Task] = {}
+        # Deploys of open runs, re-sent to a worker that replaces a dead one
+        self._runs: Dict[int, list] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._config = Config()
+        for index in range(self.processes):
+            self._start_worker(index)
+        logger.info(f"Started {self.processes} sync worker process(es) with {self.threads} thread(s) each")
+        self._reader = threading.Thread(target=self._read_events, name="sync-shard-events", daemon=True)
+        self._reader.start()
+
+    @property
+    def capacity(self) -> int:
+        """Hosts that can be in flight at once across all workers."""
+        return self.processes * self.threads
+
+    def shard_of(self, server_line: str) -> int:
+        return zlib.crc32(server_line.encode()) % self.processes
+
+    def open_run(self, deploys: list, log_queue=None, defer_reload=None) -> ShardRun:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Sync worker processes are shut down")
+            run_id = next(self._ids)
+            self._runs[run_id] = deploys
+            for _, tasks in self._workers:
+                tasks.put(("deploys", run_id, deploys))
+        return ShardRun(self, run_id, log_queue, defer_reload)
+
+    def close(self):
+        """Lets the workers finish their in-flight hosts, then stops them; pending Futures fail."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            workers = list(self._workers)
+        for _, tasks in workers:
+            tasks.put(None)
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        for process, _ in workers:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+        self._events.put(None)
+        self._reader.join(LIVENESS_INTERVAL * 2)
+        with self._lock:
+            abandoned, self._tasks = list(self._tasks.values()), {}
+        for task in abandoned:
+            task.future.set_exception(RuntimeError("Sync worker processes were shut down"))
+
+    def _start_worker(self, index: int):
+        tasks = self._context.Queue()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(index, tasks, self._events, self.threads),
+            name=f"cert-sync-shard-{index}",
+            daemon=True,
+        )
+        process.start()
+        self._workers[index] = (process, tasks)
+        for run_id, deploys in self._runs.items():
+            tasks.put(("deploys", run_id, deploys))
+
+    def reset_health(self, key: Optional[str] = None):
+        """Closes the circuit for key (or every host) in each worker, as /api/host-health DELETE does in the parent."""
+        with self._lock:
+            if self._closed:
+                return
+            for _, tasks in self._workers:
+                tasks.put(("reset_health", key))
+
+    def _submit(self, run: ShardRun, server_line: str) -> concurrent.futures.Future:
+        future = concurrent.futures.Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Sync worker processes are shut down")
+            task_id = next(self._ids)
+            index = self.shard_of(server_line)
+            self._tasks[task_id] = _Task(future, run, index)
+            self._workers[index][1].put(("sync", task_id, run.run_id, server_line))
+        return future
+
+    def _close_run(self, run_id: int):
+        with self._lock:
+            if self._runs.pop(run_id, None) is None or self._closed:
+                return
+            for _, tasks in self._workers:
+                tasks.put(("forget", run_id))
+
+    def _read_events(self):
+        last_check = time.monotonic()
+        while True:
+            try:
+                event = self._events.get(timeout=LIVENESS_INTERVAL)
+            except queue.Empty:
+                event = ()
+            except (EOFError, OSError):
+                return
+            if event is None:
+                return
+            if event:
+                try:
+                    self._handle(event)
+                except Exception as exc:
+                    logger.error(f"Failed to handle sync worker event {event[0]}: {exc}")
+            if time.monotonic() - last_check >= LIVENESS_INTERVAL:
+                last_check = time.monotonic()
+                self._check_workers()
+
+    def _handle(self, event: tuple):
+        kind = event[0]
+        if kind == "health":
+            get_host_health(self._config).restore(event[1], event[2])
+            return
+        task_id = event[1]
+        with self._lock:
+            if kind in ("result", "error"):
+                task = self._tasks.pop(task_id, None)
+            else:
+                task = self._tasks.get(task_id)
+        if task is None:  # the run was abandoned or its worker already declared dead
+            return
+        run = task.run
+        if kind == "log":
+            if run.log_queue is not None:
+                run.log_queue.put(event[2])
+        elif kind == "defer":
+            if run.defer_reload is not None:
+                run.defer_reload(event[2], event[3], run.log_queue)
+        elif kind == "result":
+            task.future.set_result(event[2])
+        elif kind == "error":
+            task.future.set_exception(RuntimeError(event[2]))
+
+    def _check_workers(self):
+        lost = []
+        with self._lock:
+            if self._closed:
+                return
+            for index, (process, _) in enumerate(self._workers):
+                if process.is_alive():
+                    continue
+                tasks = [task_id for task_id, task in self._tasks.items() if task.worker == index]
+                error = f"sync worker process {index} exited with code {process.exitcode}"
+                lost.extend((self._tasks.pop(task_id), error) for task_id in tasks)
+                logger.error(f"Sync worker process {index} (pid {process.pid}) exited with code {process.exitcode}; "
+                             f"failing its {len(tasks)} in-flight host(s) and starting a replacement")
+                self._start_worker(index)
+        for task, error in lost:
+            task.future.set_exception(RuntimeError(error))
+
+
+_pool_lock = threading.Lock()
+_pool: Optional[ShardPool] = None
+
+
+def get_shard_pool(config) -> ShardPool:
+    """Returns the process-wide worker pool, starting the workers on first use; they are stopped at exit."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ShardPool(process_count(config), config.MAX_JOBS)
+            atexit.register(_pool.close)
+        return _pool
+
+
+def reset_host_health(key: Optional[str] = None):
+    """Forwards a circuit reset to the worker processes, if they were started."""
+    with _pool_lock:
+        pool = _pool
+    if pool is not None:
+        pool.reset_health(key)
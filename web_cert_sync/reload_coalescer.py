@@ -0,0 +1,217 @@
+import atexit
+import concurrent.futures
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+try:
+    from . import phase_timing
+    from .host_health import get_host_health
+    from .server_repository import ServerRepository
+    from .ssh_pool import get_connection_pool
+except ImportError:
+    import phase_timing
+    from host_health import get_host_health
+    from server_repository import ServerRepository
+    from ssh_pool import get_connection_pool
+
+logger = logging.getLogger(__name__)
+
+
+def is_enabled(config) -> bool:
+    """Post-sync commands are deferred only when there is one to run and a debounce window is set."""
+    return bool(config.POST_SYNC_CMD) and config.RELOAD_DEBOUNCE_SECONDS > 0 and not config.DRY_RUN
+
+
+class ReloadTicket:
+    """A deploy's claim on a pending reload; done once the reload that covers it has run."""
+
+    def __init__(self, server: str):
+        self.server = server
+        self.success: Optional[bool] = None
+        self.message = ""
+        self._done = threading.Event()
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def _resolve(self, success: bool, message: str):
+        self.success = success
+        self.message = message
+        self._done.set()
+
+
+class _PendingReload:
+    __slots__ = ("server", "first_at", "deadline", "deploys")
+
+    def __init__(self, server: str, now: float):
+        self.server = server
+        self.first_at = now
+        self.deadline = now
+        # (domains, log_queue, ticket) per deploy waiting on this reload
+        self.deploys: List[tuple] = []
+
+
+class ReloadCoalescer:
+    """
+    Defers POST_SYNC_CMD per host so one reload covers every deploy that
+    reached the host within the debounce window, whether it came from the
+    same job, a concurrent one or the next one. Each new deploy pushes the
+    reload back by debounce seconds, but never past max_delay after the
+    first one. The reload result is written to the log queue of every
+    deploy it covered, listing all of them.
+    Reloads are coalesced within a process; deploys handled by another
+    worker process get their own reload.
+    """
+
+    def __init__(self, config, debounce: float, max_delay: float, max_workers: int = 5):
+        self.config = config
+        self.debounce = max(0.0, debounce)
+        self.max_delay = max(self.debounce, max_delay)
+        self.connection_pool = get_connection_pool(config)
+        self.host_health = get_host_health(config)
+        self._condition = threading.Condition()
+        self._pending: Dict[str, _PendingReload] = {}
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="reload")
+        self._thread: Optional[threading.Thread] = None
+
+    def schedule(self, server: str, domains: List[str], log_queue=None) -> ReloadTicket:
+        """Adds a deploy of domains on server ("host:port"; a bare host gets SSH_PORT_DEFAULT) to its pending reload."""
+        server = ServerRepository.canonical_server(server, self.config.SSH_PORT_DEFAULT)
+        ticket = ReloadTicket(server)
+        now = time.monotonic()
+        with self._condition:
+            pending = self._pending.get(server)
+            if pending is None:
+                pending = self._pending[server] = _PendingReload(server, now)
+            pending.deploys.append((list(domains), log_queue, ticket))
+            pending.deadline = min(now + self.debounce, pending.first_at + self.max_delay)
+            merged = len(pending.deploys)
+            delay = pending.deadline - now
+            self._ensure_thread_locked()
+            self._condition.notify()
+
+        msg = f"Post-sync command on {server} deferred {delay:.0f}s to coalesce reloads"
+        if merged > 1:
+            msg += f" ({merged} deploys pending)"
+        logger.info(msg)
+        if log_queue:
+            log_queue.put(f"[INFO] {msg}")
+        return ticket
+
+    def wait(self, tickets: List[ReloadTicket], timeout: Optional[float] = None) -> bool:
+        """Blocks until every ticket's reload has run; False if timeout passed first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for ticket in tickets:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not ticket.wait(remaining):
+                return False
+        return True
+
+    def flush(self):
+        """
+        Runs every pending reload now, in the calling thread, so a shutting
+        down process does not drop them (the executor no longer accepts work
+        by the time atexit handlers run).
+        """
+        with self._condition:
+            pending_reloads = list(self._pending.values())
+            self._pending.clear()
+        for pending in pending_reloads:
+            self._reload(pending)
+
+    def _ensure_thread_locked(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, name="reload-coalescer", daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            with self._condition:
+                now = time.monotonic()
+                due = [pending for pending in self._pending.values() if pending.deadline <= now]
+                for pending in due:
+                    del self._pending[pending.server]
+                if not due:
+                    next_deadline = min((pending.deadline for pending in self._pending.values()), default=None)
+                    self._condition.wait(None if next_deadline is None else next_deadline - now)
+                    continue
+            for pending in due:
+                try:
+                    self._executor.submit(self._reload, pending)
+                except RuntimeError:  # executor shut down with the interpreter
+                    self._reload(pending)
+
+    def _reload(self, pending: _PendingReload):
+        server = pending.server
+        covered = self._describe(pending.deploys)
+        timer = phase_timing.PhaseTimer("reload", server)
+        try:
+            host, port = ServerRepository.split_server(server, self.config.SSH_PORT_DEFAULT)
+            with self.connection_pool.connection(
+                host, port, self.config.REMOTE_USER,
+                timeout=self.host_health.connect_timeout(server),
+                timer=timer,
+            ) as ssh:
+                with timer.phase("post_sync"):
+                    stdin, stdout, stderr = ssh.exec_command(self.config.POST_SYNC_CMD, timeout=self.config.SSH_EXEC_TIMEOUT)
+                    exit_status = stdout.channel.recv_exit_status()
+                    err = stderr.read().decode(errors='replace').strip()
+            timer.finish("synced" if exit_status == 0 else "failed")
+            if exit_status == 0:
+                success, level = True, "INFO"
+                msg = f"Post-sync command executed on {server} once for {len(pending.deploys)} deploy(s): {covered} {timer.summary()}"
+            else:
+                success, level = False, "WARN"
+                msg = f"Post-sync command failed on {server}: {err}; it covered {covered}"
+        except Exception as exc:
+            timer.finish("failed")
+            success, level = False, "WARN"
+            msg = f"Post-sync command failed on {server}: {str(exc) or type(exc).__name__}; it covered {covered}"
+
+        logger.log(logging.INFO if success else logging.WARNING, msg)
+        notified = set()
+        for _, log_queue, ticket in pending.deploys:
+            if log_queue is not None and id(log_queue) not in notified:
+                notified.add(id(log_queue))
+                try:
+                    log_queue.put(f"[{level}] {msg}")
+                except Exception as exc:
+                    logger.error(f"Failed to report reload of {server}: {exc}")
+            ticket._resolve(success, msg)
+
+    @staticmethod
+    def _describe(deploys: List[tuple]) -> str:
+        """E.g. "example.com (job 1a2b3c4d), api.example.com+www.example.com (job 5e6f7a8b)"."""
+        labels = []
+        for domains, log_queue, _ in deploys:
+            label = "+".join(domains)
+            job_id = getattr(log_queue, "job_id", None)
+            if job_id:
+                label += f" (job {job_id[:8]})"
+            if label not in labels:
+                labels.append(label)
+        return ", ".join(labels)
+
+
+_coalescer_lock = threading.Lock()
+_coalescer: Optional[ReloadCoalescer] = None
+
+
+def get_reload_coalescer(config) -> ReloadCoalescer:
+    """Returns the process-wide coalescer; pending reloads are run, not dropped, at interpreter exit."""
+    global _coalescer
+    with _coalescer_lock:
+        if _coalescer is None:
+            _coalescer = ReloadCoalescer(
+                config,
+                debounce=config.RELOAD_DEBOUNCE_SECONDS,
+                max_delay=config.RELOAD_MAX_DELAY_SECONDS,
+                max_workers=config.MAX_JOBS,
+            )
+            atexit.register(_coalescer.flush)
+        return _coalescer
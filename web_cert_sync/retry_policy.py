@@ -0,0 +1,95 @@
+import asyncio
+import random
+import socket
+from typing import Dict, NamedTuple, Optional
+
+import paramiko
+
+# Error classes reported in sync results as "error_class"
+THROTTLED = "throttled"   # banner read failures, resets and EOFs typical of sshd MaxStartups / bastion limits
+TIMEOUT = "timeout"
+REFUSED = "refused"
+AUTH = "auth"
+REMOTE = "remote"         # connected, but a remote command failed
+NETWORK = "network"       # any other OS-level socket error
+OTHER = "other"
+
+_THROTTLE_MARKERS = ("banner", "reset by peer", "connection reset", "maxstartups", "too many", "connection lost")
+
+
+class RetryPolicy(NamedTuple):
+    """Retry budget for one error class: total attempts, and the exponential backoff base/cap in seconds."""
+
+    max_attempts: int
+    base_delay: float
+    max_delay: float
+
+    def next_delay(self, attempt: int) -> Optional[float]:
+        """
+        Returns the backoff before attempt + 1 ("full jitter": uniform in
+        [0, min(max_delay, base_delay * 2^(attempt-1))]), or None when the
+        attempt budget is spent.
+        """
+        if attempt >= self.max_attempts:
+            return None
+        cap = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, cap)
+
+
+NO_RETRY = RetryPolicy(1, 0, 0)
+
+
+def parse_policies(value: str) -> Dict[str, RetryPolicy]:
+    """Parses "class:attempts:base:max,..." into policies; classes not listed are not retried."""
+    policies = {}
+    for item in (value or "").split(","):
+        fields = item.strip().split(":")
+        if len(fields) != 4:
+            continue
+        name, attempts, base, cap = fields
+        try:
+            policies[name.strip()] = RetryPolicy(max(1, int(attempts)), float(base), float(cap))
+        except ValueError:
+            continue
+    return policies
+
+
+def classify_error(exc: BaseException) -> str:
+    """Maps an exception raised while syncing a host to one of the error classes above."""
+    name = type(exc).__name__
+    message = str(exc).lower()
+
+    if isinstance(exc, paramiko.AuthenticationException) or name in ("PermissionDenied", "HostKeyNotVerifiable"):
+        return AUTH
+    if isinstance(exc, (socket.timeout, TimeoutError, asyncio.TimeoutError)):
+        return TIMEOUT
+    if isinstance(exc, ConnectionRefusedError):
+        return REFUSED
+    if isinstance(exc, paramiko.ssh_exception.NoValidConnectionsError):
+        errnos = {getattr(err, "errno", None) for err in exc.errors.values()}
+        return REFUSED if errnos <= {111, 61, 10061} else NETWORK
+    if isinstance(exc, (ConnectionResetError, BrokenPipeError, EOFError)) or name in ("ConnectionLost", "DisconnectError"):
+        return THROTTLED
+    if isinstance(exc, paramiko.SSHException):
+        return THROTTLED if any(marker in message for marker in _THROTTLE_MARKERS) else OTHER
+    if isinstance(exc, OSError):
+        return THROTTLED if any(marker in message for marker in _THROTTLE_MARKERS) else NETWORK
+    return OTHER
+
+
+class RetrySchedule:
+    """Per-run retry bookkeeping: policy lookup by error class and a shared deadline."""
+
+    def __init__(self, config, started: float):
+        self.enabled = config.SYNC_RETRY_ENABLED
+        self.policies = parse_policies(config.SYNC_RETRY_POLICIES)
+        self.deadline = started + config.SYNC_RETRY_DEADLINE
+
+    def next_delay(self, error_class: Optional[str], attempt: int, now: float) -> Optional[float]:
+        """Returns the wait before the next attempt, or None if the host should not be retried."""
+        if not self.enabled or not error_class:
+            return None
+        delay = self.policies.get(error_class, NO_RETRY).next_delay(attempt)
+        if delay is None or now + delay >= self.deadline:
+            return None
+        return delay
@@ -0,0 +1,99 @@
+import math
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+
+class Wave(NamedTuple):
+    name: str
+    targets: List[str]
+
+
+def _split_group(targets: List[str], wave_size: int, wave_percent: float) -> List[List[str]]:
+    size = len(targets)
+    if wave_percent > 0:
+        size = max(1, math.ceil(len(targets) * min(wave_percent, 100) / 100))
+    if wave_size > 0:
+        size = min(size, wave_size)
+    return [targets[i:i + size] for i in range(0, len(targets), size)]
+
+
+def plan_waves(
+    servers: Sequence[Dict],
+    canary_group: str = "",
+    group_order: Sequence[str] = (),
+    wave_size: int = 0,
+    wave_percent: float = 0,
+) -> List[Wave]:
+    """
+    Orders servers (dicts with host, port, group_name) into rollout waves.
+    The canary group, if it has servers, goes first as a single wave. Other
+    groups follow: first those listed in group_order, in that order, then the
+    rest alphabetically. Each group is split into waves of at most wave_size
+    hosts and/or wave_percent of the group; with neither set a group is one wave.
+    """
+    groups: Dict[str, List[str]] = {}
+    for server in servers:
+        groups.setdefault(server.get("group_name") or "default", []).append(f"{server['host']}:{server['port']}")
+
+    waves = []
+    if canary_group and canary_group in groups:
+        label = canary_group if canary_group == "canary" else f"canary: {canary_group}"
+        waves.append(Wave(label, groups.pop(canary_group)))
+
+    ordered = [name for name in group_order if name in groups]
+    ordered += sorted(name for name in groups if name not in ordered)
+    for name in ordered:
+        chunks = _split_group(groups[name], wave_size, wave_percent)
+        for index, chunk in enumerate(chunks, start=1):
+            label = name if len(chunks) == 1 else f"{name} {index}/{len(chunks)}"
+            waves.append(Wave(label, chunk))
+    return waves
+
+
+class WaveGate:
+    """
+    Tracks final per-host outcomes of each wave and decides when the next one
+    may start. A wave passes as soon as enough hosts succeeded to meet
+    min_success_rate, even if stragglers are still running, so the next wave
+    starts without waiting for the slowest host. It fails as soon as enough
+    hosts failed that the rate can no longer be met.
+    """
+
+    PENDING = "pending"
+    PASSED = "passed"
+    FAILED = "failed"
+
+    def __init__(self, waves: Sequence[Wave], min_success_rate: float):
+        self.waves = list(waves)
+        rate = max(0.0, min(1.0, min_success_rate))
+        self.required = [math.ceil(len(wave.targets) * rate - 1e-9) for wave in self.waves]
+        self.succeeded = [0] * len(self.waves)
+        self.failed = [0] * len(self.waves)
+        self.state = [self.PENDING] * len(self.waves)
+
+    def record(self, wave_index: int, success: bool) -> Optional[str]:
+        """Records one host's final outcome; returns PASSED/FAILED the first time the wave is decided."""
+        if success:
+            self.succeeded[wave_index] += 1
+        else:
+            self.failed[wave_index] += 1
+        return self.evaluate(wave_index)
+
+    def evaluate(self, wave_index: int) -> Optional[str]:
+        if self.state[wave_index] != self.PENDING:
+            return None
+        total = len(self.waves[wave_index].targets)
+        if self.succeeded[wave_index] >= self.required[wave_index]:
+            self.state[wave_index] = self.PASSED
+        elif total - self.failed[wave_index] < self.required[wave_index]:
+            self.state[wave_index] = self.FAILED
+        else:
+            return None
+        return self.state[wave_index]
+
+    def describe(self, wave_index: int) -> str:
+        wave = self.waves[wave_index]
+        return (
+            f"wave {wave_index + 1}/{len(self.waves)} [{wave.name}]: "
+            f"{self.succeeded[wave_index]} ok, {self.failed[wave_index]} failed of {len(wave.targets)}, "
+            f"need {self.required[wave_index]}"
+        )
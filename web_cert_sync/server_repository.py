@@ -1,6 +1,7 @@
+import ipaddress
 import os
 import sqlite3
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 try:
     from .config import Config
@@ -73,6 +74,20 @@ class ServerRepository:
             conn.execute(
                 "CREATE INDEX IF NOT EXISTS idx_passkeys_credential_id ON passkeys(credential_id)"
             )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS concurrency_limits (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    scope TEXT NOT NULL CHECK (scope IN ('group', 'cidr')),
+                    match_value TEXT NOT NULL,
+                    max_sessions INTEGER NOT NULL,
+                    remark TEXT NOT NULL DEFAULT '',
+                    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(scope, match_value)
+                )
+                """
+            )
 
         self._migrate_from_text_file_if_needed()
 
@@ -130,6 +145,39 @@ class ServerRepository:
 
         return {"host": host, "port": port}
 
+    @staticmethod
+    def split_server(server_value: str, default_port: int = 22) -> Tuple[str, int]:
+        """
+        Splits a sync target into (host, port): "1.2.3.4" -> ("1.2.3.4", default_port),
+        " web1:2222 " -> ("web1", 2222), "[::1]:22" or "::1" -> ("::1", 22 / default_port).
+        Raises ValueError for an empty host or a non-numeric port.
+        """
+        value = (server_value or "").strip()
+        if value.startswith("["):
+            host, _, rest = value[1:].partition("]")
+            port_str = rest[1:] if rest.startswith(":") else rest
+        elif value.count(":") > 1:  # bare IPv6 literal
+            host, port_str = value, ""
+        else:
+            host, _, port_str = value.partition(":")
+        host, port_str = host.strip(), port_str.strip()
+        if not host:
+            raise ValueError(f"Invalid server: {server_value!r}")
+        return host, int(port_str) if port_str else default_port
+
+    @classmethod
+    def canonical_server(cls, server_value: str, default_port: int = 22) -> str:
+        """
+        The "host:port" key used for a target everywhere (breakers, groups,
+        tasks, reloads); IPv6 hosts are bracketed. Unparsable values are
+        returned stripped, unchanged otherwise.
+        """
+        try:
+            host, port = cls.split_server(server_value, default_port)
+        except ValueError:
+            return (server_value or "").strip()
+        return f"[{host}]:{port}" if ":" in host else f"{host}:{port}"
+
     def list_servers(self, page: int, page_size: int, search: str = "") -> Dict:
         page = max(page, 1)
         page_size = max(1, min(page_size, self.config.SERVER_PAGE_SIZE_MAX))
@@ -186,6 +234,26 @@ class ServerRepository:
             ).fetchall()
         return [f"{row['host']}:{row['port']}" for row in rows]
 
+    def list_enabled_servers(self, group_name: str = "") -> List[Dict]:
+        """Returns every enabled server, optionally restricted to one group, without pagination."""
+        conditions = ["enabled = 1"]
+        params: List = []
+        if group_name:
+            conditions.append("group_name = ?")
+            params.append(group_name)
+
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"""
+                SELECT id, host, port, enabled, group_name, remark, created_at, updated_at
+                FROM servers
+                WHERE {' AND '.join(conditions)}
+                ORDER BY host ASC, port ASC
+                """,
+                params,
+            ).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
     def create_server(self, host: str, port: int, group_name: str = "default", remark: str = "", enabled: bool = True):
         with self._connect() as conn:
             cursor = conn.execute(
@@ -263,6 +331,72 @@ class ServerRepository:
                 (key, value),
             )
 
+    @staticmethod
+    def normalize_concurrency_limit(scope: str, match_value: str, max_sessions) -> Dict:
+        scope = (scope or "").strip().lower()
+        match_value = (match_value or "").strip()
+        if scope not in ("group", "cidr"):
+            raise ValueError("Scope must be 'group' or 'cidr'")
+        if not match_value:
+            raise ValueError("Match value is required")
+        if scope == "cidr":
+            try:
+                match_value = str(ipaddress.ip_network(match_value, strict=False))
+            except ValueError:
+                raise ValueError(f"Invalid CIDR: {match_value}")
+        try:
+            max_sessions = int(max_sessions)
+        except (TypeError, ValueError):
+            raise ValueError("Max sessions must be an integer")
+        if max_sessions < 1:
+            raise ValueError("Max sessions must be at least 1")
+        return {"scope": scope, "match_value": match_value, "max_sessions": max_sessions}
+
+    def list_concurrency_limits(self) -> List[Dict]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT id, scope, match_value, max_sessions, remark, created_at, updated_at
+                FROM concurrency_limits
+                ORDER BY scope ASC, match_value ASC
+                """
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def set_concurrency_limit(self, scope: str, match_value: str, max_sessions: int, remark: str = "") -> Dict:
+        """Creates or updates the limit for (scope, match_value)."""
+        limit = self.normalize_concurrency_limit(scope, match_value, max_sessions)
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO concurrency_limits (scope, match_value, max_sessions, remark, updated_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(scope, match_value)
+                DO UPDATE SET max_sessions = excluded.max_sessions, remark = excluded.remark, updated_at = CURRENT_TIMESTAMP
+                """,
+                (limit["scope"], limit["match_value"], limit["max_sessions"], remark),
+            )
+            row = conn.execute(
+                """
+                SELECT id, scope, match_value, max_sessions, remark, created_at, updated_at
+                FROM concurrency_limits
+                WHERE scope = ? AND match_value = ?
+                """,
+                (limit["scope"], limit["match_value"]),
+            ).fetchone()
+        return dict(row)
+
+    def delete_concurrency_limit(self, limit_id: int):
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM concurrency_limits WHERE id = ?", (limit_id,))
+        return cursor.rowcount > 0
+
+    def list_server_groups(self) -> Dict[str, str]:
+        """Maps "host:port" to group_name for every server record."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT host, port, group_name FROM servers").fetchall()
+        return {f"{row['host']}:{row['port']}": row["group_name"] for row in rows}
+
     def list_passkeys(self) -> List[Dict]:
         with self._connect() as conn:
             rows = conn.execute(
@@ -0,0 +1,70 @@
+import time
+from typing import List, Optional
+
+# Control lines clients match on a frame of their own (EventSource joins a frame's data lines)
+SENTINELS = ("[JOB]", "[SUCCESS]", "[FAILED]", "[DONE]", "[KEEPALIVE]", "[PROGRESS]")
+
+
+def is_sentinel(message: str) -> bool:
+    return message.startswith(SENTINELS)
+
+
+def frame(message: str, event_id: Optional[int] = None) -> str:
+    return (f"id: {event_id}\n" if event_id is not None else "") + f"data: {message}\n\n"
+
+
+class FrameBatcher:
+    """
+    Coalesces log lines into one SSE frame per interval seconds or
+    max_bytes of data, whichever comes first: an "id:" line carrying the
+    last line's log id (so Last-Event-ID resumes after the whole frame)
+    and one "data:" line per log line. Sentinels always go out alone,
+    after the lines before them, so clients that compare a whole message
+    with [DONE] / [SUCCESS] / [FAILED] keep working. With interval 0 every
+    line is its own frame, as before.
+    """
+
+    def __init__(self, interval: float = 0.0, max_bytes: int = 65536):
+        self.interval = max(0.0, interval)
+        self.max_bytes = max(1, max_bytes)
+        self._lines: List[str] = []
+        self._size = 0
+        self._last_id: Optional[int] = None
+        self._started = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    def add(self, event_id: Optional[int], message: str) -> List[str]:
+        """Queues a line; returns the frames that are ready to send."""
+        if not self.enabled:
+            return [frame(message, event_id)]
+        if is_sentinel(message):
+            return self.flush() + [frame(message, event_id)]
+        if not self._lines:
+            self._started = time.monotonic()
+        line = f"data: {message}\n"
+        self._lines.append(line)
+        self._size += len(line)
+        self._last_id = event_id
+        if self._size >= self.max_bytes:
+            return self.flush()
+        return []
+
+    def remaining(self) -> Optional[float]:
+        """Seconds until the queued lines are due; None when nothing is queued."""
+        if not self._lines:
+            return None
+        return max(0.0, self._started + self.interval - time.monotonic())
+
+    def due(self) -> bool:
+        return self.remaining() == 0.0
+
+    def flush(self) -> List[str]:
+        if not self._lines:
+            return []
+        head = f"id: {self._last_id}\n" if self._last_id is not None else ""
+        batch = head + "".join(self._lines) + "\n"
+        self._lines, self._size, self._last_id = [], 0, None
+        return [batch]
@@ -0,0 +1,233 @@
+import logging
+import socket
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional, Tuple
+
+import paramiko
+
+try:
+    from .identity_manager import get_identity_manager
+except ImportError:
+    from identity_manager import get_identity_manager
+
+logger = logging.getLogger(__name__)
+
+
+class _TimedSSHClient(paramiko.SSHClient):
+    """
+    SSHClient that notes when authentication starts, so connect() can be
+    split into key exchange and auth, and authenticates with the identity
+    manager's preloaded keys when it has any.
+    """
+
+    auth_started: Optional[float] = None
+    identity_manager = None
+    identity_key = ""
+    identity: Optional[str] = None
+
+    def _auth(self, username, *args, **kwargs):
+        self.auth_started = time.monotonic()
+        if self.identity_manager is not None and self.identity_manager.has_identities():
+            self.identity = self.identity_manager.authenticate(self._transport, username, self.identity_key)
+            return
+        return super()._auth(username, *args, **kwargs)
+
+
+class SSHConnectionPool:
+    """Process-wide pool of authenticated SSH clients keyed by user@host:port."""
+
+    def __init__(self, max_size: int = 64, idle_timeout: float = 300, connect_timeout: float = 10, identity_manager=None):
+        self.max_size = max(0, max_size)
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self.identity_manager = identity_manager
+        self._lock = threading.Lock()
+        # key -> list of (client, last_used) idle entries, most recently used last
+        self._idle: Dict[Tuple[str, str, int], List[Tuple[paramiko.SSHClient, float]]] = {}
+        self._owners: Dict[int, Tuple[str, str, int]] = {}
+
+    @staticmethod
+    def _key(host: str, port: int, username: str):
+        return (username, host, int(port))
+
+    def _connect(self, host: str, port: int, username: str, timeout: Optional[float], timer=None):
+        """Opens a new client; timer (a phase_timing.PhaseTimer) receives tcp_connect, kex and auth."""
+        timeout = timeout or self.connect_timeout
+        with timer.phase("tcp_connect") if timer else nullcontext():
+            sock = socket.create_connection((host, port), timeout=timeout)
+        handshake_started = time.monotonic()
+        ssh = _TimedSSHClient()
+        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        ssh.identity_manager = self.identity_manager
+        ssh.identity_key = f"{username}@{host}:{port}"
+        try:
+            ssh.connect(host, port=port, username=username, timeout=timeout, sock=sock)
+        except Exception:
+            ssh.close()
+            sock.close()
+            raise
+        finally:
+            if timer:
+                finished = time.monotonic()
+                auth_started = ssh.auth_started or finished
+                timer.add("kex", auth_started - handshake_started)
+                if ssh.auth_started:
+                    timer.add("auth", finished - auth_started)
+        return ssh
+
+    @staticmethod
+    def _is_healthy(client: paramiko.SSHClient) -> bool:
+        transport = client.get_transport()
+        if transport is None or not transport.is_active():
+            return False
+        try:
+            transport.send_ignore()
+        except Exception:
+            return False
+        return True
+
+    @staticmethod
+    def _close_quietly(client: paramiko.SSHClient):
+        try:
+            client.close()
+        except Exception:
+            pass
+
+    def _evict_expired_locked(self, now: float) -> List[paramiko.SSHClient]:
+        expired = []
+        for key in list(self._idle):
+            fresh = []
+            for client, last_used in self._idle[key]:
+                if now - last_used > self.idle_timeout:
+                    expired.append(client)
+                else:
+                    fresh.append((client, last_used))
+            if fresh:
+                self._idle[key] = fresh
+            else:
+                del self._idle[key]
+        return expired
+
+    def _idle_count_locked(self) -> int:
+        return sum(len(entries) for entries in self._idle.values())
+
+    def acquire(self, host: str, port: int, username: str, timeout: Optional[float] = None, on_connect=None, timer=None) -> paramiko.SSHClient:
+        """
+        Checks out a healthy client for the host, reconnecting if the idle ones went stale.
+        on_connect, if given, is called with the elapsed seconds when a fresh connection was made.
+        timer, if given, records pool_checkout for a reused client, or the connect phases.
+        """
+        key = self._key(host, port, username)
+
+        with self._lock:
+            to_close = self._evict_expired_locked(time.monotonic())
+        for expired in to_close:
+            self._close_quietly(expired)
+
+        client = None
+        checkout_started = time.monotonic()
+        while client is None:
+            with self._lock:
+                entries = self._idle.get(key)
+                if not entries:
+                    break
+                candidate, _ = entries.pop()
+                if not entries:
+                    del self._idle[key]
+            if self._is_healthy(candidate):
+                client = candidate
+            else:
+                logger.info(f"Discarding stale pooled SSH connection to {host}:{port}")
+                self._close_quietly(candidate)
+
+        if client is None:
+            started = time.monotonic()
+            client = self._connect(host, port, username, timeout, timer)
+            if on_connect:
+                on_connect(time.monotonic() - started)
+        elif timer:
+            timer.add("pool_checkout", time.monotonic() - checkout_started)
+
+        with self._lock:
+            self._owners[id(client)] = key
+        return client
+
+    def release(self, client: paramiko.SSHClient, discard: bool = False):
+        """Returns a client to the pool, or closes it when discarded, stale or over capacity."""
+        with self._lock:
+            key = self._owners.pop(id(client), None)
+            keep = (
+                key is not None
+                and not discard
+                and self.max_size > 0
+                and client.get_transport() is not None
+                and client.get_transport().is_active()
+            )
+            to_close = []
+            if keep:
+                now = time.monotonic()
+                to_close.extend(self._evict_expired_locked(now))
+                self._idle.setdefault(key, []).append((client, now))
+                while self._idle_count_locked() > self.max_size:
+                    to_close.append(self._pop_least_recent_locked())
+            else:
+                to_close.append(client)
+
+        for stale in to_close:
+            self._close_quietly(stale)
+
+    def _pop_least_recent_locked(self) -> paramiko.SSHClient:
+        oldest_key = min(self._idle, key=lambda k: self._idle[k][0][1])
+        client, _ = self._idle[oldest_key].pop(0)
+        if not self._idle[oldest_key]:
+            del self._idle[oldest_key]
+        return client
+
+    @contextmanager
+    def connection(self, host: str, port: int, username: str, timeout: Optional[float] = None, on_connect=None, timer=None):
+        """Context manager that checks a client out and returns it; errors drop the connection."""
+        client = self.acquire(host, port, username, timeout=timeout, on_connect=on_connect, timer=timer)
+        try:
+            yield client
+        except Exception:
+            self.release(client, discard=True)
+            raise
+        else:
+            self.release(client)
+
+    def close_all(self):
+        with self._lock:
+            entries = [client for items in self._idle.values() for client, _ in items]
+            self._idle.clear()
+        for client in entries:
+            self._close_quietly(client)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "idle": self._idle_count_locked(),
+                "in_use": len(self._owners),
+                "hosts": len(self._idle),
+                "max_size": self.max_size,
+            }
+
+
+_pool_lock = threading.Lock()
+_pool: Optional[SSHConnectionPool] = None
+
+
+def get_connection_pool(config) -> SSHConnectionPool:
+    """Returns the process-wide pool, creating it from config on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            max_size = config.SSH_POOL_MAX_SIZE if config.SSH_POOL_ENABLED else 0
+            _pool = SSHConnectionPool(
+                max_size=max_size,
+                idle_timeout=config.SSH_POOL_IDLE_TIMEOUT,
+                connect_timeout=config.SSH_CONNECT_TIMEOUT,
+                identity_manager=get_identity_manager(config),
+            )
+        return _pool
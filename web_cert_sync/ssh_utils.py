@@ -1,26 +1,61 @@
 import os
-import paramiko
 import concurrent.futures
+import contextlib
 import logging
 import time
 import datetime
-import subprocess
-import tempfile
+import heapq
+import io
+import threading
 try:
     from .config import Config
     from .server_repository import ServerRepository
+    from .ssh_pool import get_connection_pool
+    from .host_health import get_host_health
+    from . import async_sync
+    from . import process_sync
+    from . import stream_deploy
+    from . import deploy_report
+    from . import retry_policy
+    from . import rollout
+    from . import concurrency_limits
+    from . import metrics
+    from . import phase_timing
+    from . import reload_coalescer
+    from .cert_utils import load_certificate_payload, parse_certificate_metadata
 except ImportError:
     from config import Config
     from server_repository import ServerRepository
+    from ssh_pool import get_connection_pool
+    from host_health import get_host_health
+    import async_sync
+    import process_sync
+    import stream_deploy
+    import deploy_report
+    import retry_policy
+    import rollout
+    import concurrency_limits
+    import metrics
+    import phase_timing
+    import reload_coalescer
+    from cert_utils import load_certificate_payload, parse_certificate_metadata
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# How long the scheduler idles when nothing is in flight and no retry is scheduled
+IDLE_POLL_INTERVAL = 0.5
+
 class SyncManager:
     def __init__(self):
         self.config = Config()
         self.server_repository = ServerRepository(self.config)
+        self.connection_pool = get_connection_pool(self.config)
+        self.host_health = get_host_health(self.config)
+        # Reloads deferred by this manager's runs (see defer_reload)
+        self._reload_tickets = []
+        self._reload_lock = threading.Lock()
 
     def get_server_list(self):
         """Reads enabled sync targets from the repository."""
@@ -36,10 +71,23 @@ class SyncManager:
                 return ["192.168.1.101:22", "192.168.1.102:22"]
             return []
 
-    def _sync_single_server(self, server_line, domain, cert_file, key_file, log_queue=None):
+    def _sync_single_server(self, server_line, deploys, log_queue=None):
         """
-        Syncs certificate to a single server.
+        Syncs one or more domain certificates to a single server over one session.
+        deploys: List of deploy dicts built by _build_deploys; when they carry
+        "hashes", domains whose remote files already match are skipped.
         log_queue: Optional queue to put log messages for web streaming.
+        The post-sync command runs once, after every changed domain is in place,
+        or is handed to the reload coalescer when RELOAD_DEBOUNCE_SECONDS is set.
+        Hosts whose circuit breaker is open are not contacted (status circuit_open).
+        Returns {"success", "server", "status", "error_class"} with status
+        synced/skipped/failed/circuit_open; error_class (see retry_policy) is
+        set for failures and drives the retry schedule. The result also carries
+        the attempt's timings: "started_at" (epoch), "duration", "phases"
+        (seconds per phase, see phase_timing), "bytes_sent" and "error".
+        Phases: pool_checkout for a reused session, otherwise tcp_connect, kex
+        and auth; then remote_hash, mkdir, sftp_open, upload and post_sync
+        (SFTP), or upload and remote_exec (stream mode).
         """
         def log(message, level="INFO"):
             msg = f"[{level}] {message}"
@@ -47,75 +95,207 @@ class SyncManager:
             if log_queue:
                 log_queue.put(msg)
 
-        parts = server_line.split(':')
-        host = parts[0]
-        port = int(parts[1]) if len(parts) > 1 else self.config.SSH_PORT_DEFAULT
-        
-        canonical_line = f"{host}:{port}"
-        remote_dir = f"{self.config.REMOTE_DIR_BASE}/{domain}{self.config.CERT_DIR_SUFFIX}"
+        host, port = ServerRepository.split_server(server_line, self.config.SSH_PORT_DEFAULT)
+        canonical_line = ServerRepository.canonical_server(server_line, self.config.SSH_PORT_DEFAULT)
+        timer = phase_timing.PhaseTimer("sync", canonical_line)
+
+        def finish(success, status, error_class=None, error=None):
+            timer.finish(status)
+            return {
+                "success": success,
+                "server": canonical_line,
+                "status": status,
+                "error_class": error_class,
+                "error": error,
+                **timer.as_dict(),
+            }
         
-        log(f"Starting sync to {canonical_line} ...")
+        log(deploy_report.start_line(canonical_line, deploys))
 
         if self.config.DRY_RUN:
             time.sleep(0.5) # Simulate network delay
-            log(f"[Dry Run] Would connect to {host}:{port} as {self.config.REMOTE_USER}")
-            log(f"[Dry Run] Would mkdir -p {remote_dir}")
-            log(f"[Dry Run] Would scp {cert_file} and {key_file} to {remote_dir}")
-            
-            if self.config.POST_SYNC_CMD:
-                log(f"[Dry Run] Would execute post-sync command: {self.config.POST_SYNC_CMD}")
-                
-            log(f"Successfully synced to {canonical_line} (Dry Run)")
-            return True
-
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        
+            for message, level in deploy_report.dry_run_lines(
+                self.config, canonical_line, host, port, deploys, self._use_stream_deploy()
+            ):
+                log(message, level)
+            return finish(True, "synced")
+
+        allowed, reason = self.host_health.allow(canonical_line)
+        if not allowed:
+            log(f"Skipping {canonical_line}: {reason}", "WARN")
+            return finish(False, "circuit_open", error=reason)
+
+        connect_latency = []
         try:
-            # 1. Connect and create directory
-            ssh.connect(host, port=port, username=self.config.REMOTE_USER, timeout=self.config.SSH_CONNECT_TIMEOUT)
-            
-            mkdir_cmd = f"mkdir -p {remote_dir}"
-            stdin, stdout, stderr = ssh.exec_command(mkdir_cmd, timeout=self.config.SSH_EXEC_TIMEOUT)
-            exit_status = stdout.channel.recv_exit_status()
-            
-            if exit_status != 0:
-                err = stderr.read().decode().strip()
-                log(f"Failed to create directory on {canonical_line}: {err}", "ERROR")
-                ssh.close()
-                return False
-
-            # 2. SCP files
-            sftp = ssh.open_sftp()
-            sftp.put(cert_file, f"{remote_dir}/fullchain.cer")
-            sftp.put(key_file, f"{remote_dir}/{domain}.key")
-            sftp.close()
-            
-            # 3. Execute Post-Sync Command
-            if self.config.POST_SYNC_CMD:
-                log(f"Executing post-sync command: {self.config.POST_SYNC_CMD}")
-                stdin, stdout, stderr = ssh.exec_command(self.config.POST_SYNC_CMD, timeout=self.config.SSH_EXEC_TIMEOUT)
-                exit_status = stdout.channel.recv_exit_status()
-                if exit_status != 0:
-                    err = stderr.read().decode().strip()
-                    log(f"Post-sync command failed on {canonical_line}: {err}", "WARN")
+            with self.connection_pool.connection(
+                host, port, self.config.REMOTE_USER,
+                timeout=self.host_health.connect_timeout(canonical_line),
+                on_connect=connect_latency.append,
+                timer=timer,
+            ) as ssh:
+                if self._use_stream_deploy():
+                    status = self._deploy_stream(ssh, canonical_line, deploys, log, timer)
                 else:
-                    log(f"Post-sync command executed successfully")
-            
-            ssh.close()
-            log(f"Successfully synced to {canonical_line}")
-            return True
+                    status = self._deploy_sftp(ssh, canonical_line, deploys, log, timer)
+            self.host_health.record_success(canonical_line, connect_latency[0] if connect_latency else None)
+
+            result = finish(status != "failed", status, *deploy_report.remote_failure(status))
+            for message, level in deploy_report.outcome_lines(canonical_line, status, timer.summary()):
+                log(message, level)
+            if status == "synced" and reload_coalescer.is_enabled(self.config):
+                self.defer_reload(canonical_line, [deploy['domain'] for deploy in deploys], log_queue)
+            return result
 
         except Exception as e:
-            log(f"Error syncing to {canonical_line}: {str(e)}", "ERROR")
+            error = str(e) or type(e).__name__
+            result = finish(False, "failed", retry_policy.classify_error(e), error)
+            log(*deploy_report.error_line(canonical_line, error, timer.summary()))
+            self._record_host_failure(canonical_line, e, log)
+            return result
+
+    def _circuit_opened(self, server, log_queue=None) -> bool:
+        """True if the host's circuit is open, in which case a retry would only be skipped."""
+        canonical_line = ServerRepository.canonical_server(server, self.config.SSH_PORT_DEFAULT)
+        if not self.host_health.is_open(canonical_line):
             return False
+        msg = f"Not retrying {canonical_line}: its circuit is open"
+        logger.info(msg)
+        if log_queue:
+            log_queue.put(f"[RETRY] {msg}")
+        return True
+
+    def _record_host_failure(self, canonical_line, error, log=None):
+        if self.host_health.record_failure(canonical_line, str(error) or type(error).__name__):
+            msg, level = deploy_report.circuit_opened_line(canonical_line, self.config.HOST_CIRCUIT_COOLDOWN)
+            if log:
+                log(msg, level)
+            else:
+                logger.warning(msg)
+
+    def _use_stream_deploy(self):
+        return (self.config.SYNC_TRANSFER_MODE or 'sftp').lower() == 'stream'
+
+    def _inline_post_sync_cmd(self):
+        """The post-sync command to run as part of the deploy; empty when reloads are coalesced."""
+        return "" if reload_coalescer.is_enabled(self.config) else self.config.POST_SYNC_CMD
+
+    def defer_reload(self, server, domains, log_queue=None):
+        """Queues the post-sync command for server with the reload coalescer and keeps the ticket."""
+        ticket = reload_coalescer.get_reload_coalescer(self.config).schedule(server, domains, log_queue)
+        with self._reload_lock:
+            self._reload_tickets.append(ticket)
+        return ticket
+
+    def take_reload_tickets(self):
+        """Returns and forgets the tickets of reloads deferred so far."""
+        with self._reload_lock:
+            tickets, self._reload_tickets = self._reload_tickets, []
+        return tickets
+
+    def wait_for_reloads(self, tickets=None):
+        """Blocks until the deferred reloads (by default all taken from this manager) have run."""
+        tickets = self.take_reload_tickets() if tickets is None else tickets
+        if tickets:
+            reload_coalescer.get_reload_coalescer(self.config).wait(tickets)
+        return tickets
+
+    def _remote_files_match(self, ssh, remote_dir, local_hashes):
+        """Compares remote SHA-256 digests with the local ones in a single exec."""
+        command = stream_deploy.build_hash_command(remote_dir, list(local_hashes))
+        stdin, stdout, stderr = ssh.exec_command(command, timeout=self.config.SSH_EXEC_TIMEOUT)
+        stdout.channel.recv_exit_status()
+        remote_hashes = stream_deploy.parse_hash_output(stdout.read().decode(errors='replace'))
+        return remote_hashes == local_hashes
+
+    def _deploy_sftp(self, ssh, canonical_line, deploys, log, timer):
+        """
+        Creates each directory, uploads over SFTP, then runs the post-sync command once.
+        timer: phase_timing.PhaseTimer that receives each step's time and the bytes sent.
+        """
+        changed = 0
+        sftp = None
+        try:
+            for deploy in deploys:
+                remote_dir = deploy['remote_dir']
+                if deploy.get('hashes'):
+                    with timer.phase("remote_hash"):
+                        unchanged = self._remote_files_match(ssh, remote_dir, deploy['hashes'])
+                    if unchanged:
+                        if len(deploys) > 1:
+                            log(*deploy_report.unchanged_domain_line(canonical_line, deploy))
+                        continue
+
+                # 1. Create directory
+                mkdir_cmd = f"mkdir -p {remote_dir}"
+                with timer.phase("mkdir"):
+                    stdin, stdout, stderr = ssh.exec_command(mkdir_cmd, timeout=self.config.SSH_EXEC_TIMEOUT)
+                    exit_status = stdout.channel.recv_exit_status()
+
+                if exit_status != 0:
+                    log(*deploy_report.mkdir_failed_line(canonical_line, stderr.read().decode().strip()))
+                    return "failed"
+
+                # 2. SCP files
+                if sftp is None:
+                    with timer.phase("sftp_open"):
+                        sftp = ssh.open_sftp()
+                payload = deploy['payload']
+                with timer.phase("upload"):
+                    sftp.putfo(io.BytesIO(payload.cert_bytes), f"{remote_dir}/fullchain.cer")
+                    sftp.putfo(io.BytesIO(payload.key_bytes), f"{remote_dir}/{deploy['domain']}.key")
+                timer.bytes_sent += len(payload.cert_bytes) + len(payload.key_bytes)
+                changed += 1
+        finally:
+            if sftp is not None:
+                sftp.close()
+
+        if not changed:
+            return "skipped"
+
+        # 3. Execute Post-Sync Command
+        post_sync_cmd = self._inline_post_sync_cmd()
+        if post_sync_cmd:
+            log(f"Executing post-sync command: {post_sync_cmd}")
+            with timer.phase("post_sync"):
+                stdin, stdout, stderr = ssh.exec_command(post_sync_cmd, timeout=self.config.SSH_EXEC_TIMEOUT)
+                exit_status = stdout.channel.recv_exit_status()
+            err = stderr.read().decode().strip() if exit_status != 0 else ""
+            log(*deploy_report.post_sync_line(canonical_line, exit_status, err))
+        return "synced"
+
+    def _deploy_stream(self, ssh, canonical_line, deploys, log, timer):
+        """
+        Pipes a tar of every cert and key into one exec that extracts, reloads and reports status.
+        The remote extraction and post-sync command are timed together as remote_exec.
+        """
+        payload = stream_deploy.build_deploys_archive(deploys)
+        command = stream_deploy.build_deploys_command(deploys, self.config.REMOTE_DIR_BASE, self._inline_post_sync_cmd())
+
+        with timer.phase("upload"):
+            stdin, stdout, stderr = ssh.exec_command(command, timeout=self.config.SSH_EXEC_TIMEOUT)
+            stdin.write(payload)
+            stdin.flush()
+            stdin.channel.shutdown_write()
+        timer.bytes_sent += len(payload)
+        with timer.phase("remote_exec"):
+            exit_status = stdout.channel.recv_exit_status()
+            output = stdout.read().decode(errors='replace')
+            err = stderr.read().decode(errors='replace').strip()
+
+        status, lines = stream_deploy.interpret_status(output, err, exit_status, canonical_line)
+        for message, level in lines:
+            log(message, level)
+        return status
 
     def inspect_remote_certificate(self, server_line, domain):
-        """Reads the deployed certificate from the remote host and returns expiry info."""
-        parts = server_line.split(':')
-        host = parts[0]
-        port = int(parts[1]) if len(parts) > 1 else self.config.SSH_PORT_DEFAULT
-        canonical_line = f"{host}:{port}"
+        """
+        Reads the deployed certificate from the remote host and returns expiry
+        and identity info, plus "duration" and "phases" (the connect phases,
+        sftp_open and read; see phase_timing). Hosts whose circuit breaker is
+        open are not contacted and come back with status "circuit_open".
+        """
+        host, port = ServerRepository.split_server(server_line, self.config.SSH_PORT_DEFAULT)
+        canonical_line = ServerRepository.canonical_server(server_line, self.config.SSH_PORT_DEFAULT)
         remote_cert = f"{self.config.REMOTE_DIR_BASE}/{domain}{self.config.CERT_DIR_SUFFIX}/fullchain.cer"
 
         if self.config.DRY_RUN:
@@ -128,98 +308,275 @@ class SyncManager:
                 "days_left": 45,
             }
 
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        timer = phase_timing.PhaseTimer("inspect", canonical_line)
 
-        temp_path = None
-        try:
-            ssh.connect(host, port=port, username=self.config.REMOTE_USER, timeout=self.config.SSH_CONNECT_TIMEOUT)
-            sftp = ssh.open_sftp()
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".cer") as temp_file:
-                temp_path = temp_file.name
-            sftp.get(remote_cert, temp_path)
-            sftp.close()
-            ssh.close()
-
-            cmd = ['openssl', 'x509', '-enddate', '-noout', '-in', temp_path]
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            if result.returncode != 0:
-                raise RuntimeError(result.stderr.strip() or 'Failed to parse remote certificate')
-
-            date_str = result.stdout.strip().split('=', 1)[1]
-            expiry_date = datetime.datetime.strptime(date_str, '%b %d %H:%M:%S %Y %Z')
-            days_left = (expiry_date - datetime.datetime.now()).days
+        def timings(status):
+            timer.finish(status)
+            return {"duration": timer.duration, "phases": dict(timer.phases)}
 
+        allowed, reason = self.host_health.allow(canonical_line)
+        if not allowed:
             return {
-                "success": True,
+                "success": False,
                 "server": canonical_line,
                 "remote_cert": remote_cert,
-                "expiry_date": date_str,
-                "days_left": days_left,
+                "status": "circuit_open",
+                "error": reason,
+                **timings("circuit_open"),
             }
-        except FileNotFoundError:
+
+        connect_latency = []
+        reached = False
+        try:
+            with self.connection_pool.connection(
+                host, port, self.config.REMOTE_USER,
+                timeout=self.host_health.connect_timeout(canonical_line),
+                on_connect=connect_latency.append,
+                timer=timer,
+            ) as ssh:
+                with timer.phase("sftp_open"):
+                    sftp = ssh.open_sftp()
+                try:
+                    with timer.phase("read"), sftp.open(remote_cert, 'rb') as remote_file:
+                        cert_bytes = remote_file.read()
+                except FileNotFoundError:
+                    cert_bytes = None
+                finally:
+                    sftp.close()
+            reached = True
+            self.host_health.record_success(canonical_line, connect_latency[0] if connect_latency else None)
+
+            if cert_bytes is None:
+                return {
+                    "success": False,
+                    "server": canonical_line,
+                    "remote_cert": remote_cert,
+                    "error": "Remote certificate not found",
+                    **timings("missing"),
+                }
+
+            try:
+                metadata = parse_certificate_metadata(cert_bytes)
+            except ValueError as e:
+                raise RuntimeError(f"Failed to parse remote certificate: {e}")
+
             return {
-                "success": False,
+                "success": True,
                 "server": canonical_line,
                 "remote_cert": remote_cert,
-                "error": "Local openssl command not found",
+                **metadata,
+                **timings("ok"),
             }
         except Exception as e:
+            if not reached:
+                self._record_host_failure(canonical_line, e)
             return {
                 "success": False,
                 "server": canonical_line,
                 "remote_cert": remote_cert,
                 "error": str(e),
+                **timings("failed"),
             }
-        finally:
-            if temp_path and os.path.exists(temp_path):
-                os.remove(temp_path)
-            try:
-                ssh.close()
-            except Exception:
-                pass
 
-    def run_sync(self, domain, targets, log_queue=None):
+    def scan_remote_certificates(self, domain, servers, on_result=None):
         """
-        Orchestrates the sync process.
-        targets: List of server strings (e.g., ["1.1.1.1", "2.2.2.2:2222"])
+        Inspects the deployed certificate on every server in parallel (capped
+        at SCAN_MAX_JOBS). on_result is called with each host's result as soon
+        as it completes; the aggregate summary is returned at the end.
+        servers: server dicts as returned by ServerRepository.
         """
-        cert_dir = f"{self.config.ACME_CERT_ROOT}/{domain}{self.config.CERT_DIR_SUFFIX}"
-        cert_file = f"{cert_dir}/fullchain.cer"
-        key_file = f"{cert_dir}/{domain}.key"
-
-        # Check local files
-        if not self.config.DRY_RUN:
-            if not os.path.exists(cert_file) or not os.path.exists(key_file):
-                msg = f"Certificate files not found at {cert_dir}"
-                logger.error(msg)
-                if log_queue:
-                    log_queue.put(f"[ERROR] {msg}")
-                return False, []
-        else:
-             if log_queue:
-                log_queue.put(f"[Dry Run] Checking certificate files at {cert_dir} (Skipped)")
-
-        max_jobs = self.config.MAX_JOBS
-        failed_hosts = []
+        started = time.monotonic()
+        warn_days = self.config.SCAN_EXPIRY_WARN_DAYS
+        summary = {
+            "domain": domain,
+            "total": len(servers),
+            "success": 0,
+            "failed": 0,
+            "expired": 0,
+            "expiring": 0,
+            "warn_days": warn_days,
+            "min_days_left": None,
+            "earliest_server": None,
+            "failed_servers": [],
+        }
+        if not servers:
+            summary["duration"] = 0.0
+            return summary
 
+        max_jobs = max(1, min(self.config.SCAN_MAX_JOBS, len(servers)))
         with concurrent.futures.ThreadPoolExecutor(max_workers=max_jobs) as executor:
             future_to_server = {
-                executor.submit(self._sync_single_server, server, domain, cert_file, key_file, log_queue): server
-                for server in targets
+                executor.submit(self.inspect_remote_certificate, f"{server['host']}:{server['port']}", domain): server
+                for server in servers
             }
-            
+
             for future in concurrent.futures.as_completed(future_to_server):
                 server = future_to_server[future]
                 try:
-                    success = future.result()
-                    if not success:
-                        failed_hosts.append(server)
+                    result = future.result()
                 except Exception as exc:
-                    logger.error(f"{server} generated an exception: {exc}")
-                    if log_queue:
-                        log_queue.put(f"[ERROR] {server} exception: {exc}")
-                    failed_hosts.append(server)
+                    result = {
+                        "success": False,
+                        "server": f"{server['host']}:{server['port']}",
+                        "error": str(exc),
+                    }
+                result.update({
+                    "id": server['id'],
+                    "group_name": server['group_name'],
+                    "remark": server['remark'],
+                })
+
+                if result.get("success"):
+                    summary["success"] += 1
+                    days_left = result["days_left"]
+                    if days_left < 0:
+                        summary["expired"] += 1
+                    elif days_left < warn_days:
+                        summary["expiring"] += 1
+                    if summary["min_days_left"] is None or days_left < summary["min_days_left"]:
+                        summary["min_days_left"] = days_left
+                        summary["earliest_server"] = result["server"]
+                else:
+                    summary["failed"] += 1
+                    summary["failed_servers"].append(result["server"])
+
+                if on_result:
+                    on_result(result)
+
+        summary["duration"] = round(time.monotonic() - started, 3)
+        return summary
+
+    def run_sync(self, domain, targets, log_queue=None):
+        """
+        Orchestrates the sync process.
+        targets: List of server strings (e.g., ["1.1.1.1", "2.2.2.2:2222"])
+        """
+        return self.run_batch_sync([domain], targets, log_queue)
+
+    def run_rollout_sync(self, domains, servers, log_queue=None):
+        """
+        Syncs servers (dicts with host, port, group_name) in waves planned from
+        their groups (see plan_rollout). A wave starts once the previous one
+        reached SYNC_WAVE_MIN_SUCCESS_RATE.
+        """
+        waves = self.plan_rollout(servers)
+        self.log_rollout_plan(waves, log_queue)
+        return self.run_batch_sync(
+            domains,
+            [server for wave in waves for server in wave.targets],
+            log_queue,
+            waves=waves,
+            min_success_rate=self.config.SYNC_WAVE_MIN_SUCCESS_RATE,
+        )
+
+    def plan_rollout(self, servers):
+        """
+        Plans rollout waves for servers: the SYNC_CANARY_GROUP first, then
+        SYNC_GROUP_ORDER, then the remaining groups, each split by
+        SYNC_WAVE_SIZE / SYNC_WAVE_PERCENT.
+        """
+        group_order = [name.strip() for name in self.config.SYNC_GROUP_ORDER.split(',') if name.strip()]
+        return rollout.plan_waves(
+            servers,
+            canary_group=self.config.SYNC_CANARY_GROUP,
+            group_order=group_order,
+            wave_size=self.config.SYNC_WAVE_SIZE,
+            wave_percent=self.config.SYNC_WAVE_PERCENT,
+        )
+
+    def log_rollout_plan(self, waves, log_queue=None):
+        msg = f"Rollout plan: {len(waves)} wave(s): " + ", ".join(f"{wave.name} ({len(wave.targets)})" for wave in waves)
+        self._log_wave(log_queue, msg)
+
+    def run_batch_sync(self, domains, targets, log_queue=None, waves=None, min_success_rate=0.0, on_result=None, on_attempt=None,
+                       wait_for_reloads=True, cancel=None):
+        """
+        Syncs several domains in one pass: each host gets one session that
+        deploys every domain's files, followed by a single post-sync command.
+        waves: Optional list of rollout.Wave covering targets; without it all
+        targets form a single wave.
+        on_result: Optional callback (server, status, error_class) called once
+        per host with its final status: synced, skipped, failed, circuit_open
+        or not_attempted.
+        on_attempt: Optional callback (server, attempt, result) called after
+        every attempt, retries included, with the timings described in
+        _sync_single_server.
+        wait_for_reloads: With reload coalescing on, return only after the
+        deferred post-sync commands ran; when False the caller collects them
+        with take_reload_tickets and waits itself.
+        cancel: Optional threading.Event; once set, no further host is started
+        (attempts in flight finish) and the rest are reported as not_attempted.
+        """
+        deploys = self._build_deploys(domains, log_queue)
+        if deploys is None:
+            return False, []
+        if waves is None:
+            waves = [rollout.Wave("all", list(targets))]
+
+        engine = (self.config.SYNC_ENGINE or 'threads').lower()
+        if engine == 'asyncio' and not async_sync.is_available():
+            msg = "SYNC_ENGINE=asyncio requires the asyncssh package; falling back to the thread pool engine"
+            logger.warning(msg)
+            if log_queue:
+                log_queue.put(f"[WARN] {msg}")
+            engine = 'threads'
+
+        shards = None
+        if engine == 'processes':
+            try:
+                shards = process_sync.get_shard_pool(self.config).open_run(
+                    deploys, log_queue,
+                    defer_reload=self.defer_reload if reload_coalescer.is_enabled(self.config) else None,
+                )
+            except (OSError, RuntimeError) as exc:
+                msg = f"Could not start sync worker processes ({exc}); falling back to the thread pool engine"
+                logger.warning(msg)
+                if log_queue:
+                    log_queue.put(f"[WARN] {msg}")
+                engine = 'threads'
+
+        limiter = concurrency_limits.ConcurrencyLimiter.from_repository(self.server_repository)
+        if limiter:
+            msg = f"Concurrency limits: {limiter.describe()}"
+            logger.info(msg)
+            if log_queue:
+                log_queue.put(f"[INFO] {msg}")
+
+        if engine == 'asyncio':
+            failed_hosts, skipped_hosts, not_attempted = async_sync.AsyncSyncEngine(self.config).run(
+                deploys, waves, min_success_rate, log_queue, limiter=limiter, on_result=on_result, on_attempt=on_attempt,
+                defer_reload=self.defer_reload if reload_coalescer.is_enabled(self.config) else None, cancel=cancel,
+            )
+        elif shards is not None:
+            with shards:
+                failed_hosts, skipped_hosts, not_attempted = self._run_thread_pool(
+                    deploys, waves, min_success_rate, log_queue, limiter=limiter, on_result=on_result, on_attempt=on_attempt,
+                    shards=shards, cancel=cancel,
+                )
+        else:
+            failed_hosts, skipped_hosts, not_attempted = self._run_thread_pool(
+                deploys, waves, min_success_rate, log_queue, limiter=limiter, on_result=on_result, on_attempt=on_attempt,
+                cancel=cancel,
+            )
+        if wait_for_reloads:
+            self.wait_for_reloads()
+
+        if not_attempted:
+            if on_result:
+                for server in not_attempted:
+                    on_result(server, "not_attempted", None)
+            reason = "run stopped" if cancel is not None and cancel.is_set() else "rollout halt"
+            msg = f"Not attempted after {reason}: {len(not_attempted)} host(s): {', '.join(not_attempted)}"
+            logger.warning(msg)
+            if log_queue:
+                log_queue.put(f"[WARN] {msg}")
+            failed_hosts = failed_hosts + not_attempted
+
+        if skipped_hosts:
+            msg = f"Skipped {len(skipped_hosts)} unchanged host(s): {', '.join(skipped_hosts)}"
+            logger.info(msg)
+            if log_queue:
+                log_queue.put(f"[SKIP] {msg}")
 
         if failed_hosts:
             msg = f"Sync completed with failures on: {', '.join(failed_hosts)}"
@@ -233,3 +590,223 @@ class SyncManager:
             if log_queue:
                 log_queue.put(f"[INFO] {msg}")
             return True, []
+
+    def _build_deploys(self, domains, log_queue=None):
+        """
+        Resolves local paths and remote dirs per domain and loads each cert/key
+        once into an immutable payload that every host upload reuses.
+        Returns None if files are missing or invalid.
+        """
+        def log_error(msg):
+            logger.error(msg)
+            if log_queue:
+                log_queue.put(f"[ERROR] {msg}")
+
+        deploys = []
+        for domain in domains:
+            dir_name = f"{domain}{self.config.CERT_DIR_SUFFIX}"
+            cert_dir = f"{self.config.ACME_CERT_ROOT}/{dir_name}"
+            cert_file = f"{cert_dir}/fullchain.cer"
+            key_file = f"{cert_dir}/{domain}.key"
+
+            payload = None
+            hashes = None
+            # Check local files
+            if not self.config.DRY_RUN:
+                if not os.path.exists(cert_file) or not os.path.exists(key_file):
+                    log_error(f"Certificate files not found at {cert_dir}")
+                    return None
+                try:
+                    payload = load_certificate_payload(domain, cert_file, key_file)
+                except (OSError, ValueError) as e:
+                    log_error(str(e))
+                    return None
+
+                msg = (
+                    f"Loaded certificate for {domain}: expires {payload.not_after.strftime('%Y-%m-%d %H:%M:%S UTC')}, "
+                    f"sha256 {payload.cert_sha256[:16]}"
+                )
+                logger.info(msg)
+                if log_queue:
+                    log_queue.put(f"[INFO] {msg}")
+
+                if self.config.SYNC_INCREMENTAL:
+                    hashes = {
+                        "fullchain.cer": payload.cert_sha256,
+                        f"{domain}.key": payload.key_sha256,
+                    }
+            else:
+                 if log_queue:
+                    log_queue.put(f"[Dry Run] Checking certificate files at {cert_dir} (Skipped)")
+
+            deploys.append({
+                "domain": domain,
+                "dir_name": dir_name,
+                "remote_dir": f"{self.config.REMOTE_DIR_BASE}/{dir_name}",
+                "cert_file": cert_file,
+                "key_file": key_file,
+                "payload": payload,
+                "hashes": hashes,
+            })
+        return deploys
+
+    def _run_thread_pool(self, deploys, waves, min_success_rate, log_queue=None, limiter=None, on_result=None, on_attempt=None,
+                         shards=None, cancel=None):
+        """
+        Syncs targets on a ThreadPoolExecutor capped at MAX_JOBS and returns
+        (failed, skipped, not_attempted) hosts.
+        Hosts are only handed to a worker when every per-group / per-CIDR cap
+        they count against (see concurrency_limits) has a free slot; hosts
+        held back by a saturated cap do not block others from the pool.
+        Waves are launched in order on the same executor; each one starts as
+        soon as the previous wave is decided as passed (see rollout.WaveGate),
+        so slots never sit idle waiting for stragglers. A failed wave halts
+        the rollout and its successors are reported as not attempted.
+        Failed hosts are re-queued per their error class's retry policy; the
+        backoff is waited out by this scheduler loop, never by a worker thread,
+        so other hosts keep using every slot in the meantime.
+        shards: Optional process_sync.ShardRun; attempts then run in the sync
+        worker processes (up to their combined capacity) instead of on a
+        local thread pool, with this loop still doing all the scheduling.
+        cancel: Optional threading.Event; once set, queued and backing-off
+        hosts are dropped and returned as not attempted.
+        """
+        max_jobs = shards.capacity if shards else self.config.MAX_JOBS
+        limiter = limiter or concurrency_limits.ConcurrencyLimiter()
+        ready = concurrency_limits.LimitedQueue(limiter)
+        failed_hosts = []
+        skipped_hosts = []
+        schedule = retry_policy.RetrySchedule(self.config, time.monotonic())
+        gate = rollout.WaveGate(waves, min_success_rate)
+        # (ready_at, sequence, server, attempt, wave_index) waiting out their backoff
+        delayed = []
+        sequence = 0
+        launched = 0
+        halted = False
+        queued_reported = 0
+        cancelled = []
+
+        with contextlib.nullcontext() if shards else concurrent.futures.ThreadPoolExecutor(max_workers=max_jobs) as executor:
+            future_to_server = {}
+
+            def dispatch():
+                while len(future_to_server) < max_jobs:
+                    picked = ready.pop()
+                    if picked is None:
+                        return
+                    keys, (server, attempt, wave_index) = picked
+                    if shards:
+                        future = shards.submit(server)
+                    else:
+                        future = executor.submit(self._sync_single_server, server, deploys, log_queue)
+                    future_to_server[future] = (server, attempt, wave_index, keys)
+                    metrics.adjust_inflight(1)
+                report_queued()
+
+            def report_queued():
+                nonlocal queued_reported
+                metrics.adjust_queued(len(ready) - queued_reported)
+                queued_reported = len(ready)
+
+            def launch_ready_waves():
+                nonlocal launched
+                while (not halted and not is_cancelled() and launched < len(waves)
+                       and (launched == 0 or gate.state[launched - 1] == gate.PASSED)):
+                    wave = waves[launched]
+                    if len(waves) > 1:
+                        self._log_wave(log_queue, f"Starting wave {launched + 1}/{len(waves)} [{wave.name}]: {len(wave.targets)} host(s)")
+                    for server in wave.targets:
+                        ready.push(server, (server, 1, launched))
+                    launched += 1
+                    settle(launched - 1, gate.evaluate(launched - 1))
+
+            def settle(wave_index, decision):
+                nonlocal halted
+                if decision == gate.PASSED and len(waves) > 1:
+                    self._log_wave(log_queue, f"Passed {gate.describe(wave_index)}")
+                elif decision == gate.FAILED:
+                    halted = True
+                    self._log_wave(log_queue, f"Rollout halted, success rate below threshold in {gate.describe(wave_index)}", "WARN")
+
+            def is_cancelled():
+                return cancel is not None and cancel.is_set()
+
+            launch_ready_waves()
+            try:
+                while future_to_server or delayed or len(ready):
+                    if is_cancelled() and (delayed or len(ready)):
+                        cancelled.extend(server for _, _, server, _, _ in delayed)
+                        cancelled.extend(server for server, _, _ in ready.drain())
+                        delayed.clear()
+                        report_queued()
+                        continue
+                    now = time.monotonic()
+                    while delayed and delayed[0][0] <= now:
+                        _, _, server, attempt, wave_index = heapq.heappop(delayed)
+                        ready.push(server, (server, attempt, wave_index))
+                    dispatch()
+
+                    timeout = max(0.0, delayed[0][0] - now) if delayed else None
+                    if not future_to_server:
+                        time.sleep(timeout if timeout is not None else IDLE_POLL_INTERVAL)
+                        continue
+                    done, _ = concurrent.futures.wait(
+                        future_to_server, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+
+                    for future in done:
+                        server, attempt, wave_index, keys = future_to_server.pop(future)
+                        limiter.release(keys)
+                        metrics.adjust_inflight(-1)
+                        try:
+                            result = future.result()
+                        except Exception as exc:
+                            logger.error(f"{server} generated an exception: {exc}")
+                            if log_queue:
+                                log_queue.put(f"[ERROR] {server} exception: {exc}")
+                            result = {"success": False, "status": "failed", "error_class": None, "error": str(exc)}
+                        metrics.observe_attempt(result)
+                        if on_attempt:
+                            on_attempt(server, attempt, result)
+
+                        if result["success"]:
+                            if result["status"] == "skipped":
+                                skipped_hosts.append(server)
+                            if on_result:
+                                on_result(server, result["status"], None)
+                            settle(wave_index, gate.record(wave_index, True))
+                            continue
+
+                        delay = schedule.next_delay(result.get("error_class"), attempt, time.monotonic())
+                        if delay is not None and self._circuit_opened(server, log_queue):
+                            delay = None
+                        if delay is None:
+                            failed_hosts.append(server)
+                            if on_result:
+                                on_result(server, result["status"], result.get("error_class"))
+                            settle(wave_index, gate.record(wave_index, False))
+                            continue
+                        msg = f"Retrying {server} ({result['error_class']}) in {delay:.1f}s, attempt {attempt + 1}"
+                        logger.info(msg)
+                        if log_queue:
+                            log_queue.put(f"[RETRY] {msg}")
+                        sequence += 1
+                        heapq.heappush(delayed, (time.monotonic() + delay, sequence, server, attempt + 1, wave_index))
+
+                    launch_ready_waves()
+                    dispatch()
+            finally:
+                metrics.adjust_inflight(-len(future_to_server))
+                metrics.adjust_queued(-queued_reported)
+
+        not_attempted = cancelled + [server for wave in waves[launched:] for server in wave.targets]
+        return failed_hosts, skipped_hosts, not_attempted
+
+    @staticmethod
+    def _log_wave(log_queue, message, level="WAVE"):
+        if level == "WARN":
+            logger.warning(message)
+        else:
+            logger.info(message)
+        if log_queue:
+            log_queue.put(f"[{level}] {message}")
@@ -1,5 +1,5 @@
 /* 全局状态 */
-const S={mode:'all',search:'',page:1,pageSize:20,pagination:{total:0,pages:0},editingId:null,syncStates:{},currentServers:[]};
+const S={mode:'all',jobStreaming:false,search:'',page:1,pageSize:20,pagination:{total:0,pages:0},editingId:null,syncStates:{},currentServers:[]};
 
 /* 工具函数 */
 function esc(v){return String(v??'').replace(/&/g,'&amp;').replace(/</g,'&lt;').replace(/>/g,'&gt;').replace(/"/g,'&quot;').replace(/'/g,'&#39;')}
@@ -17,8 +17,8 @@ function switchView(name){
     const view=$('view-'+name);if(view)view.classList.add('active');
     document.querySelectorAll(`[data-view="${name}"]`).forEach(n=>n.classList.add('active'));
     if(name==='dashboard')loadDashboard();
-    if(name==='servers'){loadServerDomains();loadServers()}
-    if(name==='sync')loadDomains();
+    if(name==='servers'){loadServerDomains();loadServers();loadLimits()}
+    if(name==='sync'){loadDomains();resumeSyncJob()}
     if(name==='account'){loadTwoFactorStatus();loadPasskeys()}
 }
 
@@ -46,11 +46,13 @@ class LogConsole {
         this.statusBadge = panelEl.querySelector('.log-status-badge');
         this.body = panelEl.querySelector('.log-body');
         this.summary = panelEl.querySelector('.log-summary');
+        this.pending = [];
     }
     start(title, meta) {
         this.panel.classList.add('active');
         this.titleBar.textContent = title;
         this.body.innerHTML = '';
+        this.pending = [];
         this.setStatus('running', '运行中');
         this.setSummary('');
         setTimeout(() => this.panel.scrollIntoView({behavior:'smooth',block:'center'}), 100);
@@ -68,7 +70,15 @@ class LogConsole {
         const tags={info:'INFO',warn:'WARN',error:'ERROR',ok:'OK',task:'TASK',ping:'PING',done:'DONE',path:'PATH',cert:'CERT',time:'TIME'};
         const e=document.createElement('div'); e.className='log-entry';
         e.innerHTML=`<span class="log-ts">${now()}</span><span class="log-tag ${type}">${label||tags[type]||'INFO'}</span><span class="log-msg">${esc(msg)}</span>`;
-        this.body.appendChild(e); this.body.scrollTop=this.body.scrollHeight;
+        /* 同一帧内的日志合并为一次 DOM 插入和一次滚动 */
+        this.pending.push(e);
+        if(this.pending.length===1) requestAnimationFrame(() => this.flush());
+    }
+    flush() {
+        if(!this.pending.length) return;
+        const frag=document.createDocumentFragment();
+        this.pending.forEach(e=>frag.appendChild(e)); this.pending=[];
+        this.body.appendChild(frag); this.body.scrollTop=this.body.scrollHeight;
     }
     finish(status, summary) {
         this.setStatus(status, status==='success'?'完成':'失败');
@@ -86,17 +96,21 @@ function inferType(m){return m.includes('[ERROR]')?'error':m.includes('[WARN]')?
 
 /* SSE 流消费 */
 async function consumeStream(resp,opts){
-    const{onOk,onFail,metaFn,okText,failPre}=opts;
+    const{onOk,onFail,onJob,onDone,metaFn,okText,failPre}=opts;
     const logger = opts.logger || defLog();
     if(!resp.ok){const t=await resp.text();logger.add(t,'error');logger.finish('error',t);if(onFail)onFail(t);return}
-    const reader=resp.body.getReader();const dec=new TextDecoder();
+    const reader=resp.body.getReader();const dec=new TextDecoder();let buf='';
     while(true){
         const{done,value}=await reader.read();if(done)break;
-        const chunk=dec.decode(value);
-        chunk.split('\n').forEach(line=>{
+        buf+=dec.decode(value,{stream:true});
+        const lines=buf.split('\n');buf=lines.pop();
+        lines.forEach(line=>{
             if(!line.startsWith('data: '))return;
             const msg=line.slice(6);
-            if(msg==='[KEEPALIVE]'||msg==='[DONE]')return;
+            if(msg==='[KEEPALIVE]')return;
+            if(msg==='[DONE]'){if(onDone)onDone();return}
+            if(msg.startsWith('[JOB]')){if(onJob)onJob(msg.slice(5).trim());return}
+            if(msg.startsWith('[PROGRESS]')){try{const p=JSON.parse(msg.slice(10));logger.setSummary(`进度：成功 ${p.done} / 失败 ${p.failed} / 剩余 ${p.pending} / 共 ${p.total}`)}catch(e){}return}
             if(msg.startsWith('[SUCCESS]')){logger.add(okText,'ok','OK');logger.finish('success',okText);if(onOk)onOk();return}
             if(msg.startsWith('[FAILED]')){const f=msg.replace('[FAILED]','').trim()||'存在失败节点';const t=failPre+f;logger.add(t,'error','FAIL');logger.finish('error',t);if(onFail)onFail(f);return}
             logger.add(msg,inferType(msg));
@@ -120,11 +134,13 @@ async function loadDashboard(){
             }));
             let enabled=0;
             const list=$('certList');list.innerHTML='';
+            const modified={};(domData.items||[]).forEach(i=>{modified[i.domain]=i.cert_modified});
             results.forEach(({domain,data})=>{
                 if(data&&data.success){
                     enabled++;
                     const cls=data.days_left<7?'danger':data.days_left<30?'warn':'ok';
-                    list.innerHTML+=`<div class="cert-item"><span class="cert-domain">${esc(domain)}</span><span class="cert-expiry ${cls}">${fmtDays(data.days_left)}</span></div>`;
+                    const title=modified[domain]?`证书更新于 ${new Date(modified[domain]).toLocaleString()}`:'';
+                    list.innerHTML+=`<div class="cert-item"><span class="cert-domain" title="${esc(title)}">${esc(domain)}</span><span class="cert-expiry ${cls}">${fmtDays(data.days_left)}</span></div>`;
                 }else{
                     list.innerHTML+=`<div class="cert-item"><span class="cert-domain">${esc(domain)}</span><span class="cert-expiry danger">读取失败</span></div>`;
                 }
@@ -135,10 +151,10 @@ async function loadDashboard(){
 }
 
 /* ===== 域名加载（通用，两阶段） ===== */
-async function fillDomainSelect(sel){
+async function fillDomainSelect(sel,refresh=false){
     sel.innerHTML='<option value="">加载中...</option>';
     try{
-        const r=await fetch('/api/domains');const d=await r.json();
+        const r=await fetch(refresh?'/api/domains?refresh=1':'/api/domains');const d=await r.json();
         if(!d.success)throw new Error(d.error);
         if(!d.domains.length){sel.innerHTML='<option value="">未找到可用证书</option>';return}
         /* 第一阶段：立即填充域名列表，让用户可以选择 */
@@ -160,8 +176,8 @@ async function fillDomainSelect(sel){
         });
     }catch(e){sel.innerHTML='<option value="">加载失败</option>'}
 }
-async function loadDomains(){await fillDomainSelect($('domain'))}
-async function loadServerDomains(){await fillDomainSelect($('serverDomain'))}
+async function loadDomains(refresh=false){await fillDomainSelect($('domain'),refresh===true)}
+async function loadServerDomains(refresh=false){await fillDomainSelect($('serverDomain'),refresh===true)}
 
 /* ===== 服务器管理 ===== */
 async function loadServers(){
@@ -238,6 +254,29 @@ window.removeServer=async function(id){
     showMsg($('serverMessage'),'已删除');if(S.page>1&&S.currentServers.length===1)S.page--;await loadServers();
     }catch(e){showMsg($('serverMessage'),e.message,'error')}
 }
+/* 并发限制 */
+async function loadLimits(){
+    const tbody=$('limitTableBody');
+    try{const r=await fetch('/api/concurrency-limits');const d=await r.json();if(!d.success)throw new Error(d.error);
+        if(!d.items.length){tbody.innerHTML='<tr><td colspan="5" class="empty-state">未配置，仅受全局并发限制</td></tr>';return}
+        tbody.innerHTML=d.items.map(l=>`<tr><td>${l.scope==='cidr'?'网段':'分组'}</td><td>${esc(l.match_value)}</td><td>${esc(l.max_sessions)}</td><td>${esc(l.remark||'-')}</td>
+            <td><button class="btn-danger btn-sm" onclick="removeLimit(${l.id})">删除</button></td></tr>`).join('');
+    }catch(e){tbody.innerHTML=`<tr><td colspan="5" class="empty-state">${esc(e.message)}</td></tr>`}
+}
+async function saveLimit(e){
+    e.preventDefault();clearMsg($('limitMessage'));
+    const payload={scope:$('limitScope').value,match_value:$('limitMatch').value.trim(),max_sessions:Number($('limitMax').value),remark:$('limitRemark').value.trim()};
+    try{const r=await fetch('/api/concurrency-limits',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify(payload)});
+    const d=await r.json();if(!d.success)throw new Error(d.error);
+    showMsg($('limitMessage'),'已保存');$('limitMatch').value='';$('limitRemark').value='';await loadLimits();
+    }catch(e){showMsg($('limitMessage'),e.message,'error')}
+}
+window.removeLimit=async function(id){
+    if(!confirm('确认删除该并发限制？'))return;
+    try{const r=await fetch(`/api/concurrency-limits/${id}`,{method:'DELETE'});const d=await r.json();
+    if(!d.success)throw new Error(d.error);showMsg($('limitMessage'),'已删除');await loadLimits();
+    }catch(e){showMsg($('limitMessage'),e.message,'error')}
+}
 window.syncSingle=async function(id){
     const s=S.currentServers.find(x=>x.id===id);if(!s)return;
     const logRow=$(`server-log-row-${id}`); logRow.style.display='table-row';
@@ -265,10 +304,13 @@ window.probeRemote=async function(id){
     try{const r=await fetch(`/api/servers/${id}/remote-cert-info?domain=${encodeURIComponent(domain)}`);const d=await r.json();
     if(!r.ok||!d.success){logger.add(d.error||'探测失败','error','FAIL');logger.finish('error',d.error||'');return}
     logger.add(`路径：${d.remote_cert}`,'info','PATH');logger.add(`到期：${d.expiry_date}`,'ok','CERT');
+    if(d.sans&&d.sans.length)logger.add(`域名：${d.sans.join(', ')}`,'info','CERT');
+    if(d.issuer)logger.add(`签发者：${d.issuer}`,'info','CERT');
+    if(d.fingerprint_sha256)logger.add(`SHA-256：${d.fingerprint_sha256}`,'info','CERT');
     logger.add(fmtDays(d.days_left),d.days_left<7?'warn':'ok','TIME');logger.finish('success',`${s.host} ${fmtDays(d.days_left)}`);
     }catch(e){logger.add(`错误：${e.message}`,'error');logger.finish('error','网络异常')}
 }
-/* 全部探测：遍历所有已启用服务器探测远端证书 */
+/* 全部探测：服务端并行探测所有已启用服务器，逐台流式返回结果 */
 async function probeAll(){
     const logPanelEl = $('probeAllLogPanel');
     logPanelEl.style.display = 'block';
@@ -276,32 +318,44 @@ async function probeAll(){
     
     const domain=getSelectedDomain();
     if(!domain){logger.start('全部探测','');logger.add('请先在上方选择证书域名','error');logger.finish('error','缺少域名');return}
+    const group=$('probeGroup').value.trim();
     const btn=$('probeAllBtn');btn.disabled=true;btn.textContent='探测中...';
-    logger.start('全部探测',`域名：${domain}`);
-    logger.add(`开始探测所有已启用服务器上的 ${domain} 证书`,'info','TASK');
-    /* 获取全量已启用服务器 */
-    let allServers=[];
+    logger.start('全部探测',`域名：${domain}${group?` · 分组：${group}`:''}`);
+    logger.add(`开始并行探测${group?`分组 ${group} 中`:'所有'}已启用服务器上的 ${domain} 证书`,'info','TASK');
+    let summary=null;
+    const handle=msg=>{
+        let d;try{d=JSON.parse(msg)}catch(e){return}
+        if(d.type==='result'){
+            const name=`${d.server} (${d.remark||d.group_name})`;
+            if(!d.success){logger.add(`  ✗ ${name} — ${d.error||'探测失败'}`,'error','FAIL');return}
+            logger.add(`  ✓ ${name} — ${fmtDays(d.days_left)} (${d.expiry_date})`,d.days_left<30?'warn':'ok','CERT');
+        }else if(d.type==='summary'){summary=d}
+        else if(d.type==='error'){logger.add(`探测异常：${d.error}`,'error')}
+    };
     try{
-        const r=await fetch('/api/servers?page=1&page_size=9999&search=');const d=await r.json();
-        if(!d.success)throw new Error(d.error);
-        allServers=d.items.filter(s=>s.enabled);
-    }catch(e){logger.add(`加载服务器列表失败：${e.message}`,'error');logger.finish('error','加载失败');btn.disabled=false;btn.textContent='全部探测';return}
-    if(!allServers.length){logger.add('没有已启用的服务器','warn');logger.finish('error','无可探测节点');btn.disabled=false;btn.textContent='全部探测';return}
-    logger.add(`共 ${allServers.length} 台已启用服务器`,'info');
-    let ok=0,fail=0;
-    for(const s of allServers){
-        logger.add(`探测 ${s.host}:${s.port} (${s.remark||s.group_name})`,'info','PING');
-        try{
-            const r=await fetch(`/api/servers/${s.id}/remote-cert-info?domain=${encodeURIComponent(domain)}`);
-            const d=await r.json();
-            if(!r.ok||!d.success){logger.add(`  ✗ ${s.host}:${s.port} — ${d.error||'探测失败'}`,'error','FAIL');fail++;continue}
-            const cls=d.days_left<7?'warn':d.days_left<30?'warn':'ok';
-            logger.add(`  ✓ ${s.host}:${s.port} — ${fmtDays(d.days_left)} (${d.expiry_date})`,cls,'CERT');
-            ok++;
-        }catch(e){logger.add(`  ✗ ${s.host}:${s.port} — 网络错误：${e.message}`,'error','FAIL');fail++}
-    }
-    logger.add(`探测完成：成功 ${ok} / 失败 ${fail} / 共 ${allServers.length}`,'info','DONE');
-    logger.finish(fail?'error':'success',`成功 ${ok} 台，失败 ${fail} 台`);
+        const p=new URLSearchParams({domain,group});
+        const r=await fetch(`/api/remote-cert-scan?${p}`);
+        if(!r.ok)throw new Error(await r.text());
+        const reader=r.body.getReader();const dec=new TextDecoder();let buf='';
+        while(true){
+            const{done,value}=await reader.read();if(done)break;
+            buf+=dec.decode(value,{stream:true});
+            const lines=buf.split('\n');buf=lines.pop();
+            lines.forEach(line=>{
+                if(!line.startsWith('data: '))return;
+                const msg=line.slice(6);
+                if(msg==='[KEEPALIVE]'||msg==='[DONE]')return;
+                handle(msg);
+            });
+        }
+    }catch(e){logger.add(`错误：${e.message}`,'error');logger.finish('error','探测失败');btn.disabled=false;btn.textContent='全部探测';return}
+    if(!summary){logger.finish('error','探测中断');btn.disabled=false;btn.textContent='全部探测';return}
+    if(!summary.total){logger.add('没有已启用的服务器','warn');logger.finish('error','无可探测节点');btn.disabled=false;btn.textContent='全部探测';return}
+    logger.add(`探测完成：成功 ${summary.success} / 失败 ${summary.failed} / 共 ${summary.total}，耗时 ${summary.duration}s`,'info','DONE');
+    if(summary.expired)logger.add(`已过期 ${summary.expired} 台`,'error','TIME');
+    if(summary.expiring)logger.add(`${summary.warn_days} 天内到期 ${summary.expiring} 台`,'warn','TIME');
+    if(summary.earliest_server)logger.add(`最早到期：${summary.earliest_server}，${fmtDays(summary.min_days_left)}`,'info','TIME');
+    logger.finish(summary.failed?'error':'success',`成功 ${summary.success} 台，失败 ${summary.failed} 台`);
     btn.disabled=false;btn.textContent='全部探测';
 }
 async function saveServer(e){
@@ -330,13 +384,38 @@ async function submitSync(e){
     const domain=$('domain').value;
     if(!domain){logger.start('同步','');logger.add('请选择域名','error');logger.finish('error','');return}
     const fd=new FormData();fd.append('domain',domain);fd.append('target_mode',S.mode);
+    const batch=$('batch_domains').value.split(/[\n,]/).map(v=>v.trim()).filter(v=>v&&v!==domain);
+    if(batch.length)fd.append('domains',batch.join('\n'));
     if(S.mode==='specific'){const v=$('specific_ips').value.trim();if(!v){logger.start('同步','');logger.add('请填写目标','error');logger.finish('error','');return}fd.append('specific_ips',v)}
     const btn=$('submitBtn');btn.disabled=true;btn.textContent='同步中...';
-    logger.start(S.mode==='all'?'全量同步':'临时目标同步','');logger.add(`同步 ${domain}`,'info','TASK');
+    logger.start({all:'全量同步',rollout:'分批发布'}[S.mode]||'临时目标同步','');logger.add(`同步 ${[domain,...batch].join(', ')}`,'info','TASK');
+    S.jobStreaming=true;
     try{const r=await fetch('/sync',{method:'POST',body:fd});
-    await consumeStream(r,{logger,onOk:null,onFail:null,okText:'同步完成',failPre:'失败：'});
+    await consumeStream(r,{logger,onOk:null,onFail:null,onJob:rememberSyncJob,onDone:forgetSyncJob,okText:'同步完成',failPre:'失败：'});
     }catch(e){logger.add(`错误：${e.message}`,'error');logger.finish('error','网络异常')}
-    finally{btn.disabled=false;btn.textContent='开始同步'}
+    finally{S.jobStreaming=false;btn.disabled=false;btn.textContent='开始同步'}
+}
+/* 同步任务在服务端持久化：页面刷新或断线后重新接入未完成的任务 */
+function rememberSyncJob(id){localStorage.setItem('sync-job-id',id)}
+function forgetSyncJob(){localStorage.removeItem('sync-job-id')}
+async function resumeSyncJob(){
+    const id=localStorage.getItem('sync-job-id');
+    if(!id||S.jobStreaming)return;
+    try{
+        const r=await fetch(`/api/jobs/${encodeURIComponent(id)}`);
+        if(!r.ok){forgetSyncJob();return}
+        const job=await r.json();
+        if(job.status!=='queued'&&job.status!=='running'){forgetSyncJob();return}
+        const logPanelEl=$('syncLogPanel');logPanelEl.style.display='block';
+        const logger=new LogConsole(logPanelEl);
+        logger.start(job.options?.mode==='rollout'?'分批发布（重新连接）':'同步（重新连接）','');
+        logger.add(`同步 ${job.domains.join(', ')}`,'info','TASK');
+        const btn=$('submitBtn');btn.disabled=true;btn.textContent='同步中...';
+        S.jobStreaming=true;
+        try{const s=await fetch(`/api/jobs/${encodeURIComponent(id)}/stream`);
+        await consumeStream(s,{logger,onOk:null,onFail:null,onDone:forgetSyncJob,okText:'同步完成',failPre:'失败：'});
+        }finally{S.jobStreaming=false;btn.disabled=false;btn.textContent='开始同步'}
+    }catch(e){console.error(e)}
 }
 
 /* ===== 账号安全 ===== */
@@ -439,6 +518,7 @@ document.addEventListener('DOMContentLoaded',function(){
     const ts=$('themeSelect');if(ts)ts.addEventListener('change',e=>{localStorage.setItem('theme-preference',e.target.value);applyTheme(e.target.value)});
     // 服务器表单
     $('serverForm').addEventListener('submit',saveServer);
+    $('limitForm').addEventListener('submit',saveLimit);
     $('resetServerBtn').addEventListener('click',()=>{resetForm();clearMsg($('serverMessage'))});
     // 搜索分页
     $('searchBtn').addEventListener('click',async()=>{S.search=$('searchInput').value.trim();S.page=1;await loadServers()});
@@ -448,9 +528,9 @@ document.addEventListener('DOMContentLoaded',function(){
     $('nextPageBtn').addEventListener('click',async()=>{if(S.pagination.pages&&S.page<S.pagination.pages){S.page++;await loadServers()}});
     // 同步
     $('syncForm').addEventListener('submit',submitSync);
-    $('refreshDomains').addEventListener('click',loadDomains);
+    $('refreshDomains').addEventListener('click',()=>loadDomains(true));
     $('probeAllBtn')?.addEventListener('click',probeAll);
-    $('refreshServerDomains')?.addEventListener('click',loadServerDomains);
+    $('refreshServerDomains')?.addEventListener('click',()=>loadServerDomains(true));
     document.querySelectorAll('input[name="target_mode"]').forEach(r=>r.addEventListener('change',e=>updateMode(e.target.value)));
     // 账号
     $('passwordForm').addEventListener('submit',updatePassword);
@@ -0,0 +1,152 @@
+import io
+import shlex
+import tarfile
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    from . import deploy_report
+except ImportError:
+    import deploy_report
+
+STATUS_PREFIX = "CERTSYNC_STATUS"
+
+
+def build_deploy_archive(files: Iterable[Tuple[str, bytes, int]]) -> bytes:
+    """Packs (name, content, mode) entries into an uncompressed tar payload."""
+    buffer = io.BytesIO()
+    now = int(time.time())
+    with tarfile.open(fileobj=buffer, mode="w", format=tarfile.USTAR_FORMAT) as archive:
+        for name, content, mode in files:
+            info = tarfile.TarInfo(name=name)
+            info.size = len(content)
+            info.mode = mode
+            info.mtime = now
+            info.uid = info.gid = 0
+            info.uname = info.gname = "root"
+            archive.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+def _hash_script(names: Iterable[str]) -> str:
+    quoted = " ".join(shlex.quote(name) for name in names)
+    return (
+        f'cd "$d" 2>/dev/null && if command -v sha256sum >/dev/null 2>&1; '
+        f'then sha256sum {quoted} 2>/dev/null; else shasum -a 256 {quoted} 2>/dev/null; fi'
+    )
+
+
+def build_hash_command(remote_dir: str, names: Iterable[str]) -> str:
+    """Builds a remote command printing "<sha256>  <name>" for each file that exists."""
+    script = "\n".join([f"d={shlex.quote(remote_dir)}", _hash_script(names)])
+    return f"sh -c {shlex.quote(script)}"
+
+
+def parse_hash_output(output: str) -> Dict[str, str]:
+    hashes = {}
+    for line in output.splitlines():
+        parts = line.strip().split(None, 1)
+        if len(parts) == 2:
+            hashes[parts[1].lstrip("*")] = parts[0].lower()
+    return hashes
+
+
+def build_deploy_command(
+    remote_base: str,
+    remote_dirs: Iterable[str],
+    post_sync_cmd: str = "",
+    expected_hashes: Optional[Dict[str, str]] = None,
+) -> str:
+    """
+    Builds one remote command that creates the directories, extracts the tar
+    read from stdin under remote_base, runs the post-sync command and prints
+    one status line. Archive members and remote_dirs are relative to
+    remote_base. Post-sync output is redirected to stderr so stdout only
+    carries status. With expected_hashes (relative path -> sha256) the remote
+    side first compares digests and reports stage=unchanged without
+    extracting or reloading when every file already matches.
+    """
+    lines = [f"d={shlex.quote(remote_base)}"]
+    if expected_hashes:
+        names = list(expected_hashes)
+        expected = "".join(f"{expected_hashes[name]} " for name in names)
+        lines += [
+            f"current=$({_hash_script(names)} | awk '{{print $1}}' | tr '\\n' ' ')",
+            f'if [ "$current" = {shlex.quote(expected)} ]; then',
+            "cat >/dev/null",
+            f'echo "{STATUS_PREFIX} stage=unchanged rc=0 post_rc=none"; exit 0',
+            "fi",
+        ]
+    quoted_dirs = " ".join(f'"$d"/{shlex.quote(name)}' for name in remote_dirs)
+    lines += [
+        f'mkdir -p {quoted_dirs}; rc=$?',
+        f'if [ $rc -ne 0 ]; then echo "{STATUS_PREFIX} stage=mkdir rc=$rc"; exit 1; fi',
+        'tar -xf - -C "$d"; rc=$?',
+        f'if [ $rc -ne 0 ]; then echo "{STATUS_PREFIX} stage=extract rc=$rc"; exit 1; fi',
+    ]
+    if post_sync_cmd:
+        lines.append(f"{{ {post_sync_cmd}\n}} 1>&2; post_rc=$?")
+    else:
+        lines.append("post_rc=none")
+    lines.append(f'echo "{STATUS_PREFIX} stage=done rc=0 post_rc=$post_rc"')
+    script = "\n".join(lines)
+    return f"sh -c {shlex.quote(script)}"
+
+
+def build_deploys_archive(deploys) -> bytes:
+    """Packs each deploy's in-memory cert and key into one archive laid out as <dir_name>/<file>."""
+    files = []
+    for deploy in deploys:
+        payload = deploy["payload"]
+        files.append((f"{deploy['dir_name']}/fullchain.cer", payload.cert_bytes, 0o644))
+        files.append((f"{deploy['dir_name']}/{deploy['domain']}.key", payload.key_bytes, 0o600))
+    return build_deploy_archive(files)
+
+
+def build_deploys_command(deploys, remote_base: str, post_sync_cmd: str = "") -> str:
+    """Builds the deploy command for a batch; hashes are only compared when every deploy has them."""
+    expected_hashes = None
+    if all(deploy.get("hashes") for deploy in deploys):
+        expected_hashes = {
+            f"{deploy['dir_name']}/{name}": digest
+            for deploy in deploys
+            for name, digest in deploy["hashes"].items()
+        }
+    return build_deploy_command(
+        remote_base,
+        [deploy["dir_name"] for deploy in deploys],
+        post_sync_cmd,
+        expected_hashes,
+    )
+
+
+def parse_deploy_status(output: str) -> Optional[Dict[str, str]]:
+    """Returns the key=value fields of the last status line, or None if there is none."""
+    status = None
+    for line in output.splitlines():
+        line = line.strip()
+        if line.startswith(STATUS_PREFIX):
+            status = dict(
+                token.split("=", 1) for token in line[len(STATUS_PREFIX):].split() if "=" in token
+            )
+    return status
+
+
+def interpret_status(output: str, err: str, exit_status: int, server: str) -> Tuple[str, List[Tuple[str, str]]]:
+    """
+    Maps the stdout of a deploy command to synced / skipped / failed, plus
+    the (message, level) lines to log about it. err is the command's
+    stderr, which carries the post-sync command's output.
+    """
+    status = parse_deploy_status(output)
+    if not status:
+        return "failed", [(f"Stream deploy to {server} returned no status (exit {exit_status}): {err}", "ERROR")]
+    if status.get("stage") == "unchanged":
+        return "skipped", []
+    if status.get("stage") != "done":
+        return "failed", [(f"Stream deploy failed on {server} at {status.get('stage')} (rc={status.get('rc')}): {err}", "ERROR")]
+
+    post_rc = status.get("post_rc", "none")
+    if post_rc == "none":
+        return "synced", []
+    return "synced", [deploy_report.post_sync_line(server, 0 if post_rc == "0" else 1, err)]
@@ -0,0 +1,57 @@
+import os
+import sys
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    """
+    Config pointing at a database in the test's temporary directory. Set on
+    the class, so the Config() that SyncManager and friends build see it too.
+    """
+    from config import Config
+
+    monkeypatch.setattr(Config, "SERVER_DB_PATH", str(tmp_path / "servers.db"))
+    monkeypatch.setattr(Config, "SERVER_LIST_PATH", "")
+    monkeypatch.setattr(Config, "DRY_RUN", False)
+    return Config()
+
+
+@pytest.fixture
+def make_cert():
+    """Builds a self-signed EC certificate; returns (cert_pem, key_pem)."""
+    import datetime
+    import ipaddress
+
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    def make(common_name="example.com", sans=("example.com",), days=90, ips=(), serial=0x1234):
+        key = ec.generate_private_key(ec.SECP256R1())
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        alt_names = [x509.DNSName(san) for san in sans] + [x509.IPAddress(ipaddress.ip_address(ip)) for ip in ips]
+        builder = (
+            x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(serial)
+            .not_valid_before(now - datetime.timedelta(days=1))
+            .not_valid_after(now + datetime.timedelta(days=days, hours=1))
+        )
+        if alt_names:
+            builder = builder.add_extension(x509.SubjectAlternativeName(alt_names), critical=False)
+        cert = builder.sign(key, hashes.SHA256())
+        key_pem = key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        )
+        return cert.public_bytes(serialization.Encoding.PEM), key_pem
+
+    return make
@@ -0,0 +1,47 @@
+import datetime
+
+import pytest
+
+from cert_utils import format_openssl_date, load_certificate_payload, parse_certificate_metadata
+
+
+def test_parse_certificate_metadata(make_cert):
+    cert_pem, _ = make_cert("example.com", sans=("example.com", "www.example.com"), ips=("10.0.0.1",), days=30)
+    metadata = parse_certificate_metadata(cert_pem)
+    assert metadata["days_left"] == 30
+    assert metadata["subject"] == "CN=example.com"
+    assert metadata["issuer"] == "CN=example.com"
+    assert metadata["sans"] == ["example.com", "www.example.com", "10.0.0.1"]
+    assert metadata["serial_number"] == "1234"
+    assert len(metadata["fingerprint_sha256"]) == 64
+    not_after = datetime.datetime.fromisoformat(metadata["not_after"])
+    assert metadata["expiry_date"] == format_openssl_date(not_after)
+
+
+def test_leaf_of_a_chain_is_parsed(make_cert):
+    leaf, _ = make_cert("leaf.example.com", sans=())
+    issuer, _ = make_cert("Issuer CA", sans=())
+    metadata = parse_certificate_metadata(leaf + issuer)
+    assert metadata["subject"] == "CN=leaf.example.com"
+    assert metadata["sans"] == []
+
+
+def test_not_a_certificate():
+    with pytest.raises(ValueError):
+        parse_certificate_metadata(b"-----BEGIN CERTIFICATE-----\nnope\n-----END CERTIFICATE-----\n")
+
+
+def test_openssl_date_format():
+    value = datetime.datetime(2024, 3, 2, 12, 34, 56, tzinfo=datetime.timezone.utc)
+    assert format_openssl_date(value) == "Mar  2 12:34:56 2024 GMT"
+
+def test_payload_rejects_mismatched_key(make_cert, tmp_path):
+    cert_pem, key_pem = make_cert()
+    _, other_key = make_cert()
+    (tmp_path / "fullchain.cer").write_bytes(cert_pem)
+    (tmp_path / "good.key").write_bytes(key_pem)
+    (tmp_path / "other.key").write_bytes(other_key)
+    payload = load_certificate_payload("example.com", str(tmp_path / "fullchain.cer"), str(tmp_path / "good.key"))
+    assert payload.size == len(cert_pem) + len(key_pem)
+    with pytest.raises(ValueError, match="does not match"):
+        load_certificate_payload("example.com", str(tmp_path / "fullchain.cer"), str(tmp_path / "other.key"))
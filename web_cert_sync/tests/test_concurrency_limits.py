@@ -0,0 +1,66 @@
+import pytest
+
+from concurrency_limits import ConcurrencyLimiter, LimitedQueue
+
+LIMITS = [
+    {"scope": "group", "match_value": "web", "max_sessions": 1},
+    {"scope": "cidr", "match_value": "10.0.0.0/24", "max_sessions": 2},
+    {"scope": "cidr", "match_value": "2001:db8::/32", "max_sessions": 1},
+]
+GROUPS = {"10.0.0.1:22": "web", "web1.example.com:2222": "web", "10.0.1.5:22": "db"}
+
+
+@pytest.fixture
+def limiter():
+    return ConcurrencyLimiter(LIMITS, GROUPS)
+
+
+@pytest.mark.parametrize("server", ["10.0.0.1", "10.0.0.1:22", " 10.0.0.1 ", "10.0.0.1: 22", "[10.0.0.1]:22"])
+def test_keys_for_matches_any_spelling(limiter, server):
+    assert limiter.keys_for(server) == (("cidr", "10.0.0.0/24"), ("group", "web"))
+
+
+def test_keys_for_hostname_group_only(limiter):
+    assert limiter.keys_for("web1.example.com:2222") == (("group", "web"),)
+    # Another port is another server record
+    assert limiter.keys_for("web1.example.com") == ()
+
+
+def test_keys_for_ipv6_cidr(limiter):
+    assert limiter.keys_for("[2001:db8::5]:22") == (("cidr", "2001:db8::/32"),)
+    assert limiter.keys_for("2001:db8::5") == (("cidr", "2001:db8::/32"),)
+
+
+def test_keys_for_group_without_cap(limiter):
+    assert limiter.keys_for("10.0.1.5") == ()
+
+
+def test_default_port_applies_to_bare_hosts():
+    limiter = ConcurrencyLimiter(LIMITS, {"10.0.0.1:2222": "web"}, default_port=2222)
+    assert ("group", "web") in limiter.keys_for("10.0.0.1")
+
+
+def test_limited_queue_skips_saturated_bucket(limiter):
+    ready = LimitedQueue(limiter)
+    for server in ("10.0.0.1", "web1.example.com:2222", "10.0.0.9", "192.168.0.1"):
+        ready.push(server, server)
+
+    keys, first = ready.pop()
+    assert first == "10.0.0.1"
+    # The web group is full, so the next web host waits while others run
+    popped = [ready.pop()[1], ready.pop()[1]]
+    assert popped == ["10.0.0.9", "192.168.0.1"]
+    assert ready.pop() is None
+    assert len(ready) == 1
+
+    limiter.release(keys)
+    assert ready.pop()[1] == "web1.example.com:2222"
+
+
+def test_drain_returns_items_without_taking_slots(limiter):
+    ready = LimitedQueue(limiter)
+    ready.push("10.0.0.1", "a")
+    ready.push("192.168.0.1", "b")
+    assert sorted(ready.drain()) == ["a", "b"]
+    assert len(ready) == 0
+    assert all(count == 0 for count in limiter.in_use.values())
@@ -0,0 +1,111 @@
+import os
+
+import pytest
+
+import domain_index
+from domain_index import DomainIndex
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(domain_index.time, "monotonic", clock)
+    return clock
+
+
+def add_domain(root, domain, key=True):
+    path = root / f"{domain}_ecc"
+    path.mkdir()
+    (path / "fullchain.cer").write_text("cert")
+    if key:
+        (path / f"{domain}.key").write_text("key")
+    return path
+
+
+def bump_mtime(path):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+@pytest.fixture
+def index(tmp_path, clock, monkeypatch):
+    add_domain(tmp_path, "a.com")
+    add_domain(tmp_path, "b.com", key=False)
+    (tmp_path / "notes.txt").write_text("")
+    (tmp_path / "_ecc").mkdir()
+    index = DomainIndex(str(tmp_path), refresh_interval=10, full_rescan_interval=300)
+    scanned = []
+    scan = index._scan_domain_dir
+    monkeypatch.setattr(index, "_scan_domain_dir", lambda domain, *args: scanned.append(domain) or scan(domain, *args))
+    index.scanned = scanned
+    return index
+
+
+def test_lists_complete_domains(index):
+    assert index.domains() == ["a.com"]
+    assert [(e["domain"], e["has_cert"], e["has_key"]) for e in index.entries()] == [
+        ("a.com", True, True), ("b.com", True, False),
+    ]
+    assert sorted(index.scanned) == ["a.com", "b.com"]
+
+
+def test_refresh_is_throttled(index, tmp_path, clock):
+    index.domains()
+    add_domain(tmp_path, "c.com")
+    bump_mtime(tmp_path)
+    assert index.domains() == ["a.com"]
+    clock.now += 11
+    assert index.domains() == ["a.com", "c.com"]
+
+
+def test_only_changed_directories_are_rescanned(index, tmp_path, clock):
+    index.domains()
+    index.scanned.clear()
+    (tmp_path / "b.com_ecc" / "b.com.key").write_text("key")
+    bump_mtime(tmp_path / "b.com_ecc")
+    clock.now += 11
+    assert index.domains() == ["a.com", "b.com"]
+    assert index.scanned == ["b.com"]
+
+    index.scanned.clear()
+    clock.now += 11
+    index.domains()
+    assert index.scanned == []
+
+
+def test_removed_domain_disappears(index, tmp_path, clock):
+    index.domains()
+    for name in os.listdir(tmp_path / "a.com_ecc"):
+        os.remove(tmp_path / "a.com_ecc" / name)
+    os.rmdir(tmp_path / "a.com_ecc")
+    bump_mtime(tmp_path)
+    clock.now += 11
+    assert index.get("a.com") is None
+
+
+def test_full_rescan_rereads_every_domain(index, clock):
+    index.domains()
+    index.scanned.clear()
+    clock.now += 301
+    index.domains()
+    assert sorted(index.scanned) == ["a.com", "b.com"]
+
+
+def test_invalidate_forces_rescan(index):
+    index.domains()
+    index.scanned.clear()
+    index.invalidate()
+    index.domains()
+    assert sorted(index.scanned) == ["a.com", "b.com"]
+
+
+def test_missing_root(tmp_path, clock):
+    assert DomainIndex(str(tmp_path / "missing")).domains() == []
@@ -0,0 +1,130 @@
+import pytest
+
+import host_health
+from host_health import CLOSED, HALF_OPEN, OPEN, HostHealthTracker
+
+HOST = "10.0.0.1:22"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(host_health.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def tracker(clock):
+    return HostHealthTracker(failure_threshold=3, cooldown=60, min_timeout=2, max_timeout=10, probe_timeout=40)
+
+
+def open_circuit(tracker):
+    opened = [tracker.record_failure(HOST, "refused") for _ in range(3)]
+    assert opened == [False, False, True]
+
+
+def test_circuit_opens_after_threshold(tracker):
+    open_circuit(tracker)
+    allowed, reason = tracker.allow(HOST)
+    assert not allowed
+    assert "circuit open after 3 consecutive failures" in reason
+    assert tracker.snapshot()[HOST]["state"] == OPEN
+
+
+def test_single_probe_after_cooldown(tracker, clock):
+    open_circuit(tracker)
+    clock.now += 61
+    assert tracker.allow(HOST) == (True, "")
+    assert tracker.snapshot()[HOST]["state"] == HALF_OPEN
+    allowed, reason = tracker.allow(HOST)
+    assert not allowed and "probe already in progress" in reason
+
+
+def test_probe_success_closes(tracker, clock):
+    open_circuit(tracker)
+    clock.now += 61
+    tracker.allow(HOST)
+    tracker.record_success(HOST, 0.05)
+    assert tracker.snapshot()[HOST]["state"] == CLOSED
+    assert tracker.allow(HOST) == (True, "")
+
+
+def test_probe_failure_reopens(tracker, clock):
+    open_circuit(tracker)
+    clock.now += 61
+    tracker.allow(HOST)
+    assert tracker.record_failure(HOST, "timeout")
+    allowed, _ = tracker.allow(HOST)
+    assert not allowed
+
+
+def test_abandoned_probe_is_replaced(tracker, clock):
+    open_circuit(tracker)
+    clock.now += 61
+    assert tracker.allow(HOST)[0]
+    # The probe never reports back (e.g. its worker process died)
+    clock.now += 39
+    assert not tracker.allow(HOST)[0]
+    clock.now += 2
+    assert tracker.allow(HOST) == (True, "")
+    assert not tracker.allow(HOST)[0]
+
+
+def test_connect_timeout_tracks_latency(tracker):
+    assert tracker.connect_timeout(HOST) == 10
+    for _ in range(20):
+        tracker.record_success(HOST, 0.1)
+    assert tracker.connect_timeout(HOST) == 2
+    tracker.record_failure(HOST)
+    tracker.record_failure(HOST)
+    assert 2 <= tracker.connect_timeout(HOST) <= 10
+
+
+def test_reset(tracker):
+    open_circuit(tracker)
+    tracker.reset(HOST)
+    assert tracker.allow(HOST) == (True, "")
+
+
+def test_transitions_mirror_into_another_tracker(tracker, clock):
+    mirror = HostHealthTracker(failure_threshold=3, cooldown=60, min_timeout=2, max_timeout=10)
+    tracker.on_change = mirror.restore
+    tracker.record_success(HOST, 0.2)
+    open_circuit(tracker)
+    assert mirror.snapshot()[HOST] == tracker.snapshot()[HOST]
+    assert mirror.snapshot()[HOST]["state"] == OPEN
+    clock.now += 61
+    tracker.allow(HOST)
+    assert mirror.snapshot()[HOST]["state"] == HALF_OPEN
+    tracker.record_success(HOST)
+    assert mirror.snapshot()[HOST]["state"] == CLOSED
+    assert tracker.export("unknown:22") is None
+
+
+def test_inspect_skips_host_with_open_circuit(config, monkeypatch):
+    from config import Config
+    from ssh_utils import SyncManager
+
+    monkeypatch.setattr(Config, "HOST_CIRCUIT_ENABLED", True)
+    monkeypatch.setattr(Config, "HOST_CIRCUIT_FAILURE_THRESHOLD", 3)
+    monkeypatch.setattr(host_health, "_tracker", None)
+    manager = SyncManager()
+    for _ in range(3):
+        manager.host_health.record_failure(HOST, "refused")
+
+    def connection(*args, **kwargs):
+        raise AssertionError("a host with an open circuit must not be contacted")
+
+    monkeypatch.setattr(manager.connection_pool, "connection", connection)
+    result = manager.inspect_remote_certificate("10.0.0.1", "example.com")
+    assert result["success"] is False
+    assert result["status"] == "circuit_open"
+    assert "circuit open after 3 consecutive failures" in result["error"]
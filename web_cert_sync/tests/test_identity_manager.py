@@ -0,0 +1,107 @@
+import paramiko
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+
+from identity_manager import IdentityManager, resolve_key_files
+
+
+def write_key(path, private_key, passphrase=None):
+    encryption = (serialization.BestAvailableEncryption(passphrase.encode()) if passphrase
+                  else serialization.NoEncryption())
+    path.write_bytes(private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.OpenSSH, encryption
+    ))
+    return str(path)
+
+
+class FakeTransport:
+    """Accepts one public key; records the order keys were offered in."""
+
+    def __init__(self, accepted_key=None, auth_types_ok=True):
+        self.accepted = accepted_key.asbytes() if accepted_key is not None else None
+        self.auth_types_ok = auth_types_ok
+        self.offered = []
+        self.authenticated = False
+
+    def auth_publickey(self, username, key):
+        self.offered.append(key.asbytes())
+        if not self.auth_types_ok:
+            raise paramiko.BadAuthenticationType("Bad authentication type", ["password"])
+        if key.asbytes() != self.accepted:
+            raise paramiko.AuthenticationException("denied")
+        self.authenticated = True
+        return []
+
+    def is_authenticated(self):
+        return self.authenticated
+
+
+@pytest.fixture
+def key_files(tmp_path):
+    return [
+        write_key(tmp_path / "id_ed25519", ed25519.Ed25519PrivateKey.generate()),
+        write_key(tmp_path / "id_ecdsa", ec.generate_private_key(ec.SECP256R1()), passphrase="s3cret"),
+    ]
+
+
+@pytest.fixture
+def manager(key_files, tmp_path):
+    (tmp_path / "broken").write_text("not a key")
+    files = key_files + [str(tmp_path / "missing"), str(tmp_path / "broken")]
+    return IdentityManager(files, passphrase="s3cret", use_agent=False)
+
+
+def test_loads_readable_keys_once(manager, key_files):
+    assert manager.has_identities()
+    assert manager.names() == key_files
+    assert not IdentityManager([], use_agent=False).has_identities()
+
+
+def test_encrypted_key_needs_the_passphrase(key_files):
+    assert IdentityManager(key_files, use_agent=False).names() == key_files[:1]
+    assert IdentityManager(key_files, passphrase="wrong", use_agent=False).names() == key_files[:1]
+
+
+def test_last_good_key_is_offered_first(manager, key_files):
+    keys = dict(manager._keys)
+    transport = FakeTransport(keys[key_files[1]])
+    assert manager.authenticate(transport, "root", "root@a:22") == key_files[1]
+    assert transport.offered == [keys[key_files[0]].asbytes(), keys[key_files[1]].asbytes()]
+    assert manager.last_good("root@a:22") == key_files[1]
+
+    transport = FakeTransport(keys[key_files[1]])
+    manager.authenticate(transport, "root", "root@a:22")
+    assert transport.offered == [keys[key_files[1]].asbytes()]
+    # Other hosts keep the configured order
+    assert manager._ordered(manager.names(), "root@b:22") == key_files
+
+
+def test_rejected_everywhere_forgets_the_host(manager):
+    manager.record_success("root@a:22", manager.names()[0])
+    with pytest.raises(paramiko.AuthenticationException):
+        manager.authenticate(FakeTransport(), "root", "root@a:22")
+    assert manager.last_good("root@a:22") is None
+
+
+def test_server_without_publickey_auth_stops_early(manager):
+    transport = FakeTransport(auth_types_ok=False)
+    with pytest.raises(paramiko.BadAuthenticationType):
+        manager.authenticate(transport, "root", "root@a:22")
+    assert len(transport.offered) == 1
+
+
+def test_asyncssh_identities_follow_the_same_order(manager, key_files):
+    pytest.importorskip("asyncssh")
+    assert [name for name, _ in manager.ordered_asyncssh_identities("root@a:22")] == key_files
+    manager.record_success("root@a:22", key_files[1])
+    assert [name for name, _ in manager.ordered_asyncssh_identities("root@a:22")] == key_files[::-1]
+    assert manager.stats() == {"identities": key_files, "use_agent": False, "hosts_remembered": 1}
+
+
+def test_resolve_key_files(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    assert resolve_key_files(" ~/a , /etc/b ,") == [str(tmp_path / "a"), "/etc/b"]
+    (tmp_path / ".ssh").mkdir()
+    (tmp_path / ".ssh" / "id_rsa").write_text("")
+    assert resolve_key_files("") == [str(tmp_path / ".ssh" / "id_rsa")]
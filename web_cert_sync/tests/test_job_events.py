@@ -0,0 +1,48 @@
+import threading
+
+from job_events import JobEventLog
+
+
+def test_ring_serves_lines_after_id():
+    log = JobEventLog(capacity=10)
+    log.open("job", floor=3)
+    log.publish("job", [(4, "a"), (5, "b"), (6, "c")])
+    assert log.read("job", 4, timeout=0) == [(5, "b"), (6, "c")]
+    assert log.read("job", 6, timeout=0) == []
+    # Lines up to the floor are only in the database
+    assert log.read("job", 2, timeout=0) is None
+    assert log.read("other", 0, timeout=0) is None
+
+
+def test_evicted_lines_fall_back_to_database():
+    log = JobEventLog(capacity=2)
+    log.open("job")
+    log.publish("job", [(1, "a"), (2, "b"), (3, "c")])
+    assert log.read("job", 0, timeout=0) is None
+    assert log.read("job", 1, timeout=0) == [(2, "b"), (3, "c")]
+
+
+def test_reader_wakes_on_publish_and_close():
+    log = JobEventLog(capacity=10)
+    log.open("job")
+    received = []
+    reader = threading.Thread(target=lambda: received.append(log.read("job", 0, timeout=5)))
+    reader.start()
+    log.publish("job", [(1, "a")])
+    reader.join(5)
+    assert received == [[(1, "a")]]
+
+    reader = threading.Thread(target=lambda: received.append(log.read("job", 1, timeout=5)))
+    reader.start()
+    log.close("job")
+    reader.join(5)
+    # [] if the reader was waiting when the job closed, None if it started after; both mean "read the database"
+    assert received[-1] in ([], None)
+    assert log.read("job", 1, timeout=0) is None
+
+
+def test_disabled_ring_buffers_nothing():
+    log = JobEventLog(capacity=0)
+    log.open("job")
+    log.publish("job", [(1, "a")])
+    assert log.read("job", 0, timeout=0) is None
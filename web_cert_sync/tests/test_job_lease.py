@@ -0,0 +1,82 @@
+import threading
+
+import pytest
+
+from job_repository import JOB_RUNNING, JobRepository
+
+
+@pytest.fixture
+def repository(config):
+    return JobRepository(config)
+
+
+def test_claim_takes_queued_job_once(repository):
+    job_id = repository.create_job(["example.com"], [("all", ["10.0.0.1:22"])])
+    job = repository.claim_next_job("worker-a", lease_seconds=30)
+    assert job["id"] == job_id
+    assert job["status"] == JOB_RUNNING
+    assert job["attempts"] == 1
+    assert repository.claim_next_job("worker-b", lease_seconds=30) is None
+
+
+def test_stale_lease_is_taken_over(repository):
+    job_id = repository.create_job(["example.com"], [("all", ["10.0.0.1:22"])])
+    repository.claim_next_job("worker-a", lease_seconds=30)
+    assert repository.heartbeat(job_id, "worker-a")
+
+    job = repository.claim_next_job("worker-b", lease_seconds=-1)
+    assert job["id"] == job_id
+    assert job["attempts"] == 2
+    assert not repository.heartbeat(job_id, "worker-a")
+    assert repository.heartbeat(job_id, "worker-b")
+
+    # The old owner's result is ignored
+    repository.finish_job(job_id, "worker-a", True, "")
+    assert repository.get_job_status(job_id) == JOB_RUNNING
+    repository.finish_job(job_id, "worker-b", False, "10.0.0.1:22")
+    assert repository.get_job_status(job_id) == "failed"
+
+
+def test_cancelled_run_starts_no_host(config, monkeypatch):
+    from config import Config
+    from ssh_utils import SyncManager
+
+    monkeypatch.setattr(Config, "DRY_RUN", True)
+    cancel = threading.Event()
+    cancel.set()
+    outcomes = {}
+    success, failed = SyncManager().run_batch_sync(
+        ["example.com"], ["10.0.0.1", "10.0.0.2:2222"],
+        on_result=lambda server, status, error_class: outcomes.__setitem__(server, status),
+        cancel=cancel,
+    )
+    assert not success
+    assert sorted(failed) == ["10.0.0.1", "10.0.0.2:2222"]
+    assert outcomes == {"10.0.0.1": "not_attempted", "10.0.0.2:2222": "not_attempted"}
+
+
+def test_lost_lease_stops_the_job(config, monkeypatch):
+    from config import Config
+    from job_worker import JobWorker
+
+    monkeypatch.setattr(Config, "DRY_RUN", True)
+    monkeypatch.setattr(Config, "MAX_JOBS", 1)
+    monkeypatch.setattr(Config, "JOB_HEARTBEAT_INTERVAL", 0)
+    monkeypatch.setattr(Config, "RELOAD_DEBOUNCE_SECONDS", 0)
+    targets = [f"10.0.0.{index}:22" for index in range(1, 7)]
+    worker = JobWorker(Config())
+    job_id = worker.repository.create_job(["example.com"], [("all", targets)])
+    job = worker.repository.claim_next_job(worker.owner, lease_seconds=30)
+    # Another worker takes the job over as soon as this one heartbeats
+    worker.repository.claim_next_job("worker-b", lease_seconds=-1)
+
+    worker._run_job(job)
+
+    tasks = {task["server"]: task["status"] for task in worker.repository.list_tasks(job_id)}
+    # Dry-run hosts take 0.5s each; the lease is found lost at the first heartbeat (0.5s)
+    assert list(tasks.values()).count("pending") >= len(targets) - 2
+    assert "not_attempted" not in tasks.values()
+    assert worker.repository.get_job_status(job_id) == JOB_RUNNING
+    messages = [row["message"] for row in worker.repository.list_logs(job_id)]
+    assert any("Lost the lease" in message for message in messages)
+    assert not any(message.startswith(("[SUCCESS]", "[FAILED]")) for message in messages)
@@ -0,0 +1,31 @@
+from job_repository import JobRepository, percentile
+
+
+def test_nearest_rank_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([7.0], 99) == 7.0
+    assert percentile([], 50) is None
+
+
+def test_latency_stats_by_server_and_group(config):
+    repository = JobRepository(config)
+    job_id = repository.create_job(["example.com"], [("web", ["a:22", "b:22"])])
+    for duration in (0.1, 0.2, 0.3, 0.4):
+        repository.record_attempt(job_id, "a:22", 1, {"status": "synced", "duration": duration, "started_at": 100}, "web")
+    repository.record_attempt(job_id, "b:22", 1, {"status": "failed", "duration": 5.0, "started_at": 100, "bytes_sent": 10}, "web")
+    # Skipped by an open circuit, or started before the window: not counted
+    repository.record_attempt(job_id, "b:22", 2, {"status": "circuit_open", "duration": 0.0, "started_at": 100}, "web")
+    repository.record_attempt(job_id, "a:22", 2, {"status": "synced", "duration": 9.0, "started_at": 10}, "web")
+
+    by_server = repository.latency_stats(since=50)
+    assert [entry["server"] for entry in by_server] == ["b:22", "a:22"]
+    assert by_server[0] == {"server": "b:22", "attempts": 1, "failed": 1, "bytes_sent": 10,
+                            "max": 5.0, "p50": 5.0, "p95": 5.0, "p99": 5.0}
+    assert (by_server[1]["p50"], by_server[1]["p95"], by_server[1]["max"]) == (0.2, 0.4, 0.4)
+
+    by_group = repository.latency_stats(since=50, group_by="group")
+    assert by_group == [{"group": "web", "attempts": 5, "failed": 1, "bytes_sent": 10,
+                         "max": 5.0, "p50": 0.3, "p95": 5.0, "p99": 5.0}]
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from cert_utils import CertificateMetadataCache
+
+
+@pytest.fixture
+def cert_path(tmp_path, make_cert):
+    path = tmp_path / "fullchain.cer"
+    path.write_bytes(make_cert("example.com", days=30)[0])
+    return path
+
+
+def test_unchanged_file_is_served_from_cache(cert_path):
+    cache = CertificateMetadataCache()
+    first = cache.get(str(cert_path))
+    second = cache.get(str(cert_path))
+    assert first == second
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1}
+    # Callers get their own copy
+    second["sans"].append("changed")
+    assert cache.get(str(cert_path))["sans"] == ["example.com"]
+
+
+def test_rewritten_file_is_parsed_again(cert_path, make_cert):
+    cache = CertificateMetadataCache()
+    assert cache.get(str(cert_path))["days_left"] == 30
+    stat = os.stat(cert_path)
+    # acme.sh rewrites the file on renewal
+    renewed = make_cert("example.com", days=90)[0]
+    cert_path.write_bytes(renewed)
+    os.utime(cert_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert cache.get(str(cert_path))["days_left"] == 90
+    assert cache.stats()["misses"] == 2
+
+
+def test_size_change_alone_invalidates(cert_path, make_cert):
+    cache = CertificateMetadataCache()
+    cache.get(str(cert_path))
+    stat = os.stat(cert_path)
+    cert_path.write_bytes(make_cert("other.example.com", sans=("other.example.com", "www.other.example.com"))[0])
+    os.utime(cert_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert cache.get(str(cert_path))["subject"] == "CN=other.example.com"
+
+
+def test_lru_eviction_and_invalidate(tmp_path, make_cert):
+    cache = CertificateMetadataCache(max_entries=2)
+    paths = []
+    for name in ("a", "b", "c"):
+        path = tmp_path / f"{name}.cer"
+        path.write_bytes(make_cert(f"{name}.example.com")[0])
+        paths.append(str(path))
+        cache.get(paths[-1])
+    assert cache.stats()["entries"] == 2
+    cache.get(paths[0])
+    assert cache.stats()["misses"] == 4
+    cache.invalidate(paths[0])
+    cache.invalidate()
+    assert cache.stats()["entries"] == 0
+
+
+def test_missing_file_raises(tmp_path):
+    with pytest.raises(OSError):
+        CertificateMetadataCache().get(str(tmp_path / "missing.cer"))
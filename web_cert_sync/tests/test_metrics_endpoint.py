@@ -0,0 +1,30 @@
+import pytest
+
+
+@pytest.fixture
+def client(config, monkeypatch):
+    import app as app_module
+
+    monkeypatch.setattr(app_module.metrics, "render_metrics", lambda config: (b"cert_days_left 1\n", "text/plain"))
+    return app_module.app.test_client()
+
+
+def test_metrics_closed_without_token(client, monkeypatch):
+    from config import Config
+
+    monkeypatch.setattr(Config, "METRICS_TOKEN", "")
+    assert client.get("/metrics").status_code == 401
+    with client.session_transaction() as session:
+        session["logged_in"] = True
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.data == b"cert_days_left 1\n"
+
+
+def test_metrics_requires_bearer_token(client, monkeypatch):
+    from config import Config
+
+    monkeypatch.setattr(Config, "METRICS_TOKEN", "s3cret")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer s3cret"}).status_code == 200
@@ -0,0 +1,127 @@
+import contextlib
+import io
+import queue
+
+import pytest
+
+import reload_coalescer
+from reload_coalescer import ReloadCoalescer
+
+
+class Clock:
+    def __init__(self):
+        self.now = 500.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeChannel:
+    def __init__(self, status):
+        self.status = status
+
+    def recv_exit_status(self):
+        return self.status
+
+
+class FakePool:
+    """Connection pool whose sessions record each post-sync command instead of running it."""
+
+    def __init__(self, exit_status=0):
+        self.exit_status = exit_status
+        self.reloads = []
+
+    @contextlib.contextmanager
+    def connection(self, host, port, username, timeout=None, timer=None, on_connect=None):
+        pool = self
+
+        class Session:
+            def exec_command(self, command, timeout=None):
+                pool.reloads.append((host, port, command))
+                stdout = io.BytesIO()
+                stdout.channel = FakeChannel(pool.exit_status)
+                return None, stdout, io.BytesIO(b"reload failed" if pool.exit_status else b"")
+
+        yield Session()
+
+
+@pytest.fixture
+def coalescer(config, monkeypatch):
+    from config import Config
+
+    monkeypatch.setattr(Config, "POST_SYNC_CMD", "nginx -s reload")
+    clock = Clock()
+    monkeypatch.setattr(reload_coalescer.time, "monotonic", clock)
+    coalescer = ReloadCoalescer(Config(), debounce=10, max_delay=25)
+    # Deadlines are checked here instead of by the background thread; flush() runs what is pending
+    monkeypatch.setattr(coalescer, "_ensure_thread_locked", lambda: None)
+    coalescer.pool = coalescer.connection_pool = FakePool()
+    coalescer.clock = clock
+    return coalescer
+
+
+def test_deploys_within_the_window_share_one_reload(coalescer):
+    job_a, job_b = queue.Queue(), queue.Queue()
+    job_a.job_id, job_b.job_id = "aaaaaaaa1111", "bbbbbbbb2222"
+    first = coalescer.schedule("10.0.0.1", ["example.com"], job_a)
+    coalescer.clock.now += 4
+    second = coalescer.schedule("10.0.0.1:22", ["api.example.com"], job_b)
+    assert list(coalescer._pending) == ["10.0.0.1:22"]
+    coalescer.flush()
+
+    assert coalescer.pool.reloads == [("10.0.0.1", 22, "nginx -s reload")]
+    assert first.done() and second.done() and first.success
+    assert "example.com (job aaaaaaaa), api.example.com (job bbbbbbbb)" in first.message
+    # Every job covered by the reload hears about it
+    assert first.message in [line[len("[INFO] "):] for line in job_a.queue]
+    assert first.message in [line[len("[INFO] "):] for line in job_b.queue]
+
+
+def test_each_deploy_pushes_the_reload_back_up_to_max_delay(coalescer):
+    coalescer.schedule("10.0.0.1:22", ["a.com"])
+    pending = coalescer._pending["10.0.0.1:22"]
+    assert pending.deadline == 510
+    coalescer.clock.now += 8
+    coalescer.schedule("10.0.0.1:22", ["b.com"])
+    assert pending.deadline == 518
+    coalescer.clock.now += 8
+    coalescer.schedule("10.0.0.1:22", ["c.com"])
+    # 516 + 10 would pass first + max_delay
+    assert pending.deadline == 525
+
+
+def test_hosts_reload_separately(coalescer):
+    coalescer.schedule("10.0.0.1", ["a.com"])
+    coalescer.schedule("[2001:db8::1]:2222", ["a.com"])
+    coalescer.flush()
+    assert sorted(coalescer.pool.reloads) == [("10.0.0.1", 22, "nginx -s reload"), ("2001:db8::1", 2222, "nginx -s reload")]
+
+
+def test_failed_reload_resolves_tickets(coalescer):
+    coalescer.pool.exit_status = 1
+    ticket = coalescer.schedule("10.0.0.1", ["a.com"])
+    coalescer.flush()
+    assert ticket.done() and ticket.success is False
+    assert "reload failed" in ticket.message
+    assert coalescer.wait([ticket], timeout=0)
+
+
+def test_background_thread_runs_due_reloads(config, monkeypatch):
+    from config import Config
+
+    monkeypatch.setattr(Config, "POST_SYNC_CMD", "nginx -s reload")
+    coalescer = ReloadCoalescer(Config(), debounce=0.05, max_delay=1)
+    coalescer.connection_pool = FakePool()
+    tickets = [coalescer.schedule("10.0.0.1", [domain]) for domain in ("a.com", "b.com")]
+    assert coalescer.wait(tickets, timeout=5)
+    assert len(coalescer.connection_pool.reloads) == 1
+
+
+def test_is_enabled(config, monkeypatch):
+    from config import Config
+
+    monkeypatch.setattr(Config, "POST_SYNC_CMD", "nginx -s reload")
+    monkeypatch.setattr(Config, "RELOAD_DEBOUNCE_SECONDS", 5)
+    assert reload_coalescer.is_enabled(Config())
+    monkeypatch.setattr(Config, "DRY_RUN", True)
+    assert not reload_coalescer.is_enabled(Config())
@@ -0,0 +1,108 @@
+import socket
+from types import SimpleNamespace
+
+import paramiko
+import pytest
+
+import retry_policy
+from retry_policy import RetryPolicy, RetrySchedule
+
+
+def test_parse_policies_skips_malformed_items():
+    policies = retry_policy.parse_policies(" throttled:4:2:30, bad, timeout:x:1:2,refused:0:5:30")
+    assert policies == {"throttled": RetryPolicy(4, 2.0, 30.0), "refused": RetryPolicy(1, 5.0, 30.0)}
+    assert retry_policy.parse_policies("") == {}
+
+
+def test_backoff_is_capped_full_jitter(monkeypatch):
+    monkeypatch.setattr(retry_policy.random, "uniform", lambda low, high: high)
+    policy = RetryPolicy(max_attempts=5, base_delay=2, max_delay=10)
+    assert [policy.next_delay(attempt) for attempt in range(1, 6)] == [2, 4, 8, 10, None]
+    assert retry_policy.NO_RETRY.next_delay(1) is None
+
+
+@pytest.mark.parametrize("exc, expected", [
+    (paramiko.AuthenticationException("denied"), retry_policy.AUTH),
+    (socket.timeout("timed out"), retry_policy.TIMEOUT),
+    (ConnectionRefusedError(111, "refused"), retry_policy.REFUSED),
+    (paramiko.ssh_exception.NoValidConnectionsError({("h", 22): ConnectionRefusedError(111, "x")}), retry_policy.REFUSED),
+    (paramiko.ssh_exception.NoValidConnectionsError({("h", 22): OSError(113, "no route")}), retry_policy.NETWORK),
+    (ConnectionResetError(104, "reset"), retry_policy.THROTTLED),
+    (paramiko.SSHException("Error reading SSH protocol banner"), retry_policy.THROTTLED),
+    (paramiko.SSHException("something else"), retry_policy.OTHER),
+    (OSError(113, "No route to host"), retry_policy.NETWORK),
+    (ValueError("bad"), retry_policy.OTHER),
+])
+def test_classify_error(exc, expected):
+    assert retry_policy.classify_error(exc) == expected
+
+
+def make_schedule(enabled=True, deadline=60):
+    config = SimpleNamespace(SYNC_RETRY_ENABLED=enabled, SYNC_RETRY_POLICIES="timeout:3:1:1", SYNC_RETRY_DEADLINE=deadline)
+    return RetrySchedule(config, started=100.0)
+
+
+def test_schedule_respects_budget_and_deadline(monkeypatch):
+    monkeypatch.setattr(retry_policy.random, "uniform", lambda low, high: high)
+    schedule = make_schedule()
+    assert schedule.next_delay("timeout", 1, now=100) == 1
+    assert schedule.next_delay("timeout", 3, now=100) is None
+    assert schedule.next_delay("timeout", 1, now=159.5) is None
+    assert schedule.next_delay("auth", 1, now=100) is None
+    assert schedule.next_delay(None, 1, now=100) is None
+    assert make_schedule(enabled=False).next_delay("timeout", 1, now=100) is None
+
+
+def test_default_retry_budgets_fit_the_circuit_threshold():
+    from config import Config
+
+    policies = retry_policy.parse_policies(Config.SYNC_RETRY_POLICIES)
+    assert max(policy.max_attempts for policy in policies.values()) <= Config.HOST_CIRCUIT_FAILURE_THRESHOLD
+
+
+@pytest.fixture
+def throttled_host(config, monkeypatch):
+    """Every attempt fails as throttled, with a retry budget larger than the circuit threshold."""
+    from config import Config
+    import host_health
+
+    monkeypatch.setattr(Config, "DRY_RUN", True)
+    monkeypatch.setattr(Config, "HOST_CIRCUIT_ENABLED", True)
+    monkeypatch.setattr(Config, "HOST_CIRCUIT_FAILURE_THRESHOLD", 3)
+    monkeypatch.setattr(Config, "SYNC_RETRY_ENABLED", True)
+    monkeypatch.setattr(Config, "SYNC_RETRY_POLICIES", "throttled:6:0.01:0.01")
+    monkeypatch.setattr(host_health, "_tracker", None)
+    return host_health.get_host_health(Config())
+
+
+@pytest.mark.parametrize("engine", ["threads", "asyncio"])
+def test_no_retry_once_the_circuit_opens(throttled_host, monkeypatch, engine):
+    import queue
+
+    from async_sync import AsyncSyncEngine
+    from config import Config
+    from ssh_utils import SyncManager
+
+    monkeypatch.setattr(Config, "SYNC_ENGINE", engine)
+    error = "Error reading SSH protocol banner"
+
+    def sync_single_server(self, server_line, deploys, log_queue=None):
+        throttled_host.record_failure("10.0.0.1:22", error)
+        return {"success": False, "server": "10.0.0.1:22", "status": "failed", "error_class": "throttled", "error": error}
+
+    async def sync_host(self, semaphore, server_line, deploys, log_queue, stats=None):
+        throttled_host.record_failure("10.0.0.1:22", error)
+        return "failed", "throttled"
+
+    monkeypatch.setattr(SyncManager, "_sync_single_server", sync_single_server)
+    monkeypatch.setattr(AsyncSyncEngine, "_sync_host", sync_host)
+    attempts = []
+    log_queue = queue.Queue()
+    success, failed = SyncManager().run_batch_sync(
+        ["example.com"], ["10.0.0.1"], log_queue=log_queue,
+        on_attempt=lambda server, attempt, result: attempts.append(attempt),
+    )
+    assert not success and failed == ["10.0.0.1"]
+    assert attempts == [1, 2, 3]
+    lines = list(log_queue.queue)
+    assert "[RETRY] Not retrying 10.0.0.1:22: its circuit is open" in lines
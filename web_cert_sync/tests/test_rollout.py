@@ -0,0 +1,40 @@
+from rollout import Wave, WaveGate, plan_waves
+
+
+def servers(group, count, start=1):
+    return [{"host": f"10.0.{start}.{i}", "port": 22, "group_name": group} for i in range(count)]
+
+
+def test_canary_first_then_ordered_groups():
+    fleet = servers("web", 2) + servers("canary", 1, 2) + servers("db", 1, 3) + servers("", 1, 4)
+    waves = plan_waves(fleet, canary_group="canary", group_order=["web"])
+    assert [wave.name for wave in waves] == ["canary", "web", "db", "default"]
+    assert waves[0].targets == ["10.0.2.0:22"]
+
+
+def test_groups_split_by_size_and_percent():
+    waves = plan_waves(servers("web", 10), wave_percent=30)
+    assert [len(wave.targets) for wave in waves] == [3, 3, 3, 1]
+    assert waves[0].name == "web 1/4"
+    waves = plan_waves(servers("web", 10), wave_size=2, wave_percent=50)
+    assert [len(wave.targets) for wave in waves] == [2] * 5
+
+
+def test_wave_passes_without_waiting_for_stragglers():
+    gate = WaveGate([Wave("web", ["a", "b", "c", "d"])], min_success_rate=0.5)
+    assert gate.record(0, True) is None
+    assert gate.record(0, True) == WaveGate.PASSED
+    # Later outcomes of a decided wave do not decide it again
+    assert gate.record(0, False) is None
+
+
+def test_wave_fails_once_rate_is_unreachable():
+    gate = WaveGate([Wave("web", ["a", "b", "c", "d"])], min_success_rate=0.75)
+    assert gate.record(0, False) is None
+    assert gate.record(0, False) == WaveGate.FAILED
+    assert "0 ok, 2 failed of 4, need 3" in gate.describe(0)
+
+
+def test_zero_rate_passes_immediately():
+    gate = WaveGate([Wave("web", ["a"])], min_success_rate=0)
+    assert gate.evaluate(0) == WaveGate.PASSED
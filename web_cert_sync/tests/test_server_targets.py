@@ -0,0 +1,45 @@
+import pytest
+
+from server_repository import ServerRepository
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("1.2.3.4", ("1.2.3.4", 22)),
+    (" web1.example.com:2222 ", ("web1.example.com", 2222)),
+    ("web1: 2200", ("web1", 2200)),
+    ("[2001:db8::1]:2222", ("2001:db8::1", 2222)),
+    ("[2001:db8::1]", ("2001:db8::1", 22)),
+    ("2001:db8::1", ("2001:db8::1", 22)),
+])
+def test_split_server(value, expected):
+    assert ServerRepository.split_server(value, 22) == expected
+
+
+@pytest.mark.parametrize("value", ["", "   ", ":22", "host:ssh"])
+def test_split_server_rejects_invalid(value):
+    with pytest.raises(ValueError):
+        ServerRepository.split_server(value, 22)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("1.2.3.4", "1.2.3.4:22"),
+    ("1.2.3.4:22", "1.2.3.4:22"),
+    (" 1.2.3.4 : 2222", "1.2.3.4:2222"),
+    ("2001:db8::1", "[2001:db8::1]:22"),
+    ("[2001:db8::1]:22", "[2001:db8::1]:22"),
+    ("host:ssh", "host:ssh"),
+])
+def test_canonical_server(value, expected):
+    assert ServerRepository.canonical_server(value, 22) == expected
+
+
+def test_reload_schedule_uses_canonical_server(config):
+    import reload_coalescer
+
+    config.POST_SYNC_CMD = "true"
+    coalescer = reload_coalescer.ReloadCoalescer(config, debounce=60, max_delay=60)
+    first = coalescer.schedule("1.2.3.4", ["example.com"])
+    second = coalescer.schedule("1.2.3.4:22", ["api.example.com"])
+    assert first.server == second.server == "1.2.3.4:22"
+    assert list(coalescer._pending) == ["1.2.3.4:22"]
+    assert len(coalescer._pending["1.2.3.4:22"].deploys) == 2
@@ -0,0 +1,50 @@
+import pytest
+
+import sse_frames
+from sse_frames import FrameBatcher
+
+
+class Clock:
+    def __init__(self):
+        self.now = 50.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(sse_frames.time, "monotonic", clock)
+    return clock
+
+
+def test_disabled_batcher_sends_each_line():
+    batcher = FrameBatcher()
+    assert batcher.add(1, "[INFO] one") == ["id: 1\ndata: [INFO] one\n\n"]
+    assert batcher.add(None, "[DONE]") == ["data: [DONE]\n\n"]
+    assert batcher.remaining() is None
+
+
+def test_lines_batched_until_interval(clock):
+    batcher = FrameBatcher(interval=0.5)
+    assert batcher.add(1, "a") == []
+    clock.now += 0.2
+    assert batcher.add(2, "b") == []
+    assert batcher.remaining() == pytest.approx(0.3)
+    clock.now += 0.3
+    assert batcher.due()
+    assert batcher.flush() == ["id: 2\ndata: a\ndata: b\n\n"]
+    assert batcher.flush() == []
+
+
+def test_sentinel_flushes_queued_lines_first(clock):
+    batcher = FrameBatcher(interval=1)
+    batcher.add(1, "a")
+    assert batcher.add(2, "[SUCCESS]") == ["id: 1\ndata: a\n\n", "id: 2\ndata: [SUCCESS]\n\n"]
+
+
+def test_max_bytes_flushes_early(clock):
+    batcher = FrameBatcher(interval=10, max_bytes=20)
+    assert batcher.add(1, "12345") == []
+    assert batcher.add(2, "67890") == ["id: 2\ndata: 12345\ndata: 67890\n\n"]
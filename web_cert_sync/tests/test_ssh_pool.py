@@ -0,0 +1,111 @@
+import pytest
+
+import ssh_pool
+from ssh_pool import SSHConnectionPool
+
+
+class FakeTransport:
+    def __init__(self):
+        self.active = True
+
+    def is_active(self):
+        return self.active
+
+    def send_ignore(self):
+        if not self.active:
+            raise EOFError()
+
+
+class FakeClient:
+    def __init__(self, host):
+        self.host = host
+        self.transport = FakeTransport()
+        self.closed = False
+
+    def get_transport(self):
+        return self.transport
+
+    def close(self):
+        self.closed = True
+        self.transport.active = False
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ssh_pool.time, "monotonic", clock)
+    return clock
+
+
+def make_pool(monkeypatch, **kwargs):
+    pool = SSHConnectionPool(**kwargs)
+    opened = []
+
+    def connect(host, port, username, timeout, timer=None):
+        opened.append(FakeClient(host))
+        return opened[-1]
+
+    monkeypatch.setattr(pool, "_connect", connect)
+    return pool, opened
+
+
+def test_released_client_is_reused(monkeypatch, clock):
+    pool, opened = make_pool(monkeypatch, max_size=4, idle_timeout=60)
+    connects = []
+    with pool.connection("a", 22, "root", on_connect=connects.append) as first:
+        pass
+    with pool.connection("a", 22, "root", on_connect=connects.append) as second:
+        assert second is first
+    assert len(opened) == 1 and len(connects) == 1
+    assert pool.stats() == {"idle": 1, "in_use": 0, "hosts": 1, "max_size": 4}
+
+
+def test_idle_clients_expire(monkeypatch, clock):
+    pool, opened = make_pool(monkeypatch, max_size=4, idle_timeout=60)
+    with pool.connection("a", 22, "root"):
+        pass
+    clock.now += 61
+    with pool.connection("a", 22, "root") as client:
+        assert client is opened[1]
+    assert opened[0].closed
+
+
+def test_stale_client_is_replaced(monkeypatch, clock):
+    pool, opened = make_pool(monkeypatch, max_size=4, idle_timeout=60)
+    with pool.connection("a", 22, "root"):
+        pass
+    opened[0].transport.active = False
+    with pool.connection("a", 22, "root") as client:
+        assert client is opened[1]
+    assert opened[0].closed
+
+
+def test_max_size_closes_least_recently_used(monkeypatch, clock):
+    pool, opened = make_pool(monkeypatch, max_size=2, idle_timeout=600)
+    for host in ("a", "b", "c"):
+        clock.now += 1
+        with pool.connection(host, 22, "root"):
+            pass
+    assert [client.closed for client in opened] == [True, False, False]
+    assert pool.stats()["idle"] == 2
+
+
+def test_errors_and_disabled_pool_drop_the_client(monkeypatch, clock):
+    pool, opened = make_pool(monkeypatch, max_size=2, idle_timeout=600)
+    with pytest.raises(RuntimeError):
+        with pool.connection("a", 22, "root"):
+            raise RuntimeError("exec failed")
+    assert opened[0].closed and pool.stats()["idle"] == 0
+
+    disabled, opened = make_pool(monkeypatch, max_size=0)
+    with disabled.connection("a", 22, "root"):
+        pass
+    assert opened[0].closed and disabled.stats()["idle"] == 0
@@ -0,0 +1,105 @@
+import hashlib
+import io
+import subprocess
+import tarfile
+from types import SimpleNamespace
+
+import stream_deploy
+
+
+def run(command, stdin=b""):
+    # The commands are "sh -c '<script>'", exactly as the remote shell receives them
+    return subprocess.run(command, shell=True, input=stdin, capture_output=True, check=False)
+
+
+def make_deploy(domain, cert=b"CERT", key=b"KEY", hashes=None):
+    deploy = {
+        "domain": domain,
+        "dir_name": f"{domain}_ecc",
+        "payload": SimpleNamespace(cert_bytes=cert, key_bytes=key),
+    }
+    if hashes is not None:
+        deploy["hashes"] = hashes
+    return deploy
+
+
+def test_parse_deploy_status_takes_last_line():
+    output = "noise\nCERTSYNC_STATUS stage=extract rc=2\nCERTSYNC_STATUS stage=done rc=0 post_rc=0 junk\n"
+    assert stream_deploy.parse_deploy_status(output) == {"stage": "done", "rc": "0", "post_rc": "0"}
+    assert stream_deploy.parse_deploy_status("no status here") is None
+
+
+def test_parse_hash_output():
+    output = "ABC123  a.cer\nabc456 *b.key\n\ngarbage\n"
+    assert stream_deploy.parse_hash_output(output) == {"a.cer": "abc123", "b.key": "abc456"}
+
+
+def test_archive_layout_and_modes():
+    archive = stream_deploy.build_deploys_archive([make_deploy("example.com")])
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        modes = {member.name: member.mode for member in tar.getmembers()}
+    assert modes == {"example.com_ecc/fullchain.cer": 0o644, "example.com_ecc/example.com.key": 0o600}
+
+
+def test_deploy_command_extracts_and_runs_post_sync(tmp_path):
+    deploys = [make_deploy("example.com"), make_deploy("api.example.com", cert=b"API")]
+    base = tmp_path / "remote dir"
+    command = stream_deploy.build_deploys_command(deploys, str(base), "echo reloaded; (exit 3)")
+    result = run(command, stream_deploy.build_deploys_archive(deploys))
+    assert stream_deploy.parse_deploy_status(result.stdout.decode()) == {"stage": "done", "rc": "0", "post_rc": "3"}
+    # Post-sync output goes to stderr so it cannot be mistaken for a status line
+    assert b"reloaded" in result.stderr
+    assert (base / "api.example.com_ecc" / "fullchain.cer").read_bytes() == b"API"
+    assert (base / "example.com_ecc" / "example.com.key").read_bytes() == b"KEY"
+
+
+def test_deploy_command_reports_failed_stage(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    command = stream_deploy.build_deploy_command(str(blocker), ["sub"])
+    status = stream_deploy.parse_deploy_status(run(command).stdout.decode())
+    assert status["stage"] == "mkdir" and status["rc"] != "0"
+
+
+def test_unchanged_files_skip_extract(tmp_path):
+    hashes = {"fullchain.cer": hashlib.sha256(b"CERT").hexdigest(), "example.com.key": hashlib.sha256(b"KEY").hexdigest()}
+    deploy = make_deploy("example.com", hashes=hashes)
+    archive = stream_deploy.build_deploys_archive([deploy])
+    command = stream_deploy.build_deploys_command([deploy], str(tmp_path), "echo reloaded")
+    first = stream_deploy.parse_deploy_status(run(command, archive).stdout.decode())
+    assert first["stage"] == "done"
+    second = run(command, archive)
+    assert stream_deploy.parse_deploy_status(second.stdout.decode()) == {"stage": "unchanged", "rc": "0", "post_rc": "none"}
+    assert b"reloaded" not in second.stderr
+
+
+def test_hashes_only_compared_when_every_deploy_has_them():
+    with_hashes = make_deploy("a.com", hashes={"fullchain.cer": "00"})
+    without = make_deploy("b.com")
+    assert "unchanged" in stream_deploy.build_deploys_command([with_hashes], "/srv")
+    assert "unchanged" not in stream_deploy.build_deploys_command([with_hashes, without], "/srv")
+
+
+def test_hash_command_lists_existing_files(tmp_path):
+    (tmp_path / "a.cer").write_bytes(b"x")
+    result = run(stream_deploy.build_hash_command(str(tmp_path), ["a.cer", "missing.key"]))
+    assert stream_deploy.parse_hash_output(result.stdout.decode()) == {"a.cer": hashlib.sha256(b"x").hexdigest()}
+
+
+def test_interpret_status():
+    interpret = stream_deploy.interpret_status
+    assert interpret("", "boom", 127, "h:22") == (
+        "failed", [("Stream deploy to h:22 returned no status (exit 127): boom", "ERROR")]
+    )
+    assert interpret("CERTSYNC_STATUS stage=extract rc=2", "bad tar", 1, "h:22") == (
+        "failed", [("Stream deploy failed on h:22 at extract (rc=2): bad tar", "ERROR")]
+    )
+    assert interpret("CERTSYNC_STATUS stage=unchanged rc=0 post_rc=none", "", 0, "h:22") == ("skipped", [])
+    assert interpret("CERTSYNC_STATUS stage=done rc=0 post_rc=none", "", 0, "h:22") == ("synced", [])
+    assert interpret("CERTSYNC_STATUS stage=done rc=0 post_rc=0", "", 0, "h:22") == (
+        "synced", [("Post-sync command executed successfully", "INFO")]
+    )
+    # A failed reload is reported but does not fail the deploy
+    assert interpret("CERTSYNC_STATUS stage=done rc=0 post_rc=1", "nginx: bad config", 0, "h:22") == (
+        "synced", [("Post-sync command failed on h:22: nginx: bad config", "WARN")]
+    )